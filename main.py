@@ -1,62 +1,38 @@
-import kagglehub
+"""
+Build the interactive earthquake maps.
+
+    python main.py                                  # master, timeline and region maps
+    python main.py master --mag-min 3.5
+    python main.py region timeline --years 1990 2024
+    python main.py heat --period month --years 2019 2020
+    python main.py master --bbox -119 33.5 -116.5 35 --cap unified=3000
+    python main.py --db datasets/catalog.sqlite     # indexed SQLite backend
+    python main.py --partitions datasets/parts      # out-of-core tile x decade partitions
+    python main.py region --watch                   # rebuild on every save
+
+Only the modules (and datasets) the chosen maps need are imported / loaded,
+so a single-map build starts much faster than building everything.
+"""
+import argparse
+import os
+import time
+from functools import lru_cache
+
 import pandas as pd
 from folium import Map, LayerControl
 from branca.element import Element
-from src.major_event import create_major_event_layer, create_major_event_norcal_layer
-from src.unified_earthquake_layer import add_unified_earthquake_layer
-from src.map_pop_heatmap import add_pop_heatmap
-from src.map_fault_lines import add_fault_lines
-from src.filters_clusters import add_filtered_layers
-from src.filters_region import add_region_layers, add_region_dropdown
 
-#LOAD & PREPARE DATA
+MAPS = ("master", "timeline", "region", "heat")
+DEFAULT_MAPS = ("master", "timeline", "region")  # heat is opt-in: python main.py heat
+SEARCH_MAPS = {"master", "timeline", "region"}  # pages with the event search box
+MAP_FILES = {
+    "master": "master_map.html",
+    "timeline": "time_slider_map.html",
+    "region": "region_filter_map.html",
+    "heat": "heat_timeline_map.html",
+}
 
-print("\n=== Loading California Earthquake Dataset ===")
-path = kagglehub.dataset_download("janus137/six-decades-of-california-earthquakes")
-print(f"Path to dataset files: {path}")
-
-# Read CSVs
-df_city_loc = pd.read_csv(path + "/cities_usa_latlon.csv")
-df_seismic_norcal = pd.read_csv(path + "/data_seismic_NorCal_events_iris_1960_to_2024DEC30_20241230a.csv")
-df_seismic_socal = pd.read_csv(path + "/data_seismic_SoCal_1960_to_2024DEC31_20241231a.csv")
-df_major_events = pd.read_csv(path + "/major_seismic_events_socal_1800to2024.csv")
-df_seismic_norcal_events = pd.read_csv("datasets/major_norcal_events.csv")
-df_pop = pd.read_csv("datasets/MCNA_-_Population_Points_with_T_D_Standards.csv")
-
-# Merge NorCal + SoCal
-print(f"\nNorCal earthquakes: {len(df_seismic_norcal):,}")
-print(f"SoCal earthquakes: {len(df_seismic_socal):,}")
-df_california = pd.concat([df_seismic_norcal, df_seismic_socal], ignore_index=True)
-print(f"Total California earthquakes combined: {len(df_california):,}")
-
-# Clean up data
-df_california["datetime"] = pd.to_datetime(df_california["datetime"], errors="coerce")
-df_california["year"] = df_california["datetime"].dt.year
-df_california["depth"] = pd.to_numeric(df_california["depth"], errors="coerce").fillna(0) / 1000.0  # convert m→km
-df_california["mag"] = pd.to_numeric(df_california["mag"], errors="coerce")
-df_california = df_california.dropna(subset=["lat", "lon", "mag"])
-
-print(f"Depth range: {df_california['depth'].min():.1f}–{df_california['depth'].max():.1f} km")
-print(f"Mean depth: {df_california['depth'].mean():.1f} km")
-
-#MASTER MAP (MAIN VIEW)
-
-print("\n=== Building Master Earthquake Map ===")
-m = Map(location=[37.0, -119.5], zoom_start=6, tiles="cartodbpositron")
-print("Adding base context layers...")
-add_fault_lines(m)
-add_pop_heatmap(m, df_pop)
-add_filtered_layers(m, df_california)
-print("Adding major earthquake events...")
-fg_major_events = create_major_event_layer(df_major_events)
-fg_major_events_norcal = create_major_event_norcal_layer(df_seismic_norcal_events)
-fg_major_events.add_child(fg_major_events_norcal)
-fg_major_events.add_to(m)
-print("Adding unified magnitude/depth layer...")
-add_unified_earthquake_layer(m, df_california, mag_min=3.0, sample_limit=2500)
-
-LayerControl(collapsed=False).add_to(m)
-legend_html = """
+LEGEND_MASTER = """
 <div style="position: fixed; bottom: 50px; left: 50px; width: 280px;
             background: white; border: 2px solid grey; z-index: 9999;
             font-size: 13px; padding: 12px; border-radius: 6px;
@@ -75,21 +51,8 @@ legend_html = """
   • Zoom in for more detail
 </div>
 """
-m.get_root().html.add_child(Element(legend_html))
-m.save("outputs/master_map.html")
-print("Saved: outputs/master_map.html")
-
-#TIME SLIDER MAP
 
-print("\n=== Building Time-Slider Earthquake Map ===")
-from src.time_slider import add_time_slider_layer
-
-m_timeline = Map(location=[37.0, -119.5], zoom_start=6, tiles="cartodbpositron")
-
-add_fault_lines(m_timeline)
-add_time_slider_layer(m_timeline, df_california, mag_min=3.0)
-
-legend_timeline = """
+LEGEND_TIMELINE = """
 <div style="position: fixed; bottom: 50px; left: 50px; width: 280px;
             background: white; border: 2px solid grey; z-index: 9999;
             font-size: 13px; padding: 12px; border-radius: 6px;
@@ -108,20 +71,8 @@ legend_timeline = """
   • Observe 50 years of patterns
 </div>
 """
-m_timeline.get_root().html.add_child(Element(legend_timeline))
-m_timeline.save("outputs/time_slider_map.html")
-print("Saved: outputs/time_slider_map.html")
-
-#REGION / COUNTY MAP
-
-print("\n=== Building Region / County Filter Map ===")
-map_region = Map(location=[37.0, -119.5], zoom_start=6, tiles="cartodbpositron")
 
-add_fault_lines(map_region)
-add_region_layers(map_region, df_california)
-add_region_dropdown(map_region)
-
-legend_region = """
+LEGEND_REGION = """
 <div style="position: fixed; bottom: 50px; left: 50px; width: 280px;
             background: white; border: 2px solid grey; z-index: 9999;
             font-size: 13px; padding: 12px; border-radius: 6px;
@@ -140,15 +91,408 @@ legend_region = """
   • Explore magnitude & depth interactively
 </div>
 """
-LayerControl(collapsed=False).add_to(map_region)
-map_region.get_root().html.add_child(Element(legend_region))
-map_region.save("outputs/region_filter_map.html")
-print("Saved: outputs/region_filter_map.html")
-
-
-print("\n=== All Maps Generated Successfully ===")
-print(f"1. Master Map:      outputs/master_map.html")
-print(f"2. Time-Slider Map: outputs/time_slider_map.html")
-print(f"3. Region Map:      outputs/region_filter_map.html")
-print(f"\nTotal earthquakes visualized: {len(df_california):,}")
-print("All three maps are interactive and ready for exploration.\n")
+
+LEGEND_HEAT = """
+<div style="position: fixed; bottom: 50px; right: 20px; width: 250px;
+            background: white; border: 2px solid grey; z-index: 9999;
+            font-size: 13px; padding: 12px; border-radius: 6px;
+            box-shadow: 0 0 15px rgba(0,0,0,0.2);">
+  <h4 style="margin-top: 0;">Seismic Density Over Time</h4>
+  Every catalog event, binned per period and weighted by magnitude.<br>
+  <span style="font-size:12px;color:#666;">(Color intensity is log-scaled against the busiest cell)</span>
+  <hr style="margin:8px 0;">
+  <b>💡 Controls:</b><br>
+  • ▶ Play to animate<br>
+  • Drag to scrub periods
+</div>
+"""
+
+
+@lru_cache(maxsize=1)
+def dataset_path():
+    # only maps that need the Kaggle files trigger the download
+    from src.catalog import download_dataset
+    path = download_dataset()
+    print(f"Path to dataset files: {path}")
+    return path
+
+
+def _base_map():
+    return Map(location=[37.0, -119.5], zoom_start=6, tiles="cartodbpositron")
+
+
+#LOAD & PREPARE DATA
+
+def store_filters(args):
+    """bbox / year range as CatalogStore._where keyword filters."""
+    from src.catalog_store import catalog_filters
+    return catalog_filters(bbox=args.bbox, years=args.years)
+
+
+def filter_catalog(df, args):
+    """Apply --bbox (west south east north) and --years (inclusive) to a cleaned catalog frame."""
+    from src.catalog_store import filter_frame
+    return filter_frame(df, **store_filters(args))
+
+
+def load_catalog(args):
+    """
+    Returns (df_california, store); store is None unless --db or --partitions
+    is given. With a store df_california is a bounded sample (--sample-rows)
+    for the summary printout and the --partitions aftershock layers; every
+    other layer reads the store (see plan_caps).
+    """
+    print("\n=== Loading California Earthquake Dataset ===")
+    if args.partitions:
+        from src.catalog import load_california_catalog
+        from src.partitions import PartitionedCatalog
+        store = PartitionedCatalog(args.partitions)
+        if store.count() == 0:
+            store.ingest_catalog(load_california_catalog(dataset_path(), **args.merge), with_counties=True)
+        print(f"Partitioned catalog: {store.count(**store_filters(args)):,} events after filters")
+        df_california = store.query(columns=("time", "lat", "lon", "depth", "mag"), sample=args.sample_rows,
+                                    **store_filters(args))
+    elif args.db:
+        from src.catalog import load_california_catalog
+        from src.catalog_store import CatalogStore
+        store = CatalogStore(args.db)
+        if store.count() == 0:
+            # merged in memory once so the NorCal / SoCal duplicates never reach the store
+            store.ingest_catalog(load_california_catalog(dataset_path(), **args.merge), with_counties=True)
+        print(f"Catalog store: {store.count(**store_filters(args)):,} events after filters")
+        # narrow sample for the summary below; the layers read the store
+        df_california = store.query(columns=("time", "lat", "lon", "depth", "mag"), sample=args.sample_rows,
+                                    **store_filters(args))
+    else:
+        # Merge NorCal + SoCal and clean up data
+        from src.catalog import load_california_catalog
+        store = None
+        df_california = filter_catalog(load_california_catalog(dataset_path(), **args.merge), args)
+
+    print(f"Events after filters: {len(df_california):,}")
+    print(f"Depth range: {df_california['depth'].min():.1f}–{df_california['depth'].max():.1f} km")
+    print(f"Mean depth: {df_california['depth'].mean():.1f} km")
+    return df_california, store
+
+
+#PAYLOAD BUDGET (marker caps for every page)
+
+def plan_caps(args, df_california, store):
+    """
+    Marker caps and input rows for the layers of the requested maps.
+    --cap LAYER=N overrides the planner; only the remaining layers are planned.
+    The master page's marker layers are planned by build_master instead, once
+    its other layers are built and their size is known (see master_markers).
+    Returns (caps, layer_rows).
+    """
+    from src.payload_budget import LAYER_PAGES, plan_layer_caps
+
+    caps = dict(args.cap or {})
+    layers = tuple(name for name, page in LAYER_PAGES.items() if page in args.maps and page != "master")
+    todo = tuple(name for name in layers if name not in caps)
+    layer_rows = {}
+
+    print("\n=== Planning Payload Budget ===")
+    if store is not None:
+        filters = store_filters(args)
+        if todo:
+            caps.update(plan_layer_caps(store.query(sample=500, **filters), layers=todo,
+                                        group_sizes=store.group_sizes(mag_min=args.mag_min, **filters),
+                                        mag_min=args.mag_min, encoding=args.encoding))
+        layer_rows = {layer: store.layer_frame(layer, caps[layer], mag_min=args.mag_min, **filters)
+                      for layer in layers}
+        # the whole filtered catalog, read a chunk / partition at a time (density tiles,
+        # exposure heat, heat map and cube)
+        layer_rows["catalog"] = store.where(**filters)
+        if "region" in args.maps and args.db:
+            # where src.ingest rebuilds the county shards after appending to this store
+            store.set_meta("shard_dir", os.path.join(args.out, "shards"))
+        rows = None
+        if args.partitions:
+            # clustered tile by tile, never loaded whole
+            layer_rows["clusters"] = layer_rows["catalog"]
+            if "region" in args.maps:
+                # every county-labelled event, but only the columns the overview and summary cube need
+                layer_rows["county_stats"] = store.query(columns=("time", "depth", "mag", "county"),
+                                                         has_county=True, **filters)
+        elif {"master", "region"} & set(args.maps):
+            # loaded once and shared: DBSCAN, the aftershock windows and the county overview need every event
+            rows = store.query(columns=("time", "lat", "lon", "depth", "mag", "county"), **filters)
+            layer_rows["clusters"] = layer_rows["aftershocks"] = layer_rows["county_stats"] = rows
+        if SEARCH_MAPS & set(args.maps):
+            # the timeline and the search box share the M >= mag_min rows
+            layer_rows["timeline"] = layer_rows["search"] = (
+                store.query(columns=("time", "lat", "lon", "depth", "mag"), mag_min=args.mag_min, **filters)
+                if rows is None else rows[rows["mag"] >= args.mag_min])
+    else:
+        df_regions = None
+        if "region" in args.maps:
+            from src.filters_region import assign_counties
+            df_regions = assign_counties(df_california)
+            layer_rows["county"] = layer_rows["county_stats"] = df_regions
+        if todo:
+            caps.update(plan_layer_caps(df_california, df_counties=df_regions, mag_min=args.mag_min, layers=todo,
+                                        encoding=args.encoding))
+        for layer in ("timeline", "search"):
+            layer_rows[layer] = df_california
+    return caps, layer_rows
+
+
+def master_markers(args, m, catalog, caps):
+    """
+    Caps and rows of the master page's marker layers. Layers without a --cap
+    are planned against the size of m, the page built so far (every
+    non-marker layer). catalog is the in-memory frame or the filtered store view.
+    Returns (caps, {layer: rows}).
+    """
+    from src.payload_budget import LAYER_PAGES, page_bytes, plan_layer_caps
+
+    layers = tuple(name for name, page in LAYER_PAGES.items() if page == "master")
+    todo = tuple(name for name in layers if name not in caps)
+    in_memory = isinstance(catalog, pd.DataFrame)
+    if todo:
+        print("Planning the marker layers' budget...")
+        caps = dict(caps, **plan_layer_caps(
+            catalog if in_memory else catalog.query(sample=500), layers=todo,
+            group_sizes=None if in_memory else catalog.group_sizes(mag_min=args.mag_min),
+            mag_min=args.mag_min, encoding=args.encoding, fixed_bytes={"master": page_bytes(m)}))
+    if in_memory:
+        return caps, {layer: catalog for layer in layers}
+    return caps, {layer: catalog.layer_frame(layer, caps[layer], mag_min=args.mag_min) for layer in layers}
+
+
+#MASTER MAP (MAIN VIEW)
+
+def build_master(args, df_california, caps, layer_rows):
+    from src.major_event import create_major_event_layer, create_major_event_norcal_layer
+    from src.unified_earthquake_layer import add_unified_earthquake_layer
+    from src.map_pop_heatmap import add_pop_heatmap
+    from src.map_fault_lines import add_fault_lines
+    from src.filters_clusters import add_cluster_layer, add_filtered_layers
+    from src.aftershock_sequences import add_aftershock_sequence_layers
+    from src.query_service import add_live_query_layer
+    from src.density_tiles import add_density_tiles, build_density_tiles
+    from src.pop_exposure import add_exposure_columns, add_exposure_heat_layer
+    from src.event_search import add_event_search
+
+    print("\n=== Building Master Earthquake Map ===")
+    df_major_events = pd.read_csv(dataset_path() + "/major_seismic_events_socal_1800to2024.csv")
+    df_seismic_norcal_events = pd.read_csv("datasets/major_norcal_events.csv")
+    df_pop = pd.read_csv("datasets/MCNA_-_Population_Points_with_T_D_Standards.csv")
+
+    # the whole catalog: in memory (exposure estimated once, shared with the markers) or the store view
+    catalog = layer_rows.get("catalog")
+    if catalog is None:
+        print("Estimating population exposure per event...")
+        catalog = add_exposure_columns([df_california], df_pop)[0]
+
+    # every layer but the markers first: their size is the fixed cost the marker caps are planned against
+    m = _base_map()
+    print("Adding base context layers...")
+    add_fault_lines(m)
+    # full-catalog overview tiles, written next to the page so they load from file://
+    zmin, zmax = args.tile_zoom
+    for mode in args.tiles:
+        build_density_tiles(catalog, os.path.join(args.out, "tiles"), mode=mode, zooms=range(zmin, zmax + 1))
+        add_density_tiles(m, f"tiles/{mode}/{{z}}/{{x}}/{{y}}.png", mode=mode, max_native_zoom=zmax)
+    add_pop_heatmap(m, df_pop)
+    add_exposure_heat_layer(m, catalog, df_pop)
+    add_cluster_layer(m, layer_rows.get("clusters", catalog))
+    print("Adding major earthquake events...")
+    fg_major_events = create_major_event_layer(df_major_events)
+    fg_major_events_norcal = create_major_event_norcal_layer(df_seismic_norcal_events)
+    fg_major_events.add_child(fg_major_events_norcal)
+    fg_major_events.add_to(m)
+    print("Adding aftershock sequences for major events...")
+    add_aftershock_sequence_layers(m, layer_rows.get("aftershocks", df_california), df_major_events,
+                                   df_seismic_norcal_events)
+    print("Adding live catalog layer (needs: python -m src.query_service)...")
+    add_live_query_layer(m, mag_min=args.mag_min)
+    add_event_search(m, layer_rows["search"], mag_min=args.mag_min)
+    m.get_root().html.add_child(Element(LEGEND_MASTER))
+
+    caps, marker_rows = master_markers(args, m, catalog, caps)
+    if "exposure" not in marker_rows["magnitude"].columns:
+        print("Estimating population exposure per event...")
+        marker_rows = dict(zip(marker_rows, add_exposure_columns(list(marker_rows.values()), df_pop)))
+    add_filtered_layers(m, marker_rows["magnitude"], mag_sample=caps["magnitude"], depth_sample=caps["depth"],
+                        depth_df=marker_rows["depth"], clusters=False, encoding=args.encoding)
+    print("Adding unified magnitude/depth layer...")
+    add_unified_earthquake_layer(m, marker_rows["unified"], mag_min=args.mag_min, sample_limit=caps["unified"],
+                                 encoding=args.encoding)
+
+    LayerControl(collapsed=False).add_to(m)
+    return m
+
+
+#TIME SLIDER MAP
+
+def build_timeline(args, df_california, caps, layer_rows):
+    from src.map_fault_lines import add_fault_lines
+    from src.time_slider import add_time_slider_layer
+    from src.event_search import add_event_search
+
+    print("\n=== Building Time-Slider Earthquake Map ===")
+    m_timeline = _base_map()
+    add_fault_lines(m_timeline)
+    add_time_slider_layer(m_timeline, layer_rows["timeline"], mag_min=args.mag_min, encoding=args.encoding)
+    add_event_search(m_timeline, layer_rows["search"], mag_min=args.mag_min)
+    m_timeline.get_root().html.add_child(Element(LEGEND_TIMELINE))
+    return m_timeline
+
+
+#REGION / COUNTY MAP
+
+def build_region(args, df_california, caps, layer_rows):
+    from src.map_fault_lines import add_fault_lines
+    from src.filters_region import add_region_layers, add_region_dropdown
+    from src.county_stats import add_county_choropleth, county_stats
+    from src.event_cube import add_event_cube_panel
+    from src.event_search import add_event_search
+
+    print("\n=== Building Region / County Filter Map ===")
+    map_region = _base_map()
+    add_fault_lines(map_region)
+    add_county_choropleth(map_region, county_stats(layer_rows["county_stats"]))
+    add_event_cube_panel(map_region, layer_rows["county_stats"])
+    # county markers live in shards next to the page and load when picked in the dropdown
+    add_region_layers(map_region, layer_rows["county"], per_county_sample=caps["county"],
+                      shard_dir=os.path.join(args.out, "shards"), shard_url="shards", filters=store_filters(args))
+    add_region_dropdown(map_region)
+    # the region dropdown is fixed over the top left corner
+    add_event_search(map_region, layer_rows["search"], mag_min=args.mag_min, position="topright")
+    LayerControl(collapsed=False).add_to(map_region)
+    map_region.get_root().html.add_child(Element(LEGEND_REGION))
+    return map_region
+
+
+#ANIMATED HEAT MAP
+
+def build_heat(args, df_california, caps, layer_rows):
+    from src.map_fault_lines import add_fault_lines
+    from src.heat_timeline import add_heat_timeline_layer
+    from src.event_cube import add_event_cube_panel
+
+    print("\n=== Building Animated Heat Timeline Map ===")
+    m_heat = _base_map()
+    add_fault_lines(m_heat)
+    # the whole filtered catalog, not just M3+: payload depends on occupied cells only
+    heat_rows = layer_rows.get("catalog", df_california)
+    add_heat_timeline_layer(m_heat, heat_rows, cell_deg=args.heat_cell, period=args.period)
+    add_event_cube_panel(m_heat, heat_rows, region_col=None)
+    m_heat.get_root().html.add_child(Element(LEGEND_HEAT))
+    return m_heat
+
+
+BUILDERS = {"master": build_master, "timeline": build_timeline, "region": build_region, "heat": build_heat}
+
+
+def _cap(text):
+    from src.payload_budget import LAYER_PAGES
+
+    layer, _, value = text.partition("=")
+    if not value:
+        raise argparse.ArgumentTypeError(f"expected LAYER=N, got {text!r}")
+    if layer not in LAYER_PAGES:
+        raise argparse.ArgumentTypeError(f"unknown layer {layer!r}; choose from {', '.join(LAYER_PAGES)}")
+    try:
+        cap = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer cap, got {value!r}") from None
+    if cap < 0:
+        raise argparse.ArgumentTypeError(f"cap must be >= 0, got {cap}")
+    return layer, cap
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the California earthquake maps.")
+    # choices are checked by hand: argparse rejects an empty "*" positional that has choices
+    parser.add_argument("maps", nargs="*", metavar="MAP", help=f"maps to build: {', '.join(MAPS)} (default: {' '.join(DEFAULT_MAPS)})")
+    parser.add_argument("--mag-min", type=float, default=3.0,
+                        help="minimum magnitude for the unified, timeline and live layers (default 3.0)")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("WEST", "SOUTH", "EAST", "NORTH"),
+                        help="only events inside this box")
+    parser.add_argument("--years", type=int, nargs=2, metavar=("FIRST", "LAST"),
+                        help="only events from FIRST to LAST (inclusive)")
+    parser.add_argument("--cap", type=_cap, action="append", metavar="LAYER=N",
+                        help="fixed marker cap for magnitude/depth/unified/county instead of the budget planner")
+    parser.add_argument("--encoding", choices=("markers", "packed"), default="markers",
+                        help="marker layer payload: one folium marker per event, or quantized typed arrays "
+                             "decoded in the browser (default: markers)")
+    parser.add_argument("--period", choices=("year", "month"), default="year",
+                        help="frame length of the animated heat map (default: year)")
+    parser.add_argument("--heat-cell", type=float, default=0.1, help="heat map grid cell in degrees (default 0.1)")
+    parser.add_argument("--tiles", action="append", choices=("count", "mag", "depth"),
+                        help="density tile mode(s) for the master map (default: count)")
+    parser.add_argument("--no-tiles", action="store_true", help="skip the density tile pyramid")
+    parser.add_argument("--tile-zoom", type=int, nargs=2, default=(5, 10), metavar=("MIN", "MAX"),
+                        help="zoom levels to render tiles for (default: 5 10)")
+    parser.add_argument("--dedupe", type=float, nargs=3, default=(16, 10.0, 0.5), metavar=("SECONDS", "KM", "MAG"),
+                        help="NorCal/SoCal duplicate tolerances: origin time, distance, magnitude (default: 16 10 0.5)")
+    parser.add_argument("--db", help="SQLite catalog store (src/catalog_store.py); ingested on first use")
+    parser.add_argument("--partitions", metavar="DIR",
+                        help="partitioned out-of-core catalog (src/partitions.py); ingested on first use")
+    parser.add_argument("--sample-rows", type=int, default=200_000,
+                        help="with --db or --partitions, events sampled into memory for the catalog summary "
+                             "and, with --partitions, the aftershock layers (default 200000)")
+    parser.add_argument("--eager-layers", action="store_true",
+                        help="build hidden layers at page load instead of the first time they are switched on")
+    parser.add_argument("--instrument", action="store_true",
+                        help="add timing hooks and a performance HUD (load, layer add and toggle times, JSON export)")
+    parser.add_argument("--out", default="outputs", help="output directory (default: outputs)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep the catalog in memory and rebuild the affected maps whenever main.py, "
+                             "a src module or a dataset file changes")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.maps if name not in MAPS]
+    if unknown:
+        parser.error(f"unknown map(s) {', '.join(unknown)}; choose from {', '.join(MAPS)}")
+    args.maps = list(dict.fromkeys(args.maps)) or list(DEFAULT_MAPS)
+    seconds, km, dmag = args.dedupe
+    if seconds <= 0 or km <= 0 or dmag < 0:
+        parser.error(f"--dedupe needs SECONDS > 0, KM > 0 and MAG >= 0, got {seconds:g} {km:g} {dmag:g}")
+    args.merge = dict(zip(("max_dt_s", "max_km", "max_dmag"), args.dedupe))
+    args.tiles = [] if args.no_tiles else list(dict.fromkeys(args.tiles or ["count"]))
+    return args
+
+
+def render_map(name, args, df_california, caps, layer_rows):
+    """Build one map and write it to args.out. Returns the output path."""
+    from src.html_writer import save_map
+
+    m = BUILDERS[name](args, df_california, caps, layer_rows)
+    if not args.eager_layers:
+        from src.deferred_layers import defer_hidden_layers
+        deferred = defer_hidden_layers(m)
+        if deferred:
+            print(f"[defer] {deferred} hidden layer(s) built on first toggle")
+    if args.instrument:
+        from src.perf_hud import add_perf_hud
+        add_perf_hud(m, name)
+    os.makedirs(args.out, exist_ok=True)
+    out = os.path.join(args.out, MAP_FILES[name])
+    size = save_map(m, out)
+    print(f"Saved: {out} ({size / 1e6:.1f} MB)")
+    return out
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.watch:
+        from src.watch import watch
+        return watch(argv)
+    start = time.perf_counter()
+    df_california, store = load_catalog(args)
+    caps, layer_rows = plan_caps(args, df_california, store)
+
+    saved = [render_map(name, args, df_california, caps, layer_rows) for name in args.maps]
+
+    print("\n=== Maps Generated Successfully ===")
+    for i, out in enumerate(saved, 1):
+        print(f"{i}. {out}")
+    print(f"\nTotal earthquakes visualized: {len(df_california):,}")
+    print(f"Done in {time.perf_counter() - start:.1f}s\n")
+
+
+if __name__ == "__main__":
+    main()
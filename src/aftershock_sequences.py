@@ -0,0 +1,117 @@
+import folium
+import numpy as np
+import pandas as pd
+from folium import FeatureGroup
+
+from .catalog import NO_TIME, epoch_year, format_epoch, parse_epoch, year_start
+from .spatial_index import SpaceTimeIndex
+
+DAY = 86400
+
+# time since mainshock -> color (hot = early aftershocks, cool = late)
+TIME_BUCKETS = [
+    (1, "#b2182b", "< 1 day"),
+    (7, "#ef8a62", "1–7 days"),
+    (30, "#fddb6d", "1–4 weeks"),
+    (90, "#67a9cf", "1–3 months"),
+    (float("inf"), "#2166ac", "> 3 months"),
+]
+
+
+def _major_events(df_major):
+    """
+    Normalize either major-event table to name/lat/lon/mag/time/year.
+    SoCal rows only carry a Year, so their time is left NaN and anchored later.
+    """
+    cols = {c.lower(): c for c in df_major.columns}
+    lat = df_major[cols["lat"]].astype(float)
+    lon = df_major[cols["lon"]].astype(float)
+    mag = pd.to_numeric(df_major[cols["mag"]], errors="coerce")
+    if "datetime" in cols:
+        epoch = parse_epoch(df_major[cols["datetime"]])
+        known = epoch != NO_TIME
+        time = pd.Series(epoch, index=df_major.index).where(known)
+        year = pd.Series(epoch_year(epoch), index=df_major.index).where(known)
+    else:
+        time = pd.Series(np.nan, index=df_major.index)
+        year = pd.to_numeric(df_major[cols["year"]], errors="coerce")
+    for name_col in ("curated_event", "event"):
+        if name_col in cols:
+            name = df_major[cols[name_col]].astype(str)
+            break
+    else:
+        name = "M" + mag.round(1).astype(str)
+    return pd.DataFrame({"name": name, "lat": lat, "lon": lon, "mag": mag, "time": time, "year": year})
+
+
+def find_sequences(df, majors, radius_km=50.0, days_before=1.0, days_after=365.0, index=None):
+    """
+    For every major event, return the catalog rows within radius_km and within
+    [-days_before, +days_after] of the mainshock.
+
+    Mainshocks known only by year are anchored to the largest catalog event
+    within radius_km during that year; events before the catalog starts are skipped.
+    Returns a list of (major_row, catalog_positions, mainshock_epoch).
+    """
+    epoch = df["time"].to_numpy()
+    if index is None:
+        index = SpaceTimeIndex(df["lat"].to_numpy(), df["lon"].to_numpy(), epoch)
+    mags = df["mag"].to_numpy()
+
+    sequences = []
+    for _, ev in majors.iterrows():
+        if np.isnan(ev["lat"]) or np.isnan(ev["lon"]):
+            continue
+        t_main = ev["time"]
+        if np.isnan(t_main):
+            if np.isnan(ev["year"]):
+                continue
+            y0, y1 = (int(v) for v in year_start([ev["year"], ev["year"] + 1]))
+            cand = index.query_radius(ev["lat"], ev["lon"], radius_km, t0=y0, t1=y1)
+            if len(cand) == 0:
+                continue
+            t_main = epoch[cand[np.argmax(mags[cand])]]
+        t_main = int(t_main)
+        rows = index.query_radius(ev["lat"], ev["lon"], radius_km,
+                                  t0=t_main - int(days_before * DAY), t1=t_main + int(days_after * DAY))
+        if len(rows):
+            sequences.append((ev, rows, t_main))
+    return sequences
+
+
+def add_aftershock_sequence_layers(m, df, *major_tables, radius_km=50.0, days_before=1.0,
+                                   days_after=365.0, max_events=500):
+    """
+    One toggleable layer per major event showing its catalog sequence,
+    colored by time since the mainshock. Each layer keeps the max_events
+    largest quakes of its sequence to bound the page size.
+    """
+    majors = pd.concat([_major_events(t) for t in major_tables], ignore_index=True)
+    sequences = find_sequences(df, majors, radius_km=radius_km, days_before=days_before, days_after=days_after)
+    print(f"[aftershocks] {len(sequences)} of {len(majors)} major events matched catalog sequences "
+          f"(r={radius_km:g} km, -{days_before:g}/+{days_after:g} days)")
+
+    edges = [b[0] for b in TIME_BUCKETS]
+    for ev, rows, t_main in sorted(sequences, key=lambda s: s[2]):
+        seq = df.iloc[rows]
+        seq = seq.nlargest(max_events, "mag") if len(seq) > max_events else seq
+        days = (seq["time"].to_numpy() - t_main) / DAY
+        bucket = np.searchsorted(edges, np.abs(days), side="right")
+        dates = format_epoch(seq["time"], unit="m")
+        year = int(epoch_year(t_main))
+
+        fg = FeatureGroup(name=f"Sequence: {ev['name']} M{ev['mag']:.1f} ({year}) – {len(rows):,} events", show=False)
+        for lat, lon, mag, d, b, date in zip(seq["lat"], seq["lon"], seq["mag"], days, bucket, dates):
+            _, color, label = TIME_BUCKETS[min(b, len(TIME_BUCKETS) - 1)]
+            when = f"{d:+.1f} days" if d < 0 else f"{d:.1f} days after ({label})"
+            folium.CircleMarker(
+                [lat, lon],
+                radius=2 + 1.5 * max(mag, 0.0),
+                color=color,
+                fill=True,
+                fill_color=color,
+                fill_opacity=0.7,
+                weight=1,
+                popup=folium.Popup(f"<b>M {mag:.1f}</b><br>{date}<br>{when}", max_width=220),
+            ).add_to(fg)
+        fg.add_to(m)
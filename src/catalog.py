@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from .catalog_merge import merge_catalogs
+
+KAGGLE_DATASET = "janus137/six-decades-of-california-earthquakes"
+NORCAL_CSV = "data_seismic_NorCal_events_iris_1960_to_2024DEC30_20241230a.csv"
+SOCAL_CSV = "data_seismic_SoCal_1960_to_2024DEC31_20241231a.csv"
+
+# Kaggle catalogs write "2005-06-15 02:50:55.770"; parsing with the explicit
+# format is several times faster than letting pandas infer it row by row.
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+NO_TIME = np.iinfo("int64").min  # what NaT becomes as int64
+
+
+def download_dataset():
+    # kagglehub caches the download, so repeated calls are cheap
+    import kagglehub
+    return kagglehub.dataset_download(KAGGLE_DATASET)
+
+
+def parse_epoch(values):
+    """Time strings -> int64 epoch seconds (UTC); unparseable values become NO_TIME."""
+    s = pd.Series(values)
+    dt = pd.to_datetime(s, format=TIME_FORMAT, errors="coerce")
+    miss = dt.isna() & s.notna()
+    if miss.any():
+        # stragglers without fractional seconds or with a "T" separator
+        dt[miss] = pd.to_datetime(s[miss], format="ISO8601", errors="coerce")
+    return dt.to_numpy(dtype="datetime64[s]").astype("int64")
+
+
+def epoch_year(t):
+    return np.asarray(t, dtype="int64").astype("datetime64[s]").astype("datetime64[Y]").astype("int64") + 1970
+
+
+def year_start(year):
+    """Epoch seconds of Jan 1st 00:00 UTC of year (vectorized)."""
+    return (np.asarray(year, dtype="int64") - 1970).astype("datetime64[Y]").astype("datetime64[s]").astype("int64")
+
+
+def format_epoch(t, unit="s"):
+    """
+    Vectorized epoch -> text: unit "s" gives "YYYY-MM-DD HH:MM:SS",
+    "m" drops the seconds and "D" gives the date only.
+    """
+    text = np.datetime_as_string(np.asarray(t, dtype="int64").astype("datetime64[s]"), unit=unit)
+    return np.char.replace(text, "T", " ") if text.size else text
+
+
+def clean_catalog(df):
+    """
+    Build the canonical columns every layer uses: time (int64 epoch seconds),
+    year and decade (derived from time), depth in km and numeric magnitude.
+    Rows without a location, magnitude or parseable time are dropped.
+    """
+    df = df.copy()
+    df["time"] = parse_epoch(df["datetime"])
+    df = df[df["time"] != NO_TIME].drop(columns="datetime")
+    df["year"] = epoch_year(df["time"])
+    df["decade"] = df["year"] // 10 * 10
+    df["depth"] = pd.to_numeric(df["depth"], errors="coerce").fillna(0) / 1000.0  # convert m→km
+    df["mag"] = pd.to_numeric(df["mag"], errors="coerce")
+    return df.dropna(subset=["lat", "lon", "mag"])
+
+
+def load_california_catalog(path, **merge_kwargs):
+    """
+    Read the NorCal + SoCal Kaggle catalogs from path, clean them and merge
+    them without the events both networks recorded (see catalog_merge).
+    """
+    df_seismic_norcal = pd.read_csv(path + "/" + NORCAL_CSV)
+    df_seismic_socal = pd.read_csv(path + "/" + SOCAL_CSV)
+
+    # Merge NorCal + SoCal
+    print(f"\nNorCal earthquakes: {len(df_seismic_norcal):,}")
+    print(f"SoCal earthquakes: {len(df_seismic_socal):,}")
+    df_california = merge_catalogs(
+        {"NorCal": clean_catalog(df_seismic_norcal), "SoCal": clean_catalog(df_seismic_socal)},
+        **merge_kwargs,
+    )
+    print(f"Total California earthquakes combined: {len(df_california):,}")
+
+    return df_california
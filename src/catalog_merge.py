@@ -0,0 +1,105 @@
+"""
+Merging the NorCal and SoCal catalogs without double-counting.
+
+Both networks record the events in the overlapping central-California band,
+so the same quake shows up twice with slightly different origin time,
+location and magnitude. Duplicates are found with a sweep over the
+time-sorted merged catalog: offset k compares every row with the row k
+places later, and only rows whose time window is still open stay in the
+sweep, so the work is rows x (events per time window), never all pairs.
+Candidate pairs from different networks that also pass the distance and
+magnitude checks are matched one-to-one and the record from the
+lower-priority network is dropped.
+"""
+import numpy as np
+import pandas as pd
+
+from .spatial_index import haversine_km
+
+NETWORK_PRIORITY = ("NorCal", "SoCal")  # first wins when both recorded an event
+
+MAX_DT_S = 16        # origin time difference
+MAX_KM = 10.0        # epicentre distance
+MAX_DMAG = 0.5       # magnitude difference (networks use different magnitude scales)
+
+
+def find_duplicates(t, lat, lon, mag, rank, max_dt_s=MAX_DT_S, max_km=MAX_KM, max_dmag=MAX_DMAG):
+    """
+    Cross-network duplicate pairs. Inputs are row-aligned arrays, rank is the
+    network priority (lower is preferred). Returns (keep, drop) row positions,
+    one pair per duplicate, each row in at most one pair.
+    """
+    if max_dt_s <= 0 or max_km <= 0 or max_dmag < 0:
+        # the pair cost is measured in tolerance units
+        raise ValueError(f"tolerances must be positive (max_dmag >= 0), got {max_dt_s}, {max_km}, {max_dmag}")
+    t = np.asarray(t, dtype="int64")
+    order = np.argsort(t, kind="stable")
+    t, lat, lon, mag, rank = t[order], lat[order], lon[order], mag[order], rank[order]
+
+    pi, pj = [], []
+    active = np.arange(len(t))
+    k = 1
+    while True:
+        active = active[active + k < len(t)]
+        # time gaps only grow with k, so a row leaves the sweep once its window closes
+        active = active[t[active + k] - t[active] <= max_dt_s]
+        if len(active) == 0:
+            break
+        j = active + k
+        hit = rank[active] != rank[j]
+        i, j = active[hit], j[hit]
+        hit = np.abs(mag[i] - mag[j]) <= max_dmag
+        i, j = i[hit], j[hit]
+        hit = haversine_km(lat[i], lon[i], lat[j], lon[j]) <= max_km
+        pi.append(i[hit])
+        pj.append(j[hit])
+        k += 1
+
+    i = np.concatenate(pi) if pi else np.empty(0, dtype="int64")
+    j = np.concatenate(pj) if pj else np.empty(0, dtype="int64")
+    keep = np.where(rank[i] < rank[j], i, j)
+    drop = np.where(rank[i] < rank[j], j, i)
+
+    # one-to-one, closest pairs first (time and distance in tolerance units)
+    cost = (np.abs(t[i] - t[j]) / max_dt_s
+            + haversine_km(lat[i], lon[i], lat[j], lon[j]) / max_km)
+    by_cost = np.argsort(cost, kind="stable")
+    used = set()
+    matched = []
+    for p, a, b in zip(by_cost.tolist(), keep[by_cost].tolist(), drop[by_cost].tolist()):
+        if a not in used and b not in used:
+            used.update((a, b))
+            matched.append(p)
+    matched = np.sort(np.asarray(matched, dtype="int64"))
+    return order[keep[matched]], order[drop[matched]]
+
+
+def merge_catalogs(frames, priority=NETWORK_PRIORITY, max_dt_s=MAX_DT_S, max_km=MAX_KM, max_dmag=MAX_DMAG):
+    """
+    Concatenate cleaned catalogs ({network: frame}, frames need time/lat/lon/mag)
+    and drop the lower-priority copy of every cross-network duplicate.
+    Adds a network column. Prints merge statistics.
+    """
+    rank_of = {name: priority.index(name) if name in priority else len(priority) for name in frames}
+    df = pd.concat([f.assign(network=name) for name, f in frames.items()], ignore_index=True)
+    keep, drop = find_duplicates(
+        df["time"].to_numpy(dtype="int64"),
+        df["lat"].to_numpy(dtype=float),
+        df["lon"].to_numpy(dtype=float),
+        df["mag"].to_numpy(dtype=float),
+        df["network"].map(rank_of).to_numpy(),
+        max_dt_s=max_dt_s, max_km=max_km, max_dmag=max_dmag,
+    )
+
+    print(f"[merge] {len(drop):,} duplicates within {max_dt_s:g}s / {max_km:g} km / {max_dmag:g} mag "
+          f"({len(drop) / max(len(df), 1):.2%} of {len(df):,} events)")
+    if len(drop):
+        dt = np.abs(df["time"].to_numpy()[keep] - df["time"].to_numpy()[drop])
+        km = haversine_km(df["lat"].to_numpy()[keep], df["lon"].to_numpy()[keep],
+                          df["lat"].to_numpy()[drop], df["lon"].to_numpy()[drop])
+        dmag = np.abs(df["mag"].to_numpy()[keep] - df["mag"].to_numpy()[drop])
+        for name, n in df["network"].iloc[drop].value_counts().items():
+            print(f"[merge]   dropped {n:,} {name} records")
+        print(f"[merge]   median offsets: {np.median(dt):.1f}s, {np.median(km):.1f} km, {np.median(dmag):.2f} mag")
+
+    return df.drop(index=drop).reset_index(drop=True)
@@ -0,0 +1,308 @@
+"""
+Optional persistent catalog backend in SQLite.
+
+Events live in one table with B-tree indexes on time, magnitude and depth plus
+an R*Tree over lat/lon, so layer builders can pull exactly the rows they need
+with indexed queries instead of filtering a full in-memory frame. CSVs are
+ingested in chunks, which keeps catalogs larger than RAM usable.
+"""
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from .catalog import clean_catalog, epoch_year, year_start
+
+COLUMNS = ("time", "lat", "lon", "depth", "mag", "type", "county")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    time INTEGER,          -- epoch seconds (UTC)
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    depth REAL,            -- km
+    mag REAL NOT NULL,
+    type TEXT,
+    county TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS events_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE INDEX IF NOT EXISTS events_time ON events(time);
+CREATE INDEX IF NOT EXISTS events_mag ON events(mag);
+CREATE INDEX IF NOT EXISTS events_depth ON events(depth);
+CREATE INDEX IF NOT EXISTS events_county_time ON events(county, time);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS ingest_log (
+    id INTEGER PRIMARY KEY,
+    ingested_at INTEGER,   -- epoch seconds
+    source TEXT,
+    added INTEGER,
+    changes TEXT,          -- JSON: decades / counties / cells touched
+    rebuilt INTEGER DEFAULT 0
+);
+"""
+
+# same bands the magnitude / depth builders split on
+MAG_BANDS = [(None, 3.0), (3.0, 5.0), (5.0, None)]
+DEPTH_BANDS = [(None, 10.0), (10.0, 20.0), (20.0, None)]
+DEPTH_BAND_NAMES = {"0-10": DEPTH_BANDS[0], "10-20": DEPTH_BANDS[1], "20+": DEPTH_BANDS[2]}
+
+
+def catalog_filters(bbox=None, years=None, mag_min=None, mag_max=None, depth_band=None, county=None):
+    """
+    Map-level options -> the keyword filters of CatalogStore._where / filter_frame.
+    bbox is (west, south, east, north), years (first, last) inclusive,
+    depth_band one of DEPTH_BAND_NAMES.
+    """
+    filters = {}
+    if bbox is not None:
+        filters["bbox"] = tuple(bbox)
+    if years is not None:
+        filters["t0"], filters["t1"] = (int(v) for v in year_start([years[0], years[1] + 1]))
+    if mag_min is not None:
+        filters["mag_min"] = mag_min
+    if mag_max is not None:
+        filters["mag_max"] = mag_max
+    if depth_band is not None:
+        filters["depth_min"], filters["depth_max"] = DEPTH_BAND_NAMES[depth_band]
+    if county is not None:
+        filters["county"] = county
+    return filters
+
+
+def filter_frame(df, bbox=None, t0=None, t1=None, mag_min=None, mag_max=None,
+                 depth_min=None, depth_max=None, county=None, has_county=None):
+    """The rows of a cleaned catalog frame CatalogStore._where would select (same half-open ranges)."""
+    keep = pd.Series(True, index=df.index)
+    if bbox is not None:
+        west, south, east, north = bbox
+        keep &= df["lon"].between(west, east) & df["lat"].between(south, north)
+    for col, lo, hi in (("time", t0, t1), ("mag", mag_min, mag_max), ("depth", depth_min, depth_max)):
+        if lo is not None:
+            keep &= df[col] >= lo
+        if hi is not None:
+            keep &= df[col] < hi
+    if county is not None:
+        keep &= df["county"] == county
+    if has_county:
+        keep &= df["county"].notna() & (df["county"] != "Unknown")
+    return df[keep]
+
+
+class CatalogStore:
+    def __init__(self, path, **filters):
+        self.path = path
+        self.filters = filters
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def where(self, **filters):
+        """The same store with extra default filters (applied to every read), sharing the connection."""
+        view = CatalogStore.__new__(CatalogStore)
+        view.path, view.conn, view.filters = self.path, self.conn, dict(self.filters, **filters)
+        return view
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def watermark(self):
+        """Epoch seconds of the newest ingested event (None for an empty store)."""
+        value = self.get_meta("watermark")
+        if value is None:
+            value = self.conn.execute("SELECT MAX(time) FROM events").fetchone()[0]
+        return None if value is None else int(value)
+
+    def __len__(self):
+        return self.count()
+
+    def count(self, **filters):
+        where, params = self._where(**dict(self.filters, **filters))
+        return self.conn.execute(f"SELECT COUNT(*) FROM events e {where}", params).fetchone()[0]
+
+    def bounds(self, **filters):
+        """(lat min, lat max, lon min, lon max) of the matching events, None when there are none."""
+        where, params = self._where(**dict(self.filters, **filters))
+        row = self.conn.execute(f"SELECT MIN(e.lat), MAX(e.lat), MIN(e.lon), MAX(e.lon) FROM events e {where}",
+                                params).fetchone()
+        return None if row[0] is None else row
+
+    # ---- ingest -------------------------------------------------------------
+
+    def ingest_frame(self, df):
+        """Insert a cleaned catalog frame (output of clean_catalog). Returns rows added."""
+        rows = pd.DataFrame({
+            "time": df["time"].astype("int64"),
+            "lat": df["lat"].astype(float),
+            "lon": df["lon"].astype(float),
+            "depth": df["depth"].astype(float),
+            "mag": df["mag"].astype(float),
+            "type": df["type"] if "type" in df.columns else None,
+            "county": df["county"].where(df["county"] != "Unknown") if "county" in df.columns else None,
+        })
+        rows = rows.astype(object).where(rows.notna(), None)
+        with self.conn:
+            start = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0] + 1
+            ids = range(start, start + len(rows))
+            self.conn.executemany(
+                "INSERT INTO events (id, time, lat, lon, depth, mag, type, county) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                zip(ids, *(rows[c] for c in COLUMNS)),
+            )
+            self.conn.executemany(
+                "INSERT INTO events_rtree VALUES (?, ?, ?, ?, ?)",
+                zip(ids, rows["lat"], rows["lat"], rows["lon"], rows["lon"]),
+            )
+        return len(rows)
+
+    def ingest_csv(self, paths, chunksize=200_000, with_counties=False):
+        """Stream raw Kaggle-schema CSVs into the store chunk by chunk (constant memory)."""
+        total = 0
+        for path in paths:
+            for chunk in pd.read_csv(path, chunksize=chunksize):
+                total += self._ingest_chunk(clean_catalog(chunk), with_counties)
+                print(f"[store] {path.rsplit('/', 1)[-1]}: {total:,} events ingested", end="\r")
+        self._finish_ingest()
+        return total
+
+    def ingest_catalog(self, df, chunksize=200_000, with_counties=False):
+        """Insert an already cleaned (e.g. merged and deduplicated) catalog frame in chunks."""
+        total = 0
+        for start in range(0, len(df), chunksize):
+            total += self._ingest_chunk(df.iloc[start:start + chunksize], with_counties)
+            print(f"[store] {total:,} events ingested", end="\r")
+        self._finish_ingest()
+        return total
+
+    def _ingest_chunk(self, chunk, with_counties):
+        if with_counties:
+            from .filters_region import assign_counties
+            chunk = assign_counties(chunk, drop_unknown=False)
+        return self.ingest_frame(chunk)
+
+    def _finish_ingest(self):
+        self.conn.execute("ANALYZE")
+        self.set_meta("watermark", self.conn.execute("SELECT MAX(time) FROM events").fetchone()[0])
+        print(f"\n[store] {self.path}: {self.count():,} events total")
+
+    # ---- queries ------------------------------------------------------------
+
+    @staticmethod
+    def _where(bbox=None, t0=None, t1=None, mag_min=None, mag_max=None,
+               depth_min=None, depth_max=None, county=None, has_county=None):
+        """
+        SQL filter on alias e (plus an R*Tree join for bbox).
+        Ranges are half-open [min, max) to match the builders' band splits.
+        """
+        clauses, params, join = [], [], ""
+        if bbox is not None:
+            west, south, east, north = bbox
+            join = "JOIN events_rtree r ON r.id = e.id "
+            clauses.append("r.min_lat >= ? AND r.max_lat <= ? AND r.min_lon >= ? AND r.max_lon <= ?")
+            params += [south, north, west, east]
+        for col, lo, hi in (("time", t0, t1), ("mag", mag_min, mag_max), ("depth", depth_min, depth_max)):
+            if lo is not None:
+                clauses.append(f"e.{col} >= ?")
+                params.append(lo)
+            if hi is not None:
+                clauses.append(f"e.{col} < ?")
+                params.append(hi)
+        if county is not None:
+            clauses.append("e.county = ?")
+            params.append(county)
+        if has_county:
+            clauses.append("e.county IS NOT NULL")
+        return join + ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @staticmethod
+    def _to_frame(rows, columns):
+        df = pd.DataFrame.from_records(rows, columns=columns)
+        if "time" in df.columns:
+            # hand builders the same columns clean_catalog produces
+            df["year"] = epoch_year(df["time"])
+            df["decade"] = df["year"] // 10 * 10
+        return df
+
+    def query(self, columns=COLUMNS, sample=None, order_by=None, limit=None, chunksize=None, **filters):
+        """
+        Rows matching filters (see _where) as a DataFrame, or an iterator of
+        DataFrames when chunksize is given. sample=n returns a reproducible random
+        n-row subset; only matching ids are read to draw it.
+        """
+        cols = ", ".join(f"e.{c}" for c in columns)
+        where, params = self._where(**dict(self.filters, **filters))
+        if sample is not None:
+            ids = np.array([r[0] for r in self.conn.execute(f"SELECT e.id FROM events e {where}", params)])
+            if len(ids) > sample:
+                ids = np.sort(np.random.default_rng(42).choice(ids, sample, replace=False))
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS picked (id INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM picked")
+            self.conn.executemany("INSERT INTO picked VALUES (?)", ((int(i),) for i in ids))
+            sql, params = f"SELECT {cols} FROM picked p JOIN events e ON e.id = p.id", []
+        else:
+            sql = f"SELECT {cols} FROM events e {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        cursor = self.conn.execute(sql, params)
+        if chunksize is None:
+            return self._to_frame(cursor.fetchall(), columns)
+        return (self._to_frame(rows, columns) for rows in iter(lambda: cursor.fetchmany(chunksize), []))
+
+    def frames(self, columns=COLUMNS, chunksize=200_000, **filters):
+        """Filtered rows chunksize at a time (same role as PartitionedCatalog.frames)."""
+        return self.query(columns=columns, chunksize=chunksize, **filters)
+
+    def latest_per_county(self, per_county, columns=COLUMNS, **filters):
+        """The per_county most recent events of every county (region map input)."""
+        cols = ", ".join(f"e.{c}" for c in columns)
+        where, params = self._where(**dict(self.filters, has_county=True, **filters))
+        sql = (f"SELECT {', '.join(columns)} FROM ("
+               f"  SELECT {cols}, ROW_NUMBER() OVER (PARTITION BY e.county ORDER BY e.time DESC) AS rn"
+               f"  FROM events e {where}) WHERE rn <= ?")
+        return self._to_frame(self.conn.execute(sql, params + [per_county]).fetchall(), columns)
+
+    # ---- layer inputs -------------------------------------------------------
+
+    def group_sizes(self, mag_min=3.0, **filters):
+        """
+        Per-group row counts for payload_budget.plan_layer_caps, from indexed COUNTs.
+        filters (bbox, t0, t1; see _where) restrict every group.
+        """
+        sizes = {
+            "magnitude": [self.count(mag_min=lo, mag_max=hi, **filters) for lo, hi in MAG_BANDS],
+            "depth": [self.count(depth_min=lo, depth_max=hi, **filters) for lo, hi in DEPTH_BANDS],
+            "unified": [self.count(mag_min=mag_min, **filters)],
+        }
+        where, params = self._where(**dict(self.filters, has_county=True, **filters))
+        counties = self.conn.execute(
+            f"SELECT COUNT(*) FROM events e {where} GROUP BY e.county", params).fetchall()
+        if counties:
+            sizes["county"] = [c[0] for c in counties]
+        return sizes
+
+    def layer_frame(self, layer, cap, mag_min=3.0, **filters):
+        """
+        Exactly the rows a builder renders for a given cap: every band of the
+        magnitude/depth layers is sampled down to cap in SQL, so the builder's
+        own sampling becomes a no-op.
+        """
+        if layer == "magnitude":
+            parts = [self.query(sample=cap, mag_min=lo, mag_max=hi, **filters) for lo, hi in MAG_BANDS]
+        elif layer == "depth":
+            parts = [self.query(sample=cap, depth_min=lo, depth_max=hi, **filters) for lo, hi in DEPTH_BANDS]
+        elif layer == "unified":
+            return self.query(sample=cap, mag_min=mag_min, **filters)
+        elif layer == "county":
+            return self.latest_per_county(cap, **filters)
+        else:
+            raise ValueError(f"unknown layer {layer!r}")
+        return pd.concat(parts, ignore_index=True)
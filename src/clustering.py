@@ -0,0 +1,181 @@
+import numpy as np
+
+from .spatial_index import KM_PER_DEG, haversine_km
+
+DAY = 86400
+PAIR_CHUNK = 4_000_000  # candidate pairs evaluated per numpy batch
+
+
+def _components(n, ei, ej):
+    """Connected-component labels (min node id per component) via hook + pointer jumping."""
+    lab = np.arange(n)
+    if len(ei) == 0:
+        return lab
+    while True:
+        low = np.minimum(lab[ei], lab[ej])
+        new = lab.copy()
+        np.minimum.at(new, ei, low)
+        np.minimum.at(new, ej, low)
+        np.minimum.at(new, lab, new)  # hook roots too, not just the edge endpoints
+        while True:
+            jumped = new[new]
+            if np.array_equal(jumped, new):
+                break
+            new = jumped
+        if np.array_equal(new, lab):
+            return lab
+        lab = new
+
+
+def _cell_pairs(keys_sorted, starts, counts, offsets):
+    """Yield (rows_a, rows_b, same_cell) index batches for every pair of neighboring cells."""
+    cells = keys_sorted[starts]
+    for off in offsets:
+        nb = cells + off
+        pos = np.minimum(np.searchsorted(cells, nb), len(cells) - 1)
+        hit = cells[pos] == nb
+        a, b = np.nonzero(hit)[0], pos[hit]
+        sizes = counts[a] * counts[b]
+        # split the cell pairs so each batch expands to at most ~PAIR_CHUNK point pairs
+        cum = np.cumsum(sizes)
+        lo = 0
+        while lo < len(a):
+            done = cum[lo - 1] if lo else 0
+            hi = max(lo + 1, int(np.searchsorted(cum, done + PAIR_CHUNK, side="right")))
+            ca, cb, sz = a[lo:hi], b[lo:hi], sizes[lo:hi]
+            rep = np.repeat(np.arange(len(ca)), sz)
+            local = np.arange(sz.sum()) - np.repeat(np.cumsum(sz) - sz, sz)
+            nbb = counts[cb][rep]
+            yield starts[ca][rep] + local // nbb, starts[cb][rep] + local % nbb, off == 0
+            lo = hi
+
+
+def dbscan_haversine(lat, lon, eps_km=2.0, min_samples=20, t=None, eps_days=None, rho=0.25, return_core=False):
+    """
+    Density-based clustering (DBSCAN) on great-circle distance.
+
+    Neighbor search uses grid hashing: points are bucketed into cells at least
+    eps wide, so only the 3x3 (3x3x3 with time) surrounding cells are compared.
+    With t (epoch seconds) and eps_days, two events are neighbors only if they are
+    within eps_km AND within eps_days of each other.
+
+    rho > 0 enables the rho-approximate variant: events are first merged into
+    weighted micro-cells of size rho*eps, which bounds the work in very dense
+    areas (The Geysers, aftershock zones) at a distance error below rho*eps.
+    rho=None clusters every event individually (exact, slower on dense data).
+
+    Returns an int array of cluster labels (0 = largest cluster, -1 = noise),
+    and with return_core=True also the boolean core-point flags.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    n = len(lat)
+    if n == 0:
+        return (np.empty(0, dtype=int), np.empty(0, dtype=bool)) if return_core else np.empty(0, dtype=int)
+
+    # coarse cells >= eps in every dimension (lon width taken at the highest latitude)
+    cell_lat = eps_km / KM_PER_DEG
+    cell_lon = eps_km / (KM_PER_DEG * np.cos(np.radians(min(np.abs(lat).max(), 89.0))))
+    k = 1 if not rho else max(1, int(round(1.0 / rho)))
+    coords = [np.floor(lat / cell_lat * k), np.floor(lon / cell_lon * k)]
+    use_time = t is not None and eps_days is not None
+    if use_time:
+        t = np.asarray(t, dtype="int64")
+        eps_s = eps_days * DAY
+        coords.append(np.floor(t / eps_s * k))
+    micro = np.stack(coords, axis=1).astype("int64")
+
+    # merge events sharing a micro cell into one weighted point at their mean position
+    if k > 1:
+        micro, inverse, weight = np.unique(micro, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        p_lat = np.bincount(inverse, lat) / weight
+        p_lon = np.bincount(inverse, lon) / weight
+        p_t = np.bincount(inverse, t.astype(float)) / weight if use_time else None
+    else:
+        inverse, weight = np.arange(n), np.ones(n, dtype="int64")
+        p_lat, p_lon, p_t = lat, lon, (t.astype(float) if use_time else None)
+    m = len(weight)
+
+    # encode coarse cell coordinates into one sortable key
+    coarse = np.floor_divide(micro, k)
+    coarse -= coarse.min(axis=0) - 1
+    span = coarse.max(axis=0) + 2
+    key = coarse[:, 0]
+    for d in range(1, coarse.shape[1]):
+        key = key * span[d] + coarse[:, d]
+    order = np.argsort(key, kind="stable")
+    keys_sorted = key[order]
+    _, starts, counts = np.unique(keys_sorted, return_index=True, return_counts=True)
+
+    # half of the neighborhood (plus the cell itself) so each cell pair is visited once
+    dims = coarse.shape[1]
+    steps = np.array(np.meshgrid(*[[-1, 0, 1]] * dims, indexing="ij")).reshape(dims, -1).T
+    strides = np.array([np.prod(span[d + 1:]) for d in range(dims)], dtype="int64")
+    offsets = sorted({int(s @ strides) for s in steps if int(s @ strides) >= 0})
+
+    plat, plon = p_lat[order], p_lon[order]
+    pt = p_t[order] if use_time else None
+    w = weight[order].astype(float)
+    neighbor_w = w.copy()
+    edges_i, edges_j = [], []
+    for i, j, same in _cell_pairs(keys_sorted, starts, counts, offsets):
+        if same:
+            keep = i < j
+            i, j = i[keep], j[keep]
+        close = haversine_km(plat[i], plon[i], plat[j], plon[j]) <= eps_km
+        if use_time:
+            close &= np.abs(pt[i] - pt[j]) <= eps_s
+        i, j = i[close], j[close]
+        neighbor_w += np.bincount(i, w[j], minlength=m) + np.bincount(j, w[i], minlength=m)
+        edges_i.append(i)
+        edges_j.append(j)
+    ei = np.concatenate(edges_i) if edges_i else np.empty(0, dtype="int64")
+    ej = np.concatenate(edges_j) if edges_j else np.empty(0, dtype="int64")
+
+    core = neighbor_w >= min_samples
+    both = core[ei] & core[ej]
+    lab = _components(m, ei[both], ej[both])
+    lab = np.where(core, lab, -1)
+    # border points join the cluster of any core neighbor
+    for a, b in ((ei, ej), (ej, ei)):
+        border = core[a] & ~core[b]
+        lab[b[border]] = lab[a[border]]
+
+    # back to input order, relabelled 0..K-1 by descending size
+    micro_lab = np.empty(m, dtype="int64")
+    micro_lab[order] = lab
+    labels = micro_lab[inverse]
+    clustered = labels >= 0
+    if clustered.any():
+        ids, sizes = np.unique(labels[clustered], return_counts=True)
+        rank = np.empty(len(ids), dtype="int64")
+        rank[np.argsort(-sizes, kind="stable")] = np.arange(len(ids))
+        labels[clustered] = rank[np.searchsorted(ids, labels[clustered])]
+    if return_core:
+        micro_core = np.empty(m, dtype=bool)
+        micro_core[order] = core
+        return labels, micro_core[inverse]
+    return labels
+
+
+def _turn(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def convex_hull(lon, lat):
+    """Convex hull (monotone chain) of a point set, as a list of [lat, lon] for folium."""
+    pts = np.unique(np.column_stack([lon, lat]), axis=0)
+    if len(pts) < 3:
+        return [[float(y), float(x)] for x, y in pts]
+
+    def _half(points):
+        out = []
+        for p in points:
+            while len(out) >= 2 and _turn(out[-2], out[-1], p) <= 0:
+                out.pop()
+            out.append(p)
+        return out[:-1]
+
+    hull = _half(pts) + _half(pts[::-1])
+    return [[float(y), float(x)] for x, y in hull]
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import folium
+import branca.colormap as cm
+
+from .filters_region import load_counties
+
+MAG_BIN = 0.1
+MIN_B_EVENTS = 50  # fewer events above Mc than this gives no b-value
+
+
+def county_stats(df, bin_width=MAG_BIN, mc_correction=0.2, min_events=MIN_B_EVENTS):
+    """
+    Per-county summary from one grouped pass over a frame with county/mag columns.
+
+    A county x magnitude-bin histogram (single bincount) gives everything:
+    event count, max magnitude, radiated energy (log10 E[J] = 1.5 M + 4.8),
+    magnitude of completeness by maximum curvature (+ mc_correction) and the
+    Aki maximum-likelihood Gutenberg-Richter b-value above Mc.
+    """
+    df = df[df["county"].notna() & (df["county"] != "Unknown")]
+    codes, names = pd.factorize(df["county"])
+    mag = df["mag"].to_numpy(dtype=float)
+    if len(names) == 0:
+        return pd.DataFrame(columns=["events", "max_mag", "energy_j", "mc", "b_value", "b_events"])
+
+    lo = np.floor(mag.min() / bin_width) * bin_width
+    bins = np.round((mag - lo) / bin_width).astype(np.int64)
+    n_bins = int(bins.max()) + 1
+    hist = np.bincount(codes * n_bins + bins, minlength=len(names) * n_bins).reshape(len(names), n_bins)
+    energy = np.bincount(codes, weights=10 ** (1.5 * mag + 4.8), minlength=len(names))
+    max_mag = np.full(len(names), -np.inf)
+    np.maximum.at(max_mag, codes, mag)
+
+    centers = lo + np.arange(n_bins) * bin_width
+    mc = centers[hist.argmax(axis=1)] + mc_correction
+    above = centers[None, :] >= mc[:, None] - bin_width / 2
+    b_events = (hist * above).sum(axis=1)
+    mean_above = (hist * above * centers).sum(axis=1) / np.maximum(b_events, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        b_value = np.log10(np.e) / (mean_above - (mc - bin_width / 2))
+    b_value[b_events < min_events] = np.nan
+
+    return pd.DataFrame({
+        "events": hist.sum(axis=1),
+        "max_mag": max_mag,
+        "energy_j": energy,
+        "mc": np.round(mc, 2),
+        "b_value": np.round(b_value, 2),
+        "b_events": b_events,
+    }, index=pd.Index(names, name="county"))
+
+
+def add_county_choropleth(m, stats, simplify_deg=0.005, show=True):
+    """
+    Statewide county overview: fill = log10(event count), tooltip with all stats.
+    Kept out of the layer control so the region dropdown never hides it.
+    """
+    import shapely
+
+    gdf = load_counties()[["name", "geometry"]].copy()
+    # coarse outlines are plenty at statewide zoom and keep the payload small
+    gdf["geometry"] = shapely.set_precision(gdf.geometry.simplify(simplify_deg).values, 0.001)
+    gdf = gdf.merge(stats, left_on="name", right_index=True, how="left")
+
+    gdf["events"] = gdf["events"].fillna(0).astype(int)
+    gdf["log_events"] = np.log10(gdf["events"] + 1)
+    gdf["Events"] = gdf["events"].map("{:,}".format)
+    gdf["Max M"] = gdf["max_mag"].map(lambda v: f"{v:.1f}" if pd.notna(v) else "—")
+    gdf["Energy"] = gdf["energy_j"].map(lambda v: f"{v:.2e} J" if pd.notna(v) else "—")
+    gdf["b-value"] = [f"{b:.2f} (Mc {mc:.1f}, n={int(n):,})" if pd.notna(b) else "—"
+                      for b, mc, n in zip(gdf["b_value"], gdf["mc"], gdf["b_events"])]
+    gdf = gdf[["name", "log_events", "Events", "Max M", "Energy", "b-value", "geometry"]]
+
+    colormap = cm.linear.YlOrRd_09.scale(0, max(float(gdf["log_events"].max()), 1.0))
+    colormap.caption = "Earthquakes per county (log10)"
+
+    folium.GeoJson(
+        gdf.to_json(drop_id=True),
+        name="County Overview",
+        style_function=lambda f: {
+            "fillColor": colormap(f["properties"]["log_events"]) if f["properties"]["log_events"] > 0 else "#eeeeee",
+            "color": "#666666",
+            "weight": 1,
+            "fillOpacity": 0.45,
+        },
+        highlight_function=lambda f: {"weight": 3, "color": "#333333"},
+        tooltip=folium.GeoJsonTooltip(fields=["name", "Events", "Max M", "Energy", "b-value"],
+                                      aliases=["County", "Events", "Max M", "Energy", "b-value"]),
+        control=False,
+        show=show,
+    ).add_to(m)
+    colormap.add_to(m)
+
+    print(f"[county overview] {int((gdf['log_events'] > 0).sum())} counties with events, "
+          f"{int(stats['b_value'].notna().sum())} with a b-value")
+    return m
@@ -0,0 +1,111 @@
+"""
+Hidden layers built on first use instead of at page load.
+
+A layer added with show=False normally still has all its markers created
+(and clustered) by the browser while the page loads. defer_hidden_layers
+changes how such layers render: the page defines an empty L.layerGroup under
+the layer's variable name (so LayerControl and everything else referencing
+it keep working) and wraps the real layer's script, one function per child
+marker / shape, in a factory. The first time the layer is switched on the
+functions run in ~8 ms slices, one slice per animation frame, so the page
+stays responsive, and the finished layer is put into the placeholder.
+"""
+import functools
+
+from branca.element import Element
+from folium.map import Layer
+from folium.raster_layers import TileLayer
+
+FRAME_BUDGET_MS = 8
+
+RUNTIME = """
+<script>
+window.QuakeDeferred = (function(){
+  function build(host, factory){
+    var t0 = performance.now(), def = factory(), steps = def.steps, i = 0;
+    function slice(){
+      var start = performance.now();
+      while (i < steps.length && performance.now() - start < %(budget)d) steps[i++]();
+      if (i < steps.length) return requestAnimationFrame(slice);
+      var layer = def.layer();
+      // let the cluster plugin spread its own clustering pass over frames too
+      if (L.MarkerClusterGroup && layer instanceof L.MarkerClusterGroup) layer.options.chunkedLoading = true;
+      host.addLayer(layer);
+      if (window.QuakePerf) QuakePerf.afterFrame("deferred layer", host._perfName || "", "built", t0);
+    }
+    slice();
+  }
+  return {
+    register: function(host, factory){
+      host.once("add", function(){ build(host, factory); });
+    }
+  };
+})();
+</script>
+""" % {"budget": FRAME_BUDGET_MS}
+
+
+def _capture(figure, render):
+    """Run render() and return the scripts it adds to figure.script instead of adding them."""
+    script = figure.script
+    previous = script.__dict__.get("add_child")  # html_writer.save_map may have patched it
+    parts = []
+
+    def add_child(child, name=None, index=None):
+        child._parent = script
+        parts.append(child.render())
+        return script
+
+    script.add_child = add_child
+    try:
+        render()
+    finally:
+        if previous is None:
+            del script.add_child
+        else:
+            script.add_child = previous
+    return parts
+
+
+def _render_deferred(layer, **kwargs):
+    figure = layer.get_root()
+    name = layer.get_name()
+    children, layer._children = layer._children, {}
+    try:
+        own = "\n".join(_capture(figure, lambda: type(layer).render(layer, **kwargs)))
+    finally:
+        layer._children = children
+    steps = [_capture(figure, functools.partial(child.render, **kwargs)) for child in children.values()]
+
+    declaration = f"var {name} ="
+    if declaration not in own:
+        # not a plain "var name = ..." layer script: render it as usual
+        for text in [own] + ["\n".join(s) for s in steps]:
+            figure.script.add_child(Element(text))
+        return
+
+    figure.header.add_child(Element(RUNTIME), name="quake_deferred_runtime")
+    bodies = [own.replace(declaration, f"{name} =", 1)] + ["\n".join(s) for s in steps]
+    js = (f"var {name} = L.layerGroup();\n"
+          f"QuakeDeferred.register({name}, function(){{\n"
+          f"  var {name};\n"
+          f"  return {{layer: function(){{ return {name}; }}, steps: [\n"
+          + ",\n".join(f"function(){{{body}\n}}" for body in bodies)
+          + "]};\n});")
+    figure.script.add_child(Element(js), name=name)
+
+
+def _deferrable(layer):
+    # tiles are cheap and self-loading; layers without children or inline data
+    # (e.g. the live query layer) have nothing to defer
+    if not isinstance(layer, Layer) or isinstance(layer, TileLayer) or layer.show:
+        return False
+    return bool(layer._children) or hasattr(layer, "data")
+
+
+def defer_hidden_layers(m):
+    """Make every hidden (show=False) overlay on m build on first toggle. Returns the number deferred."""
+    layers = [child for child in m._children.values() if _deferrable(child)]
+    for layer in layers:
+        layer.render = functools.partial(_render_deferred, layer)
+    return len(layers)
@@ -0,0 +1,179 @@
+"""
+Offline density tiles for the full catalog.
+
+Every event is projected to Web Mercator pixels per zoom level, aggregated
+per pixel (count, max magnitude or mean depth), colorized and written as
+z/x/y PNG tiles that a folium TileLayer can serve from disk:
+
+    outputs/tiles/count/7/21/49.png
+
+Only occupied pixels are ever materialized, so memory follows the data,
+not the map extent, and the browser cost is constant whatever the catalog size.
+A store (CatalogStore / PartitionedCatalog) is read one chunk or partition at
+a time and the per-pixel sums are merged, so the catalog never has to fit in
+memory.
+"""
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+import folium
+
+TILE_DIR = "outputs/tiles"
+TILE = 256
+MODES = ("count", "mag", "depth")
+
+# (position in [0, 1], hex color) stops; mag/depth reuse the marker layers' colors
+RAMPS = {
+    "count": [(0.0, "#ffffb2"), (0.25, "#fecc5c"), (0.5, "#fd8d3c"), (0.75, "#f03b20"), (1.0, "#bd0026")],
+    "mag": [(0.0, "#4a90e2"), (1 / 3, "#f5a623"), (2 / 3, "#d0021b"), (1.0, "#67000d")],
+    "depth": [(0.0, "#50c878"), (0.5, "#ff8c00"), (1.0, "#9b59b6")],
+}
+MAG_RANGE = (1.0, 7.0)     # 3.0 and 5.0 land on the mag ramp's stops
+DEPTH_RANGE = (0.0, 30.0)  # km; 10 / 20 km bands sit between the stops
+
+
+def _ramp(stops):
+    # 256-entry RGB lookup table interpolated between the stops
+    pos = [p for p, _ in stops]
+    rgb = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for _, c in stops], dtype=float)
+    x = np.linspace(0.0, 1.0, 256)
+    return np.column_stack([np.interp(x, pos, rgb[:, k]) for k in range(3)]).astype(np.uint8)
+
+
+LUTS = {mode: _ramp(stops) for mode, stops in RAMPS.items()}
+
+
+def write_png(path, rgba):
+    """Minimal RGBA PNG writer (stdlib zlib/struct only)."""
+    h, w, _ = rgba.shape
+    raw = np.zeros((h, w * 4 + 1), dtype=np.uint8)  # filter byte 0 (None) on every row
+    raw[:, 1:] = rgba.reshape(h, w * 4)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    with open(path, "wb") as fh:
+        fh.write(b"\x89PNG\r\n\x1a\n")
+        fh.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0)))
+        fh.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        fh.write(chunk(b"IEND", b""))
+
+
+def mercator_pixels(lat, lon, zoom):
+    """Global Web Mercator pixel coordinates (int64) at a zoom level."""
+    size = TILE * 2 ** zoom
+    s = np.sin(np.radians(np.clip(lat, -85.05, 85.05)))
+    x = (np.asarray(lon, dtype=float) + 180.0) / 360.0 * size
+    y = (0.5 - np.log((1 + s) / (1 - s)) / (4 * np.pi)) * size
+    return (np.clip(x, 0, size - 1).astype(np.int64), np.clip(y, 0, size - 1).astype(np.int64))
+
+
+def pixel_sums(key, counts, sums, peaks):
+    """
+    Reduce (pixel key, count, value sum, value max) rows to one row per
+    occupied pixel. Partial sums of different chunks merge the same way.
+    """
+    pixels, inverse = np.unique(key, return_inverse=True)
+    peak = np.full(len(pixels), -np.inf)
+    np.maximum.at(peak, inverse, peaks)
+    return (pixels, np.bincount(inverse, weights=counts, minlength=len(pixels)),
+            np.bincount(inverse, weights=sums, minlength=len(pixels)), peak)
+
+
+def pixel_values(counts, sums, peaks, mode):
+    """Per-pixel value of a mode from the merged sums: event count, max magnitude or mean depth."""
+    if mode == "count":
+        return counts
+    if mode == "mag":
+        return peaks
+    if mode == "depth":
+        return sums / counts
+    raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+
+
+def colorize(value, mode, vmax=None, log=True):
+    """Pixel values -> RGBA rows (uint8)."""
+    if mode == "count":
+        norm = np.log1p(value) / np.log1p(vmax) if log else value / vmax
+        alpha = 150 + 100 * norm
+    else:
+        lo, hi = MAG_RANGE if mode == "mag" else DEPTH_RANGE
+        norm = (value - lo) / (hi - lo)
+        alpha = np.full(len(value), 220.0)
+    idx = (np.clip(norm, 0.0, 1.0) * 255).astype(np.int64)
+    return np.column_stack([LUTS[mode][idx], np.clip(alpha, 0, 255).astype(np.uint8)])
+
+
+def build_density_tiles(df, out_dir=TILE_DIR, mode="count", zooms=range(5, 11), log=True):
+    """
+    Rasterize every row of df into out_dir/<mode>/{z}/{x}/{y}.png for each zoom.
+    df is a frame, a CatalogStore or a PartitionedCatalog (read chunk by chunk).
+    mode: "count" (events per pixel, log-scaled unless log=False), "mag" (max
+    magnitude) or "depth" (mean depth). Returns {zoom: tiles written}.
+    """
+    from .partitions import partition_frames
+
+    start = time.perf_counter()
+    pixel_values(np.ones(0), np.ones(0), np.ones(0), mode)  # validate before reading anything
+    zooms = list(zooms)
+    col = {"count": "lat", "mag": "mag", "depth": "depth"}[mode]
+    merged = {z: (np.empty(0, dtype=np.int64),) + (np.empty(0),) * 3 for z in zooms}
+    n_events = 0
+    for part in partition_frames(df, tuple(dict.fromkeys(("lat", "lon", col)))):
+        part = part.dropna(subset=["lat", "lon", col])
+        lat = part["lat"].to_numpy(dtype=float)
+        lon = part["lon"].to_numpy(dtype=float)
+        values = part[col].to_numpy(dtype=float)
+        n_events += len(part)
+        for z in zooms:
+            px, py = mercator_pixels(lat, lon, z)
+            chunk = (py * (TILE * 2 ** z) + px, np.ones(len(px)), values, values)
+            merged[z] = pixel_sums(*map(np.concatenate, zip(merged[z], chunk)))
+
+    written = {}
+    for z in zooms:
+        size = TILE * 2 ** z
+        pixels, counts, sums, peaks = merged.pop(z)
+        px, py, value = pixels % size, pixels // size, pixel_values(counts, sums, peaks, mode)
+        if len(value) == 0:
+            continue
+        rgba = colorize(value, mode, vmax=value.max(), log=log)
+
+        # group occupied pixels by tile; each tile is one contiguous run after sorting
+        tiles_per_row = 2 ** z
+        tile_key = (py // TILE) * tiles_per_row + px // TILE
+        order = np.argsort(tile_key, kind="stable")
+        tile_key, px, py, rgba = tile_key[order], px[order], py[order], rgba[order]
+        keys, first = np.unique(tile_key, return_index=True)
+        bounds = np.append(first, len(tile_key))
+        for k, (a, b) in enumerate(zip(bounds[:-1], bounds[1:])):
+            ty, tx = divmod(int(keys[k]), tiles_per_row)
+            img = np.zeros((TILE, TILE, 4), dtype=np.uint8)
+            img[py[a:b] % TILE, px[a:b] % TILE] = rgba[a:b]
+            tile_dir = os.path.join(out_dir, mode, str(z), str(tx))
+            os.makedirs(tile_dir, exist_ok=True)
+            write_png(os.path.join(tile_dir, f"{ty}.png"), img)
+        written[z] = len(keys)
+
+    print(f"[tiles] {n_events:,} events -> {sum(written.values()):,} {mode} tiles "
+          f"(z{min(written, default=0)}–{max(written, default=0)}) in {time.perf_counter() - start:.1f}s")
+    return written
+
+
+def add_density_tiles(m, url, mode="count", max_native_zoom=10, show=False, opacity=0.85):
+    """TileLayer over pre-rendered tiles; url is relative to the saved page, e.g. "tiles/count/{z}/{x}/{y}.png"."""
+    names = {"count": "event density", "mag": "max magnitude", "depth": "mean depth"}
+    folium.raster_layers.TileLayer(
+        tiles=url,
+        name=f"Full Catalog: {names[mode]} (tiles)",
+        attr="Catalog density tiles",
+        overlay=True,
+        control=True,
+        show=show,
+        max_native_zoom=max_native_zoom,
+        max_zoom=18,
+        opacity=opacity,
+    ).add_to(m)
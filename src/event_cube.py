@@ -0,0 +1,268 @@
+"""
+Summary charts from a precomputed event cube.
+
+The catalog is aggregated once into a dense cube
+
+    year x magnitude bin x depth band x region (county)
+
+holding the event count and the radiated energy of every cell. It is embedded
+in the page as two base64 typed arrays (a few hundred KB for the whole
+catalog), and a collapsible panel slices it in the browser: magnitude
+histogram, events per year and energy per year for any region / county,
+year range and depth bands, without ever touching the individual events.
+"""
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+from branca.element import Element, MacroElement
+from folium.template import Template
+
+from .catalog import epoch_year
+from .filters_region import REGIONS
+
+MAG_EDGES = np.round(np.arange(2.0, 7.01, 0.5), 1)  # bins: <2, 2.0-2.5, ..., 6.5-7.0, 7+
+DEPTH_EDGES = (10.0, 20.0)                         # same bands as the depth layers
+DEPTH_LABELS = ("0-10 km", "10-20 km", "20+ km")
+ALL = "All California"
+
+
+def _mag_labels():
+    edges = [f"{e:.1f}" for e in MAG_EDGES]
+    return [f"<{edges[0]}"] + [f"{a}-{b}" for a, b in zip(edges, edges[1:])] + [f"{edges[-1]}+"]
+
+
+def _cube_cells(df, region_col):
+    """Event count and energy per occupied (year, mag bin, depth band, region) of one partition."""
+    if region_col:
+        df = df[df[region_col].notna() & (df[region_col] != "Unknown")]
+    mag = df["mag"].to_numpy(dtype=float)
+    return pd.DataFrame({
+        "year": epoch_year(df["time"].to_numpy()),
+        "m": np.searchsorted(MAG_EDGES, mag, side="right"),
+        "d": np.searchsorted(DEPTH_EDGES, df["depth"].to_numpy(dtype=float), side="right"),
+        "region": df[region_col].to_numpy() if region_col else ALL,
+        "count": 1,
+        "energy": 10 ** (1.5 * mag + 4.8),
+    }).groupby(["year", "m", "d", "region"], as_index=False)[["count", "energy"]].sum()
+
+
+def build_cube(df, region_col="county"):
+    """
+    Aggregate a cleaned catalog frame (time, mag, depth and optionally a
+    county column) into the cube. Rows without a county are left out when
+    region_col is present; without it the region axis has the single entry
+    ALL. df may also be a PartitionedCatalog or a CatalogStore: the cells of
+    every partition / chunk are summed. Returns a dict of the axes plus "count" (int64) and "energy"
+    (joules, log10 E = 1.5 M + 4.8) arrays of shape
+    (years, mag bins, depth bands, regions).
+    """
+    from .partitions import partition_frames
+
+    if region_col and isinstance(df, pd.DataFrame) and region_col not in df.columns:
+        region_col = None
+    columns = ("time", "mag", "depth") + ((region_col,) if region_col else ())
+    parts = [_cube_cells(part, region_col) for part in partition_frames(df, columns)]
+    if not parts:
+        parts = [pd.DataFrame({"year": [], "m": [], "d": [], "region": [], "count": [], "energy": []}, dtype="int64")]
+    cells = pd.concat(parts, ignore_index=True)
+
+    regions = np.sort(cells["region"].unique()) if region_col else np.array([ALL])
+    first = int(cells["year"].min()) if len(cells) else 0
+    years = np.arange(first, int(cells["year"].max()) + 1 if len(cells) else first)
+    shape = (len(years), len(MAG_EDGES) + 1, len(DEPTH_EDGES) + 1, len(regions))
+    flat = np.ravel_multi_index((cells["year"].to_numpy() - first, cells["m"].to_numpy(), cells["d"].to_numpy(),
+                                 np.searchsorted(regions, cells["region"].to_numpy())), shape)
+    size = int(np.prod(shape))
+    return {
+        "years": years.tolist(),
+        "mag_bins": _mag_labels(),
+        "depth_bands": list(DEPTH_LABELS),
+        "regions": regions.tolist(),
+        "count": np.bincount(flat, weights=cells["count"].to_numpy(), minlength=size).astype("int64").reshape(shape),
+        "energy": np.bincount(flat, weights=cells["energy"].to_numpy(), minlength=size).reshape(shape),
+    }
+
+
+def _typed(values, dtype, name):
+    return {"t": name, "b": base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode("ascii")}
+
+
+def cube_payload(cube):
+    """JSON-ready cube: axes, region groups, counts in the smallest unsigned type and energy as float32."""
+    count = cube["count"]
+    top = int(count.max()) if count.size else 0
+    name, dtype = next((n, t) for n, t in (("u8", "<u1"), ("u16", "<u2"), ("u32", "<u4"))
+                       if top <= np.iinfo(t).max)
+    present = set(cube["regions"])
+    groups = {group: [c for c in counties if c in present] for group, counties in REGIONS.items()}
+    return {
+        "years": cube["years"],
+        "mag_bins": cube["mag_bins"],
+        "depth_bands": cube["depth_bands"],
+        "regions": cube["regions"],
+        "groups": {group: counties for group, counties in groups.items() if counties},
+        "count": _typed(count, dtype, name),
+        "energy": _typed(cube["energy"], "<f4", "f32"),
+    }
+
+
+PANEL = """
+<style>
+  #quake-cube{
+    width:360px;
+    background:rgba(255,255,255,.96); border:1px solid #bbb; border-radius:8px;
+    font:12px/1.4 system-ui,-apple-system,Segoe UI,Roboto,Arial; box-shadow:0 2px 10px rgba(0,0,0,.15);
+  }
+  #quake-cube summary{ cursor:pointer; padding:6px 10px; font-weight:bold; }
+  #quake-cube .body{ padding:0 10px 8px; max-height:70vh; overflow:auto; }
+  #quake-cube select, #quake-cube input[type=number]{ font:inherit; padding:2px; }
+  #quake-cube input[type=number]{ width:60px; }
+  #quake-cube .row{ margin:4px 0; }
+  #quake-cube h5{ margin:8px 0 2px; font-size:12px; }
+  #quake-cube svg{ display:block; width:100%; height:auto; }
+  #quake-cube .note{ color:#777; font-size:11px; }
+</style>
+<details id="quake-cube"><summary>📊 Catalog summary</summary><div class="body">
+  <div class="row"><select id="qc-region" style="width:100%"></select></div>
+  <div class="row">Years <input type="number" id="qc-y0"> – <input type="number" id="qc-y1"></div>
+  <div class="row" id="qc-depth"></div>
+  <div id="qc-total" class="row"></div>
+  <h5>Magnitude histogram (events, log scale)</h5><div id="qc-hist"></div>
+  <h5>Events per year</h5><div id="qc-count"></div>
+  <h5>Radiated energy per year (log10 J)</h5><div id="qc-energy"></div>
+  <div class="note" id="qc-time"></div>
+</div></details>
+<script>
+(function(){
+  var C = {{CUBE}};
+  function typed(c){
+    var raw = atob(c.b), bytes = new Uint8Array(raw.length);
+    for (var i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+    return new ({u8: Uint8Array, u16: Uint16Array, u32: Uint32Array, f32: Float32Array}[c.t])(bytes.buffer);
+  }
+  var count = typed(C.count), energy = typed(C.energy);
+  var NY = C.years.length, NM = C.mag_bins.length, ND = C.depth_bands.length, NR = C.regions.length;
+  var $ = function(id){ return document.getElementById(id); };
+
+  var region = $("qc-region"), y0 = $("qc-y0"), y1 = $("qc-y1"), depth = $("qc-depth");
+  function option(value, text){
+    var o = document.createElement("option"); o.value = value; o.textContent = text; region.appendChild(o);
+  }
+  option("*", "All regions");
+  Object.keys(C.groups).forEach(function(g){ option("g:" + g, g); });
+  C.regions.forEach(function(r, i){ if (NR > 1) option("r:" + i, "  " + r + " County"); });
+  region.value = "*";
+  C.depth_bands.forEach(function(label, i){
+    depth.insertAdjacentHTML("beforeend", "<label style='margin-right:8px'><input type='checkbox' data-d='" + i
+      + "' checked> " + label + "</label>");
+  });
+  y0.value = C.years[0]; y1.value = C.years[NY - 1];
+  y0.min = y1.min = C.years[0]; y0.max = y1.max = C.years[NY - 1];
+
+  function selectedRegions(){
+    var v = region.value, keep = new Uint8Array(NR);
+    if (v === "*") keep.fill(1);
+    else if (v.indexOf("r:") === 0) keep[+v.slice(2)] = 1;
+    else C.groups[v.slice(2)].forEach(function(c){ keep[C.regions.indexOf(c)] = 1; });
+    return keep;
+  }
+
+  // one pass over the cube: marginals for the current selection
+  function slice(){
+    var keepR = selectedRegions(), keepD = new Uint8Array(ND);
+    depth.querySelectorAll("input").forEach(function(el){ keepD[+el.getAttribute("data-d")] = el.checked ? 1 : 0; });
+    var a = Math.max(0, +y0.value - C.years[0]), b = Math.min(NY - 1, +y1.value - C.years[0]);
+    var byMag = new Float64Array(NM), byYear = new Float64Array(NY), eYear = new Float64Array(NY);
+    for (var y = a; y <= b; y++) {
+      for (var m = 0; m < NM; m++) {
+        for (var d = 0; d < ND; d++) {
+          if (!keepD[d]) continue;
+          var base = ((y * NM + m) * ND + d) * NR;
+          for (var r = 0; r < NR; r++) {
+            if (!keepR[r]) continue;
+            var n = count[base + r];
+            if (n) { byMag[m] += n; byYear[y] += n; eYear[y] += energy[base + r]; }
+          }
+        }
+      }
+    }
+    return {a: a, b: b, byMag: byMag, byYear: byYear, eYear: eYear};
+  }
+
+  function bars(values, labels, log, color, fmt){
+    fmt = fmt || function(v){ return Math.round(v).toLocaleString("en-US"); };
+    var W = 340, H = 110, pad = 18, n = values.length, bw = (W - 4) / n, top = 0;
+    var scale = function(v){ return log ? Math.log10(v + 1) : v; };
+    for (var i = 0; i < n; i++) top = Math.max(top, scale(values[i]));
+    var svg = "<svg viewBox='0 0 " + W + " " + (H + pad) + "'>";
+    for (var j = 0; j < n; j++) {
+      var h = top ? scale(values[j]) / top * H : 0;
+      svg += "<rect x='" + (2 + j * bw).toFixed(1) + "' y='" + (H - h).toFixed(1) + "' width='"
+        + Math.max(bw - 1, 0.5).toFixed(1) + "' height='" + h.toFixed(1) + "' fill='" + color + "'>"
+        + "<title>" + labels[j] + ": " + fmt(values[j]) + "</title></rect>";
+    }
+    var every = Math.ceil(n / 6);
+    for (var k = 0; k < n; k += every) {
+      svg += "<text x='" + (2 + k * bw).toFixed(1) + "' y='" + (H + 13) + "' font-size='10' fill='#555'>"
+        + labels[k] + "</text>";
+    }
+    return svg + "</svg>";
+  }
+
+  function draw(){
+    var t0 = performance.now(), s = slice(), dt = performance.now() - t0;
+    var years = C.years.slice(s.a, s.b + 1);
+    var byYear = Array.prototype.slice.call(s.byYear, s.a, s.b + 1);
+    var eLog = Array.prototype.slice.call(s.eYear, s.a, s.b + 1).map(function(e){ return e ? Math.log10(e) : 0; });
+    var total = 0, joules = 0;
+    for (var i = 0; i < s.byMag.length; i++) total += s.byMag[i];
+    for (var j = s.a; j <= s.b; j++) joules += s.eYear[j];
+    $("qc-total").innerHTML = "<b>" + total.toLocaleString("en-US") + "</b> events, "
+      + (joules ? joules.toExponential(2) : "0") + " J";
+    $("qc-hist").innerHTML = bars(s.byMag, C.mag_bins, true, "#d35400");
+    $("qc-count").innerHTML = bars(byYear, years, false, "#2c7fb8");
+    $("qc-energy").innerHTML = bars(eLog, years, false, "#7b3294", function(v){ return v.toFixed(1); });
+    $("qc-time").textContent = "cube " + NY + "×" + NM + "×" + ND + "×" + NR + ", sliced in "
+      + (dt < 1 ? Math.round(dt * 1000) + " µs" : dt.toFixed(1) + " ms");
+  }
+
+  [region, y0, y1, depth].forEach(function(el){ el.addEventListener("change", draw); });
+  $("quake-cube").addEventListener("toggle", function(){ if (this.open) draw(); });
+})();
+</script>
+"""
+
+
+class CubeControl(MacroElement):
+    """Docks the #quake-cube panel into the map as a top right control, stacked with the other controls there."""
+
+    _template = Template("""
+    {% macro script(this, kwargs) %}
+    (function(){
+      var panel = document.getElementById("quake-cube"), box = L.control({position: "topright"});
+      box.onAdd = function(){
+        L.DomEvent.disableClickPropagation(panel);
+        L.DomEvent.disableScrollPropagation(panel);
+        return panel;
+      };
+      box.addTo({{ this._parent.get_name() }});
+    })();
+    {% endmacro %}
+    """)
+
+    def __init__(self):
+        super().__init__()
+        self._name = "CubeControl"
+
+
+def add_event_cube_panel(m, df, region_col="county"):
+    """Aggregate df into the event cube and add the collapsible summary panel (top right) to m."""
+    cube = build_cube(df, region_col=region_col)
+    payload = json.dumps(cube_payload(cube), separators=(",", ":"))
+    m.get_root().html.add_child(Element(PANEL.replace("{{CUBE}}", payload)))
+    CubeControl().add_to(m)
+    print(f"[cube] {' x '.join(map(str, cube['count'].shape))} cells "
+          f"({int(cube['count'].sum()):,} events), {len(payload) / 1e3:.0f} KB embedded")
+    return m
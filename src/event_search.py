@@ -0,0 +1,367 @@
+"""
+Client-side event search ("1994 M6.7", "northridge m6+", "1990-2000 >5 san simeon").
+
+The page gets a compact index built once at build time:
+
+    events      sorted by time: time (seconds after the first event), mag,
+                lat, lon, depth and distance to the nearest place, as base64 typed arrays
+    places      a small gazetteer; every event is assigned its nearest place and
+                each place lists its events (ascending, so in time order too)
+    tokens      sorted lower-case name tokens -> places, matched by prefix
+
+A query is parsed into a time range, a magnitude range and place words. The
+time range is two binary searches (per matching place when a place is
+given), then one scan of the slice keeps the largest events. Picking a
+result flies the map to it and opens its popup.
+"""
+import base64
+import json
+import re
+
+import numpy as np
+from branca.element import MacroElement
+from folium.template import Template
+
+from .spatial_index import haversine_km
+
+# (name, lat, lon): California cities and towns plus localities of notable sequences
+PLACES = (
+    ("Los Angeles", 34.052, -118.244), ("San Diego", 32.716, -117.161), ("San Jose", 37.339, -121.895),
+    ("San Francisco", 37.775, -122.419), ("Fresno", 36.738, -119.787), ("Sacramento", 38.582, -121.494),
+    ("Long Beach", 33.770, -118.194), ("Oakland", 37.804, -122.271), ("Bakersfield", 35.373, -119.019),
+    ("Anaheim", 33.836, -117.914), ("Riverside", 33.953, -117.396), ("Stockton", 37.958, -121.291),
+    ("Santa Rosa", 38.440, -122.714), ("San Bernardino", 34.108, -117.290), ("Modesto", 37.639, -120.997),
+    ("Oxnard", 34.197, -119.177), ("Palmdale", 34.579, -118.116), ("Lancaster", 34.698, -118.137),
+    ("Pasadena", 34.148, -118.144), ("Santa Barbara", 34.420, -119.698), ("Ventura", 34.275, -119.229),
+    ("Santa Cruz", 36.974, -122.031), ("Salinas", 36.678, -121.656), ("Monterey", 36.600, -121.894),
+    ("San Luis Obispo", 35.283, -120.660), ("Paso Robles", 35.627, -120.691), ("Santa Maria", 34.953, -120.436),
+    ("Visalia", 36.330, -119.292), ("Merced", 37.302, -120.483), ("Redding", 40.587, -122.392),
+    ("Chico", 39.729, -121.837), ("Eureka", 40.802, -124.164), ("Crescent City", 41.756, -124.202),
+    ("Ukiah", 39.150, -123.208), ("Napa", 38.297, -122.286), ("Vallejo", 38.104, -122.257),
+    ("Berkeley", 37.872, -122.273), ("Fremont", 37.548, -121.989), ("Hayward", 37.669, -122.081),
+    ("Livermore", 37.682, -121.768), ("Walnut Creek", 37.910, -122.065), ("Hollister", 36.853, -121.402),
+    ("Gilroy", 37.006, -121.568), ("Watsonville", 36.910, -121.757), ("Coalinga", 36.140, -120.360),
+    ("Parkfield", 35.900, -120.433), ("San Simeon", 35.644, -121.190), ("Loma Prieta", 37.111, -121.845),
+    ("Northridge", 34.228, -118.537), ("San Fernando", 34.282, -118.439), ("Whittier", 33.979, -118.033),
+    ("Malibu", 34.026, -118.780), ("Santa Clarita", 34.392, -118.543), ("Irvine", 33.684, -117.826),
+    ("Palm Springs", 33.830, -116.545), ("Indio", 33.721, -116.216), ("Joshua Tree", 34.135, -116.313),
+    ("Landers", 34.266, -116.396), ("Big Bear Lake", 34.244, -116.911), ("Barstow", 34.895, -117.017),
+    ("Hector Mine", 34.594, -116.271), ("Ridgecrest", 35.623, -117.671), ("Trona", 35.763, -117.372),
+    ("Tehachapi", 35.132, -118.449), ("Borrego Springs", 33.256, -116.375), ("Brawley", 32.979, -115.530),
+    ("El Centro", 32.792, -115.563), ("Calexico", 32.679, -115.499), ("Salton City", 33.299, -115.956),
+    ("Ocotillo", 32.739, -115.994), ("Anza", 33.555, -116.673), ("Temecula", 33.494, -117.148),
+    ("Bishop", 37.364, -118.395), ("Mammoth Lakes", 37.649, -118.972), ("Lone Pine", 36.606, -118.062),
+    ("South Lake Tahoe", 38.933, -119.984), ("Truckee", 39.328, -120.183), ("The Geysers", 38.790, -122.756),
+    ("Clearlake", 38.958, -122.626), ("Ferndale", 40.576, -124.264), ("Petrolia", 40.325, -124.287),
+    ("Cape Mendocino", 40.440, -124.409), ("Fort Bragg", 39.446, -123.805), ("Susanville", 40.416, -120.653),
+    ("Alturas", 41.487, -120.542), ("Yreka", 41.736, -122.634), ("Mount Shasta", 41.310, -122.310),
+    ("Oroville", 39.514, -121.556), ("Yosemite Valley", 37.745, -119.594), ("Death Valley", 36.462, -116.867),
+    ("Reno", 39.530, -119.814), ("Las Vegas", 36.170, -115.140), ("Tijuana", 32.515, -117.038),
+    ("Mexicali", 32.625, -115.452),
+)
+
+MAX_RESULTS = 10
+
+
+def _typed(values, dtype, name):
+    return {"t": name, "b": base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode("ascii")}
+
+
+def _index(order):
+    return _typed(order, "<u2", "u16") if len(order) <= 65536 else _typed(order, "<u4", "u32")
+
+
+def nearest_places(lat, lon, places=PLACES, chunk=20_000):
+    """Index into places of every point's nearest place and its distance in km (chunked, O(chunk x places) memory)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    p_lat = np.array([p[1] for p in places], dtype=float)
+    p_lon = np.array([p[2] for p in places], dtype=float)
+    idx, km = np.empty(len(lat), dtype=np.int64), np.empty(len(lat))
+    for s in range(0, len(lat), chunk):
+        d = haversine_km(lat[s:s + chunk, None], lon[s:s + chunk, None], p_lat[None, :], p_lon[None, :])
+        idx[s:s + chunk] = d.argmin(axis=1)
+        km[s:s + chunk] = d[np.arange(len(d)), idx[s:s + chunk]]
+    return idx, km
+
+
+def place_tokens(names):
+    """Sorted [token, [place ids]] pairs of the lower-cased words of every place name."""
+    tokens = {}
+    for i, name in enumerate(names):
+        for token in re.findall(r"[a-z0-9]+", name.lower()):
+            tokens.setdefault(token, []).append(i)
+    return [[token, tokens[token]] for token in sorted(tokens)]
+
+
+def build_search_index(df, places=PLACES):
+    """
+    JSON-ready search index of df's events (time, lat, lon, mag, depth).
+    Events are sorted by time; "post" lists every place's events ("start" is
+    the offset of each place's list in it) and "by_mag" all events by magnitude.
+    """
+    d = df.dropna(subset=["time", "lat", "lon", "mag"]).sort_values("time", kind="stable")
+    t = d["time"].to_numpy(dtype="int64")
+    t0 = int(t[0]) if len(t) else 0
+    rel = t - t0
+    place, km = nearest_places(d["lat"].to_numpy(), d["lon"].to_numpy(), places)
+    # stable sort: every place's events stay in time order
+    post = np.argsort(place, kind="stable")
+    mag = np.round(d["mag"].to_numpy(dtype=float) * 100)
+    by_mag = np.argsort(mag, kind="stable")  # ties stay in time order
+    start = np.searchsorted(place[post], np.arange(len(places) + 1))
+    depth = d["depth"].to_numpy(dtype=float) if "depth" in d.columns else np.zeros(len(d))
+    return {
+        "n": len(d),
+        "t0": t0,
+        "t": _typed(rel, "<u4", "u32") if len(rel) == 0 or rel[-1] < 2 ** 32 else _typed(rel, "<f8", "f64"),
+        "mag": _typed(mag, "<i2", "i16"),
+        "lat": _typed(np.round(d["lat"].to_numpy(dtype=float) * 1e5), "<i4", "i32"),
+        "lon": _typed(np.round(d["lon"].to_numpy(dtype=float) * 1e5), "<i4", "i32"),
+        "depth": _typed(np.clip(np.round(np.nan_to_num(depth) * 10), -32768, 32767), "<i2", "i16"),
+        "km": _typed(np.clip(np.round(km), 0, 65535), "<u2", "u16"),
+        "post": _index(post),
+        "by_mag": _index(by_mag),
+        "start": start.tolist(),
+        "places": [p[0] for p in places],
+        "tokens": place_tokens([p[0] for p in places]),
+    }
+
+
+class EventSearch(MacroElement):
+    """Search box (a map control, top left by default) over an embedded build_search_index payload; exposes window.QuakeSearch.find/show."""
+
+    _template = Template("""
+    {% macro script(this, kwargs) %}
+    (function(){
+      var map = {{ this._parent.get_name() }};
+      var S = {{ this.payload }};
+      function typed(c){
+        var raw = atob(c.b), bytes = new Uint8Array(raw.length);
+        for (var i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+        return new ({u16: Uint16Array, u32: Uint32Array, i16: Int16Array, i32: Int32Array,
+                     f64: Float64Array}[c.t])(bytes.buffer);
+      }
+      var T = typed(S.t), MAG = typed(S.mag), LAT = typed(S.lat), LON = typed(S.lon);
+      var DEPTH = typed(S.depth), KM = typed(S.km), POST = typed(S.post), BY_MAG = typed(S.by_mag);
+      var PLACE = new Uint16Array(S.n);
+      for (var p = 0; p < S.places.length; p++)
+        for (var k = S.start[p]; k < S.start[p + 1]; k++) PLACE[POST[k]] = p;
+      var TOKENS = S.tokens.map(function(e){ return e[0]; });
+
+      // first index in [lo, hi) whose time (through idx, if given) is >= v
+      function lowerBound(v, lo, hi, idx){
+        while (lo < hi) {
+          var mid = (lo + hi) >> 1;
+          if (T[idx ? idx[mid] : mid] < v) lo = mid + 1; else hi = mid;
+        }
+        return lo;
+      }
+      function magBound(v){
+        var lo = 0, hi = S.n;
+        while (lo < hi) { var mid = (lo + hi) >> 1; if (MAG[BY_MAG[mid]] < v) lo = mid + 1; else hi = mid; }
+        return lo;
+      }
+      function placesFor(word){
+        var out = {}, i = 0, lo = 0, hi = TOKENS.length;
+        while (lo < hi) { i = (lo + hi) >> 1; if (TOKENS[i] < word) lo = i + 1; else hi = i; }
+        for (i = lo; i < TOKENS.length && TOKENS[i].lastIndexOf(word, 0) === 0; i++)
+          S.tokens[i][1].forEach(function(p){ out[p] = 1; });
+        return out;
+      }
+      function utc(y, m, d){ return Date.UTC(y, m, d) / 1000 - S.t0; }
+
+      // "1994", "1994-01", "1994-01-17", "1990-2000", "m6.7", "m6", "m6+", ">=5.5", "m5-6" (5 <= M < 6), place words;
+      // magnitudes become an inclusive range in hundredths (the index's unit)
+      function parse(text){
+        var q = {t0: -Infinity, t1: Infinity, m0: -32768, m1: 32767, places: null, words: []}, r;
+        function h(v){ return Math.round(v * 100); }
+        text.toLowerCase().split(/[\\s,]+/).forEach(function(w){
+          if (!w || w === "near" || w === "in") return;
+          if ((r = /^(\\d{4})(?:-(\\d{1,2})(?:-(\\d{1,2}))?)?$/.exec(w))) {
+            var y = +r[1], mo = r[2] ? r[2] - 1 : 0, d = r[3] ? +r[3] : 1;
+            q.t0 = utc(y, mo, d);
+            q.t1 = r[3] ? utc(y, mo, d + 1) : r[2] ? utc(y, mo + 1, 1) : utc(y + 1, 0, 1);
+          } else if ((r = /^(\\d{4})(?:-|\\.\\.|–)(\\d{4})$/.exec(w))) {
+            q.t0 = utc(+r[1], 0, 1); q.t1 = utc(+r[2] + 1, 0, 1);
+          } else if ((r = /^m(?:ag)?(\\d+(?:\\.\\d+)?)-(\\d+(?:\\.\\d+)?)$/.exec(w))) {
+            q.m0 = h(+r[1]); q.m1 = h(+r[2]) - 1;
+          } else if ((r = /^(m|mag)?(>=|>|<=|<)?(\\d+(?:\\.\\d+)?)(\\+)?$/.exec(w)) && (r[1] || r[2] || r[4])) {
+            var v = h(+r[3]), dec = (r[3].split(".")[1] || "").length;
+            if (r[4] || r[2] === ">=") q.m0 = v;
+            else if (r[2] === ">") q.m0 = v + 1;
+            else if (r[2] === "<=") q.m1 = v;
+            else if (r[2] === "<") q.m1 = v - 1;
+            else if (!dec) { q.m0 = v; q.m1 = v + 99; }     // "m6": any M6.x
+            else if (dec === 1) { q.m0 = v - 5; q.m1 = v + 4; }  // "m6.7": what displays as 6.7
+            else q.m0 = q.m1 = v;
+          } else {
+            var found = placesFor(w);
+            if (q.places) Object.keys(q.places).forEach(function(p){ if (!found[p]) delete q.places[p]; });
+            else q.places = found;
+            q.words.push(w);
+          }
+        });
+        return q;
+      }
+
+      // larger magnitude first, then the earlier event (events are indexed in time order)
+      function before(i, j){ return MAG[i] > MAG[j] || (MAG[i] === MAG[j] && i < j); }
+
+      // the largest matches and the number of matches; per-place scans share the same top list
+      function find(text, limit){
+        limit = limit || {{ this.max_results }};
+        // cut: the lowest magnitude that can still enter the list
+        var q = parse(text), m0 = q.m0, m1 = q.m1, best = [], total = 0, cut = m0;
+        function insert(i){
+          var j = best.length === limit ? limit - 1 : best.length;
+          while (j > 0 && before(i, best[j - 1])) { best[j] = best[j - 1]; j--; }
+          best[j] = i;
+          if (best.length === limit) cut = MAG[best[limit - 1]];
+        }
+        function scan(lo, hi, idx){
+          var k, i, m;
+          if (!idx) {
+            // time order: a tie with the last kept event is always later, so it only counts
+            for (i = lo; i < hi; i++) {
+              m = MAG[i];
+              if (m < m0 || m > m1) continue;
+              total++;
+              if (m > cut || (m === cut && best.length < limit)) insert(i);
+            }
+            return;
+          }
+          for (k = lo; k < hi; k++) {
+            i = idx[k]; m = MAG[i];
+            if (m < m0 || m > m1) continue;
+            total++;
+            if (m > cut || (m === cut && (best.length < limit || before(i, best[limit - 1])))) insert(i);
+          }
+        }
+        // magnitude slice [lo, hi) of BY_MAG from the top; without count it stops once the list is full
+        function scanByMag(lo, hi, count){
+          for (var k = hi - 1; k >= lo; k--) {
+            var i = BY_MAG[k], m = MAG[i];
+            if (count && (T[i] < q.t0 || T[i] >= q.t1)) continue;
+            if (count) total++;
+            // going down, a tie comes before the kept events of its magnitude
+            if (best.length < limit || m > cut || (m === cut && before(i, best[limit - 1]))) insert(i);
+            else if (!count) break;
+          }
+        }
+        if (q.places) {
+          Object.keys(q.places).forEach(function(p){
+            var a = S.start[p], b = S.start[+p + 1];
+            scan(lowerBound(q.t0, a, b, POST), lowerBound(q.t1, a, b, POST), POST);
+          });
+        } else {
+          var a = lowerBound(q.t0, 0, S.n), b = lowerBound(q.t1, 0, S.n), c = magBound(m0), d = magBound(m1 + 1);
+          if (a === 0 && b === S.n) {
+            total = Math.max(d - c, 0);  // magnitude only: the top of its slice
+            scanByMag(c, d, false);
+          } else if (d - c < b - a) {
+            scanByMag(c, d, true);     // both: scan the narrower slice
+          } else {
+            scan(a, b);
+          }
+        }
+        return {query: q, events: best, total: total};
+      }
+
+      function when(i){ return new Date((S.t0 + T[i]) * 1000).toISOString().slice(0, 19).replace("T", " "); }
+      function depthStyle(d){
+        if (d < 10) return ["#50c878", "Very Shallow (0–10 km)"];
+        if (d < 20) return ["#ff8c00", "Shallow (10–20 km)"];
+        return ["#9b59b6", "Deeper (>20 km)"];
+      }
+      function popupHtml(i){
+        var st = depthStyle(DEPTH[i] / 10);
+        return "<div style='font-family: Arial; font-size: 13px; min-width: 180px;'>"
+          + "<div style='border-bottom: 2px solid " + st[0] + "; margin-bottom: 8px; padding-bottom: 4px;'>"
+          + "<b style='font-size: 16px;'>Magnitude " + (MAG[i] / 100).toFixed(1) + "</b></div>"
+          + "<b>Depth:</b> " + (DEPTH[i] / 10).toFixed(1) + " km "
+          + "<span style='color: " + st[0] + "; font-weight: bold;'>(" + st[1] + ")</span><br>"
+          + "<b>Date:</b> " + when(i) + "<br>"
+          + "<b>Location:</b> " + (LAT[i] / 1e5).toFixed(3) + "°, " + (LON[i] / 1e5).toFixed(3) + "°<br>"
+          + "<b>Nearest place:</b> " + S.places[PLACE[i]] + " (" + KM[i] + " km)</div>";
+      }
+
+      var ring = null;
+      function show(i){
+        var at = [LAT[i] / 1e5, LON[i] / 1e5];
+        if (ring) ring.remove();
+        ring = L.circleMarker(at, {radius: 14, color: "#d0021b", weight: 3, fill: false}).addTo(map);
+        // opened first without auto-pan, so it stays anchored while the map flies there
+        L.popup({maxWidth: 250, autoPan: false}).setLatLng(at).setContent(popupHtml(i)).openOn(map);
+        map.flyTo(at, Math.max(map.getZoom(), 9), {duration: 0.8});
+      }
+
+      var box = L.control({position: {{ this.position|tojson }}}), input, status, list, last = [];
+      box.onAdd = function(){
+        var div = L.DomUtil.create("div");
+        div.style.cssText = "background:#fff;padding:6px 8px;border:1px solid #aaa;border-radius:6px;"
+          + "font:12px Arial;width:270px;box-shadow:0 1px 5px rgba(0,0,0,.2);";
+        div.innerHTML = "<input id='qs_input' type='search' placeholder='Search: 1994 M6.7, northridge m5+, 1990-2000 >6'"
+          + " style='width:100%;box-sizing:border-box;font:12px Arial;padding:3px'>"
+          + "<div id='qs_status' style='color:#777;margin-top:3px'>" + S.n.toLocaleString("en-US")
+          + " events indexed</div><div id='qs_list'></div>";
+        L.DomEvent.disableClickPropagation(div);
+        L.DomEvent.disableScrollPropagation(div);
+        input = div.querySelector("#qs_input"); status = div.querySelector("#qs_status");
+        list = div.querySelector("#qs_list");
+        input.addEventListener("input", run);
+        input.addEventListener("keydown", function(e){ if (e.key === "Enter" && last.length) show(last[0]); });
+        list.addEventListener("click", function(e){
+          var row = e.target.closest("[data-i]");
+          if (row) show(+row.getAttribute("data-i"));
+        });
+        return div;
+      };
+
+      function run(){
+        var text = input.value.trim();
+        if (!text) {
+          last = []; list.innerHTML = "";
+          status.textContent = S.n.toLocaleString("en-US") + " events indexed";
+          return;
+        }
+        var t = performance.now(), r = find(text), dt = performance.now() - t;
+        last = r.events;
+        var missing = r.query.places && !Object.keys(r.query.places).length;
+        status.textContent = missing ? "no place matches “" + r.query.words.join(" ") + "”"
+          : r.total.toLocaleString("en-US") + " match" + (r.total === 1 ? "" : "es")
+            + (r.total > r.events.length ? ", largest " + r.events.length + " shown" : "")
+            + " · " + (dt < 1 ? Math.round(dt * 1000) + " µs" : dt.toFixed(1) + " ms");
+        list.innerHTML = r.events.map(function(i){
+          return "<div data-i='" + i + "' style='cursor:pointer;padding:2px 0;border-top:1px solid #eee'>"
+            + "<b>M" + (MAG[i] / 100).toFixed(1) + "</b> " + when(i).slice(0, 16) + " · "
+            + KM[i] + " km from " + S.places[PLACE[i]] + "</div>";
+        }).join("");
+      }
+
+      box.addTo(map);
+      window.QuakeSearch = {find: find, show: show, parse: parse};
+    })();
+    {% endmacro %}
+    """)
+
+    def __init__(self, index, max_results=MAX_RESULTS, position="topleft"):
+        super().__init__()
+        self._name = "EventSearch"
+        self.payload = json.dumps(index, separators=(",", ":"))
+        self.max_results = int(max_results)
+        self.position = position
+
+
+def add_event_search(m, df, mag_min=3.0, places=PLACES, position="topleft"):
+    """
+    Add the event search box over df's events of magnitude >= mag_min to m,
+    as a Leaflet control in the given corner (pick a free one on pages with
+    fixed panels).
+    """
+    df = df[df["mag"] >= mag_min]
+    search = EventSearch(build_search_index(df, places), position=position)
+    search.add_to(m)
+    print(f"[search] {len(df):,} events (M ≥ {mag_min:g}) indexed near {len(places)} places, "
+          f"{len(search.payload) / 1e3:.0f} KB embedded")
+    return m
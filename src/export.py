@@ -0,0 +1,147 @@
+"""
+Export the exact event set behind a map to CSV, GeoJSON or Parquet.
+
+    python -m src.export kern_m3_1990s.geojson --db datasets/catalog.sqlite \\
+        --mag-min 3 --county Kern --years 1990 2000
+
+Filters are the ones the layer builders use (catalog_store.catalog_filters:
+magnitude range, depth band, county, year range, bbox). Matching rows are
+streamed through a generator in chunks and written chunk by chunk, so memory
+stays flat whatever the size of the subset (from a SQLite store; without
+--db the cleaned catalog itself is loaded once).
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from .catalog import format_epoch
+from .catalog_store import DEPTH_BAND_NAMES, CatalogStore, catalog_filters, filter_frame
+
+FORMATS = ("csv", "geojson", "parquet")
+EXTENSIONS = {".csv": "csv", ".geojson": "geojson", ".json": "geojson", ".parquet": "parquet", ".pq": "parquet"}
+COLUMNS = ("time", "lat", "lon", "depth", "mag", "type", "county")
+CHUNKSIZE = 100_000
+
+
+def iter_events(source, chunksize=CHUNKSIZE, columns=COLUMNS, **filters):
+    """
+    Yield the rows matching filters (CatalogStore._where keywords) as DataFrame
+    chunks with the export columns, "datetime" first. source is a
+    CatalogStore or a cleaned catalog frame.
+    """
+    if isinstance(source, CatalogStore):
+        chunks = source.query(columns=columns, chunksize=chunksize, order_by="e.time", **filters)
+    else:
+        chunks = (source.iloc[start:start + chunksize] for start in range(0, len(source), chunksize))
+    needs_county = filters.get("county") is not None or filters.get("has_county")
+    for chunk in chunks:
+        if not isinstance(source, CatalogStore):
+            if needs_county and "county" not in chunk.columns:
+                from .filters_region import assign_counties
+                chunk = assign_counties(chunk, drop_unknown=False)
+            chunk = filter_frame(chunk, **filters)
+        if len(chunk) == 0:
+            continue
+        out = chunk[[c for c in columns if c in chunk.columns]].copy()
+        if "county" in out.columns:
+            out["county"] = out["county"].where(out["county"] != "Unknown")
+        out.insert(0, "datetime", format_epoch(out["time"]))
+        yield out
+
+
+def write_csv(chunks, path):
+    rows = 0
+    with open(path, "w", encoding="utf8", newline="") as fh:
+        for chunk in chunks:
+            chunk.to_csv(fh, index=False, header=rows == 0)
+            rows += len(chunk)
+    return rows
+
+
+def write_geojson(chunks, path):
+    rows = 0
+    with open(path, "w", encoding="utf8") as fh:
+        fh.write('{"type":"FeatureCollection","features":[\n')
+        for chunk in chunks:
+            coords = np.round(chunk[["lon", "lat"]].to_numpy(dtype=float), 5).tolist()
+            props = chunk.drop(columns=["lat", "lon"])
+            props = props.astype(object).where(props.notna(), None).to_dict("records")
+            for (lon, lat), p in zip(coords, props):
+                if rows:
+                    fh.write(",\n")
+                fh.write('{"type":"Feature","geometry":{"type":"Point","coordinates":[%r,%r]},"properties":%s}'
+                         % (lon, lat, json.dumps(p, ensure_ascii=False)))
+                rows += 1
+        fh.write("\n]}\n")
+    return rows
+
+
+def write_parquet(chunks, path):
+    """One row group per chunk (needs pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise SystemExit("Parquet export needs pyarrow: pip install pyarrow") from exc
+
+    types = {"datetime": pa.string(), "time": pa.int64(), "lat": pa.float64(), "lon": pa.float64(),
+             "depth": pa.float64(), "mag": pa.float64(), "type": pa.string(), "county": pa.string()}
+    rows, writer = 0, None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.schema([(c, types.get(c, pa.string())) for c in chunk.columns])
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+WRITERS = {"csv": write_csv, "geojson": write_geojson, "parquet": write_parquet}
+
+
+def export_events(source, path, fmt=None, chunksize=CHUNKSIZE, **filters):
+    """Stream the matching events of source into path (format from fmt or the extension). Returns rows written."""
+    start = time.perf_counter()
+    fmt = fmt or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt not in WRITERS:
+        raise ValueError(f"format must be one of {FORMATS}, got {fmt!r}")
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    rows = WRITERS[fmt](iter_events(source, chunksize=chunksize, **filters), path)
+    print(f"[export] {rows:,} events -> {path} ({fmt}, {time.perf_counter() - start:.1f}s)")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a filtered subset of the catalog.")
+    parser.add_argument("out", help="output file (.csv, .geojson / .json or .parquet)")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the extension)")
+    parser.add_argument("--db", help="SQLite catalog store to read from (constant memory); default: the Kaggle CSVs")
+    parser.add_argument("--mag-min", type=float)
+    parser.add_argument("--mag-max", type=float, help="exclusive upper bound")
+    parser.add_argument("--depth-band", choices=tuple(DEPTH_BAND_NAMES), help="depth band in km, as in the depth layers")
+    parser.add_argument("--county", help='county name, e.g. "Kern"')
+    parser.add_argument("--years", type=int, nargs=2, metavar=("FIRST", "LAST"), help="inclusive year range")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("WEST", "SOUTH", "EAST", "NORTH"))
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    filters = catalog_filters(bbox=args.bbox, years=args.years, mag_min=args.mag_min, mag_max=args.mag_max,
+                              depth_band=args.depth_band, county=args.county)
+    if args.db:
+        source = CatalogStore(args.db)
+    else:
+        from .catalog import download_dataset, load_california_catalog
+        source = load_california_catalog(download_dataset())
+    export_events(source, args.out, fmt=args.format, chunksize=args.chunksize, **filters)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,214 @@
+import time
+
+import folium
+import numpy as np
+import pandas as pd
+from folium import FeatureGroup
+
 from .filters_magnitude import add_magnitude_filters
 from .filters_depth import add_depth_filters
+from .payload_budget import plan_layer_caps, DEFAULT_MAX_HTML_BYTES, DEFAULT_MAX_MARKERS
+from .clustering import dbscan_haversine, convex_hull
+
+
+def _peak_color(mag):
+    # same thresholds as the interactive side-panel layer
+    if mag >= 5:
+        return "#d0021b"
+    if mag >= 3:
+        return "#f5a623"
+    return "#4a90e2"
+
+
+def _summaries(labels, lat, lon, mag, year, hulls=True):
+    """
+    Per-cluster count, peak magnitude, first / last year, coordinate sums and
+    convex hull ([[lat, lon], ...]) of the labelled points (label -1 is skipped).
+    Summaries of disjoint point sets of one cluster merge exactly (_merge_summaries).
+    """
+    members = pd.DataFrame({"label": labels, "lat": lat, "lon": lon, "mag": mag, "year": year})
+    members = members[members["label"] >= 0]
+    stats = members.groupby("label").agg(count=("mag", "size"), peak=("mag", "max"), first=("year", "min"),
+                                         last=("year", "max"), lat_sum=("lat", "sum"), lon_sum=("lon", "sum"))
+    if hulls:
+        stats["hull"] = [convex_hull(sub["lon"].to_numpy(), sub["lat"].to_numpy())
+                         for _, sub in members.groupby("label")]
+    return stats
+
+
+def _merge_summaries(stats, groups):
+    """Combine summary rows that belong to the same cluster (groups: cluster id per row)."""
+    stats = stats.assign(group=groups)
+    merged = stats.groupby("group").agg(count=("count", "sum"), peak=("peak", "max"), first=("first", "min"),
+                                        last=("last", "max"), lat_sum=("lat_sum", "sum"), lon_sum=("lon_sum", "sum"))
+    # the hull of a union is the hull of the parts' hull vertices
+    merged["hull"] = [convex_hull(*np.array([p for h in sub["hull"] for p in h]).T[::-1])
+                      for _, sub in stats.groupby("group")]
+    return merged
+
+
+def _tile_box(tile, tile_deg):
+    return tile[0] * tile_deg, (tile[0] + 1) * tile_deg, tile[1] * tile_deg, (tile[1] + 1) * tile_deg
+
+
+def _in_box(df, lat0, lat1, lon0, lon1):
+    return (df["lat"] >= lat0) & (df["lat"] < lat1) & (df["lon"] >= lon0) & (df["lon"] < lon1)
+
+
+def partitioned_clusters(catalog, eps_km=2.0, min_samples=25, eps_days=None):
+    """
+    DBSCAN over a PartitionedCatalog one spatial tile at a time.
+
+    Every tile is clustered together with a halo: the events of the
+    neighbouring tiles within 2 x eps of its edges, so its own events get
+    the core / border status of a whole-catalog run. Clusters of two tiles
+    are the same cluster when a halo event of one is a core event of the
+    other; events that were noise in their own tile but border events of a
+    neighbour's cluster join it. Only the tile edge bands are held across
+    tiles. This matches dbscan_haversine over the whole catalog up to its
+    rho approximation: the micro-cells are sized by the latitude span of
+    each tile with its halo and only merge the events read with it, so
+    events within rho x eps of the eps boundary may flip near tile edges.
+    Returns (summaries ranked by size, events clustered, events total).
+    """
+    from .spatial_index import KM_PER_DEG
+    from .clustering import _components
+
+    tile_deg = catalog.index["tile_deg"]
+    tiles = catalog.tiles()
+    bounds = catalog.bounds()
+    if not tiles:
+        return _summaries(np.empty(0, int), [], [], [], []), 0, 0
+    halo_km = 2 * eps_km
+    dlat = halo_km / KM_PER_DEG
+    dlon = halo_km / (KM_PER_DEG * np.cos(np.radians(min(max(abs(bounds[0]), abs(bounds[1])), 89.0))))
+    columns = ("time", "lat", "lon", "mag")
+
+    def load(keys):
+        return pd.concat(list(catalog.frames(columns=columns, keys=keys)), ignore_index=True)
+
+    # pass 1: the edge band of every tile (the only rows other tiles need)
+    bands = {}
+    for tile, keys in tiles.items():
+        df = load(keys)
+        lat0, lat1, lon0, lon1 = _tile_box(tile, tile_deg)
+        bands[tile] = df[~_in_box(df, lat0 + dlat, lat1 - dlat, lon0 + dlon, lon1 - dlon)]
+
+    # pass 2: cluster every tile with its halo
+    parts, owners, halos, offset, total = [], [], [], 0, 0
+    for tile, keys in tiles.items():
+        own = load(keys)
+        lat0, lat1, lon0, lon1 = _tile_box(tile, tile_deg)
+        halo = [bands[nb] for nb in ((tile[0] + a, tile[1] + b) for a in (-1, 0, 1) for b in (-1, 0, 1))
+                if nb != tile and nb in bands]
+        halo = pd.concat(halo, ignore_index=True) if halo else own.iloc[:0]
+        halo = halo[_in_box(halo, lat0 - dlat, lat1 + dlat, lon0 - dlon, lon1 + dlon)]
+        pts = pd.concat([own, halo], ignore_index=True)
+        labels, core = dbscan_haversine(pts["lat"].to_numpy(), pts["lon"].to_numpy(), eps_km=eps_km,
+                                        min_samples=min_samples, eps_days=eps_days, return_core=True,
+                                        t=pts["time"].to_numpy() if eps_days is not None else None)
+        node = np.where(labels >= 0, labels + offset, -1)
+        offset += int(labels.max()) + 1 if len(labels) else 0
+        n = len(own)
+        total += n
+        parts.append(_summaries(node[:n], own["lat"].to_numpy(), own["lon"].to_numpy(),
+                                own["mag"].to_numpy(), own["year"].to_numpy()))
+        edge = ~_in_box(own, lat0 + dlat, lat1 - dlat, lon0 + dlon, lon1 - dlon).to_numpy()
+        owners.append(pd.DataFrame({"rid": own["rid"].to_numpy()[edge], "node": node[:n][edge], "core": core[:n][edge]}))
+        halos.append(halo.assign(node=node[n:])[node[n:] >= 0])
+
+    owners = pd.concat(owners, ignore_index=True).set_index("rid")
+    halos = pd.concat(halos, ignore_index=True)
+    owner = owners.loc[halos["rid"].to_numpy()]
+    # core in its own tile: the two tile-level clusters are one
+    link = owner["core"].to_numpy() & (owner["node"].to_numpy() >= 0)
+    ei, ej = halos["node"].to_numpy()[link], owner["node"].to_numpy()[link]
+    # noise in its own tile but a border event of a neighbour's cluster
+    adopted = halos[owner["node"].to_numpy() < 0].drop_duplicates("rid")
+    parts.append(_summaries(adopted["node"].to_numpy(), adopted["lat"].to_numpy(), adopted["lon"].to_numpy(),
+                            adopted["mag"].to_numpy(), adopted["year"].to_numpy()))
+
+    stats = pd.concat(parts)
+    component = _components(offset, ei, ej)[stats.index.to_numpy()] if offset else stats.index.to_numpy()
+    merged = _merge_summaries(stats, component)
+    merged = merged.sort_values("count", ascending=False, kind="stable").reset_index(drop=True)
+    return merged, int(merged["count"].sum()), total
+
+
+def add_cluster_layer(m, df, eps_km=2.0, min_samples=25, eps_days=None, max_clusters=200):
+    """
+    Run DBSCAN over the whole catalog and draw each seismic cluster/swarm
+    as a convex-hull outline with its event count and peak magnitude.
+    Pass eps_days to cluster in space AND time (swarms instead of fault zones).
+    df is a frame or a PartitionedCatalog (clustered tile by tile, see
+    partitioned_clusters). Returns the per-cluster summaries, largest first.
+    """
+    from .partitions import PartitionedCatalog
+
+    start = time.perf_counter()
+    if isinstance(df, PartitionedCatalog):
+        stats, clustered, total = partitioned_clusters(df, eps_km=eps_km, min_samples=min_samples, eps_days=eps_days)
+        n_clusters, where = len(stats), f" over {len(df.tiles())} tiles"
+        stats = stats.head(max_clusters)
+    else:
+        t = df["time"].to_numpy() if eps_days is not None else None
+        labels = dbscan_haversine(df["lat"].to_numpy(), df["lon"].to_numpy(),
+                                  eps_km=eps_km, min_samples=min_samples, t=t, eps_days=eps_days)
+        # labels are ranked by size: the first max_clusters are the largest
+        stats = _summaries(np.where(labels < max_clusters, labels, -1), df["lat"].to_numpy(),
+                           df["lon"].to_numpy(), df["mag"].to_numpy(), df["year"].to_numpy())
+        clustered, total = int((labels >= 0).sum()), len(labels)
+        n_clusters, where = int(labels.max()) + 1 if len(labels) else 0, ""
+    print(f"[clusters] {total:,} events -> {n_clusters:,} clusters, "
+          f"{1 - clustered / max(total, 1):.0%} noise in {time.perf_counter() - start:.1f}s{where}")
 
-def _dynamic_limits(n):
-    if n >= 300_000:
-        return (350, 350, 300)
-    if n >= 150_000:
-        return (450, 450, 350)
-    if n >= 75_000:
-        return (550, 550, 400)
-    return (650, 650, 500)
+    mode = f"{eps_km:g} km" + (f", {eps_days:g} days" if eps_days is not None else "")
+    fg = FeatureGroup(name=f"Seismic Clusters (DBSCAN {mode})", show=False)
+    for label, s in stats.iterrows():
+        color = _peak_color(s["peak"])
+        label_html = (f"<b>Cluster #{label + 1}</b><br>{int(s['count']):,} events<br>"
+                      f"Peak M {s['peak']:.1f}<br>{s['first']:.0f}–{s['last']:.0f}")
+        if len(s["hull"]) >= 3:
+            shape = folium.Polygon(s["hull"], color=color, weight=2, fill=True, fill_color=color, fill_opacity=0.15)
+        else:
+            shape = folium.CircleMarker([s["lat_sum"] / s["count"], s["lon_sum"] / s["count"]],
+                                        radius=6, color=color, fill=True, fill_opacity=0.5)
+        shape.add_child(folium.Tooltip(f"{int(s['count']):,} events · peak M {s['peak']:.1f}"))
+        shape.add_child(folium.Popup(label_html, max_width=220))
+        shape.add_to(fg)
+    fg.add_to(m)
+    return stats
 
 
-def add_filtered_layers(m, df, mag_sample=None, depth_sample=None, region_sample=None):
+def add_filtered_layers(m, df, mag_sample=None, depth_sample=None,
+                        max_html_bytes=DEFAULT_MAX_HTML_BYTES, max_markers=DEFAULT_MAX_MARKERS,
+                        clusters=True, depth_df=None, cluster_df=None, encoding="markers"):
+    """
+    Magnitude + depth marker layers and the DBSCAN cluster layer.
+    depth_df / cluster_df feed those layers different rows than df
+    (e.g. per-band samples pulled from a CatalogStore); they default to df.
+    encoding="packed" embeds the markers as typed arrays (src/packed_points.py).
+    """
     n = len(df)
-    dyn_mag, dyn_depth, dyn_region = _dynamic_limits(n)
-    mag_cap = mag_sample or dyn_mag
-    depth_cap = depth_sample or dyn_depth
-    region_cap = region_sample or dyn_region
+    # caps not given explicitly come from the payload budget planner
+    if mag_sample is None or depth_sample is None:
+        planned = plan_layer_caps(df, max_html_bytes=max_html_bytes, max_markers=max_markers,
+                                  layers=("magnitude", "depth"), encoding=encoding)
+    else:
+        planned = {}
+    mag_cap = mag_sample if mag_sample is not None else planned.get("magnitude")
+    depth_cap = depth_sample if depth_sample is not None else planned.get("depth")
 
-    print(f"[filters] dataset={n:,} -> caps: mag={mag_cap}, depth={depth_cap}, county={region_cap}")
+    print(f"[filters] dataset={n:,} -> caps: mag={mag_cap}, depth={depth_cap}")
 
     # Magnitude
-    add_magnitude_filters(m, df, sample_limit=mag_cap)
+    add_magnitude_filters(m, df, sample_limit=mag_cap, encoding=encoding)
 
     # Depth filters
-    add_depth_filters(m, df, sample_limit=depth_cap)
+    add_depth_filters(m, df if depth_df is None else depth_df, sample_limit=depth_cap, encoding=encoding)
 
+    # Density-based seismic clusters over the full catalog
+    if clusters:
+        add_cluster_layer(m, df if cluster_df is None else cluster_df)
 
     print("[filters] all layers are ready.")
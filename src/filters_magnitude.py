@@ -2,8 +2,12 @@ import folium
 from folium.plugins import MarkerCluster
 from branca.element import Element
 
+from .catalog import format_epoch
+from .packed_points import add_packed_markers
+from .pop_exposure import exposure_html, exposure_unit
 
-def _popup_html(mag, depth_km, dt, lat, lon):
+
+def _popup_html(mag, depth_km, dt, lat, lon, exposure=None, unit="people"):
     # Depth-based coloring (matches unified layer)
     if depth_km < 10:
         color = "#50c878"
@@ -23,11 +27,11 @@ def _popup_html(mag, depth_km, dt, lat, lon):
         <b>Depth:</b> {depth_km:.1f} km
         <span style='color: {color}; font-weight: bold;'>({depth_label})</span><br>
         <b>Date:</b> {dt if dt else 'Unknown'}<br>
-        <b>Location:</b> {lat:.3f}°, {lon:.3f}°
+        {exposure_html(mag, exposure, unit)}<b>Location:</b> {lat:.3f}°, {lon:.3f}°
     </div>
     """
 
-def add_magnitude_filters(m, df, sample_limit=600):
+def add_magnitude_filters(m, df, sample_limit=600, encoding="markers"):
     print(f"[magnitude] adding layers @ sample_limit={sample_limit} …")
 
     def _depth_color_and_label(depth):
@@ -45,6 +49,7 @@ def add_magnitude_filters(m, df, sample_limit=600):
         elif mag >= 4.0: return 12
         else: return 8
 
+    unit = exposure_unit(df)
     minor = df[df["mag"] < 3.0]
     mid = df[(df["mag"] >= 3.0) & (df["mag"] < 5.0)]
     major = df[df["mag"] >= 5.0]
@@ -68,10 +73,16 @@ def add_magnitude_filters(m, df, sample_limit=600):
         )
         # Sample from entire dataset, not just head (which may be geographically biased)
         sampled = subset.sample(n=min(sample_limit, len(subset)), random_state=42) if len(subset) > sample_limit else subset
-        for _, r in sampled.iterrows():
+        if encoding == "packed":
+            # quantized typed arrays decoded in the browser (src/packed_points.py)
+            add_packed_markers(cluster, sampled)
+            cluster.add_to(m)
+            continue
+        # dates formatted in one vectorized pass instead of per marker
+        for (_, r), dt in zip(sampled.iterrows(), format_epoch(sampled["time"])):
             mag = float(r.get("mag", 0.0) or 0.0)
             depth = float(r.get("depth", 0.0) or 0.0)
-            html = _popup_html(mag, depth, r.get("datetime", ""), r["lat"], r["lon"])
+            html = _popup_html(mag, depth, dt, r["lat"], r["lon"], r.get("exposure"), unit)
 
             color, _ = _depth_color_and_label(depth)
             folium.CircleMarker(
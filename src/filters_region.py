@@ -1,44 +1,13 @@
+import json
+import os
 import folium
 from folium.plugins import MarkerCluster
-from branca.element import Element
-import geopandas as gpd
-
-def _fnum(x, default=0.0):
-    try:
-        return float(str(x).strip())
-    except Exception:
-        return default
-
-def _depth_color_and_label(depth_km: float):
-    d = _fnum(depth_km)
-    if d < 10:
-        return "#50c878", "Very Shallow (0–10 km)" 
-    elif d < 20:
-        return "#ff8c00", "Shallow (10–20 km)"      
-    return "#9b59b6", "Deeper (>20 km)"            
-
-def _mag_radius(mag):
-    m = _fnum(mag)
-    if m >= 7.0: return 35
-    if m >= 6.0: return 25
-    if m >= 5.0: return 18
-    if m >= 4.0: return 12
-    return 8
-
-def _popup_html(mag, depth, dt, lat, lon, county):
-    color, depth_label = _depth_color_and_label(depth)
-    return f"""
-    <div style='font-family: Arial; font-size: 13px; min-width: 180px;'>
-        <div style='border-bottom: 2px solid {color}; margin-bottom: 8px; padding-bottom: 4px;'>
-            <b style='font-size: 16px;'>Magnitude {_fnum(mag):.1f}</b>
-        </div>
-        <b>Depth:</b> {_fnum(depth):.1f} km
-        <span style='color: {color}; font-weight: bold;'>({depth_label})</span><br>
-        <b>County:</b> {county}<br>
-        <b>Date:</b> {dt if dt else 'Unknown'}<br>
-        <b>Location:</b> {_fnum(lat):.3f}°, {_fnum(lon):.3f}°
-    </div>
-    """
+from folium.elements import JSCSSMixin
+from branca.element import Element, MacroElement
+from jinja2 import Template
+from functools import lru_cache
+
+from .layer_shards import SHARD_DIR, write_county_shards
 
 #Region County Mapping
 REGIONS = {
@@ -60,6 +29,148 @@ REGIONS = {
     ],
 }
 
+COUNTIES_URL = "https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/california-counties.geojson"
+
+
+@lru_cache(maxsize=1)
+def load_counties():
+    """County polygons (fetched once per process)."""
+    import geopandas as gpd  # heavy; only the region map needs it
+
+    gdf_counties = gpd.read_file(COUNTIES_URL)
+    return gdf_counties[gdf_counties["name"].notna()]
+
+
+def assign_counties(df, lat_col: str = "lat", lon_col: str = "lon", drop_unknown: bool = True):
+    """Return a copy of df with a "county" column, dropping quakes outside every county unless drop_unknown=False."""
+    import geopandas as gpd
+
+    gdf_counties = load_counties()
+
+    gdf_quakes = gpd.GeoDataFrame(
+        df.copy(),
+        geometry=gpd.points_from_xy(df[lon_col], df[lat_col]),
+        crs="EPSG:4326",
+    )
+
+    gdf_joined = gpd.sjoin(gdf_quakes, gdf_counties[["name", "geometry"]], how="left", predicate="within")
+    # a point on a shared border matches two counties; keep the first
+    gdf_joined = gdf_joined[~gdf_joined.index.duplicated(keep="first")]
+    df = df.copy()
+    df["county"] = gdf_joined["name"].fillna("Unknown")
+    return df[df["county"] != "Unknown"] if drop_unknown else df
+
+
+class CountyShardLayers(JSCSSMixin, MacroElement):
+    """
+    Loads a county's marker cluster from its shard (<script> tag, works from
+    file://) the first time it is shown and switches counties through the
+    Leaflet API. The page itself only carries the shard manifest.
+    Exposes window.QuakeCounties.show/hide/only/clear for the dropdown.
+    """
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+    _template = Template("""
+    {% macro script(this, kwargs) %}
+    (function(){
+      var map = {{ this._parent.get_name() }};
+      var shards = {{ this.shards }};
+      var baseUrl = {{ this.base_url }};
+      var layers = {}, pending = {}, visible = {};
+
+      function depthStyle(d){
+        if (d < 10) return ["#50c878", "Very Shallow (0–10 km)"];
+        if (d < 20) return ["#ff8c00", "Shallow (10–20 km)"];
+        return ["#9b59b6", "Deeper (>20 km)"];
+      }
+      function magRadius(m){ return m >= 7 ? 35 : m >= 6 ? 25 : m >= 5 ? 18 : m >= 4 ? 12 : 8; }
+      function popupHtml(county, s, i){
+        var st = depthStyle(s.depth[i]);
+        var when = new Date(s.t[i] * 1000).toISOString().slice(0, 19).replace("T", " ");
+        return "<div style='font-family: Arial; font-size: 13px; min-width: 180px;'>"
+          + "<div style='border-bottom: 2px solid " + st[0] + "; margin-bottom: 8px; padding-bottom: 4px;'>"
+          + "<b style='font-size: 16px;'>Magnitude " + s.mag[i].toFixed(1) + "</b></div>"
+          + "<b>Depth:</b> " + s.depth[i].toFixed(1) + " km "
+          + "<span style='color: " + st[0] + "; font-weight: bold;'>(" + st[1] + ")</span><br>"
+          + "<b>County:</b> " + county + "<br>"
+          + "<b>Date:</b> " + when + "<br>"
+          + "<b>Location:</b> " + s.lat[i].toFixed(3) + "°, " + s.lon[i].toFixed(3) + "°</div>";
+      }
+      function build(county){
+        var s = window.QUAKE_SHARDS["county/" + county];
+        var group = L.markerClusterGroup({maxClusterRadius: 35, disableClusteringAtZoom: 8, chunkedLoading: true});
+        var markers = [];
+        for (var i = 0; i < s.lat.length; i++) {
+          var st = depthStyle(s.depth[i]);
+          var marker = L.circleMarker([s.lat[i], s.lon[i]], {
+            radius: magRadius(s.mag[i]), color: st[0], fill: true, fillColor: st[0],
+            fillOpacity: 0.6, weight: 2, opacity: 0.8
+          });
+          // popup HTML is only built when opened
+          marker.bindPopup(popupHtml.bind(null, county, s, i), {maxWidth: 250});
+          markers.push(marker);
+        }
+        group.addLayers(markers);
+        if (window.QuakePerf) QuakePerf.name(group, "County: " + county);
+        return group;
+      }
+      function load(county, done){
+        if (layers[county]) return done(layers[county]);
+        if (!shards[county]) return done(null);
+        if (pending[county]) return pending[county].push(done);
+        pending[county] = [done];
+        var tag = document.createElement("script");
+        tag.src = baseUrl + "/" + shards[county];
+        tag.onload = function(){
+          layers[county] = build(county);
+          pending[county].forEach(function(f){ f(layers[county]); });
+          delete pending[county];
+        };
+        tag.onerror = function(){
+          console.warn("county shard missing: " + tag.src);
+          pending[county].forEach(function(f){ f(null); });
+          delete pending[county];
+        };
+        document.head.appendChild(tag);
+      }
+      function show(county){
+        var t0 = performance.now();
+        visible[county] = true;
+        load(county, function(layer){
+          if (!layer || !visible[county]) return;
+          map.addLayer(layer);
+          // latency includes the shard download and marker build on first show
+          if (window.QuakePerf) QuakePerf.afterFrame("county filter", county, "on", t0);
+        });
+      }
+      function hide(county){
+        var t0 = performance.now();
+        delete visible[county];
+        if (!layers[county]) return;
+        map.removeLayer(layers[county]);
+        if (window.QuakePerf) QuakePerf.afterFrame("county filter", county, "off", t0);
+      }
+      function only(list){
+        Object.keys(visible).forEach(function(c){ if (list.indexOf(c) < 0) hide(c); });
+        list.forEach(show);
+      }
+      window.QuakeCounties = {
+        show: show, hide: hide, only: only,
+        clear: function(){ only([]); },
+        has: function(c){ return c in shards; }
+      };
+    })();
+    {% endmacro %}
+    """)
+
+    def __init__(self, shards, base_url="shards"):
+        super().__init__()
+        self._name = "CountyShardLayers"
+        self.shards = json.dumps(shards, ensure_ascii=False)
+        self.base_url = json.dumps(base_url)
+
+
 def add_region_layers(
     map_obj: folium.Map,
     df,
@@ -67,57 +178,30 @@ def add_region_layers(
     lon_col: str = "lon",
     mag_col: str = "mag",
     depth_col: str = "depth",
-    time_col: str = "datetime",
+    time_col: str = "time",
     per_county_sample: int = 400,
+    shard_dir: str = SHARD_DIR,
+    shard_url: str = "shards",
+    filters: dict = None,
 ):
-    print("[Region Layers] Building county-based clusters…")
+    """
+    Write one shard per county (latest per_county_sample events) to shard_dir
+    and let the page load them on demand. shard_url is shard_dir as seen from
+    the saved page (e.g. "shards" for outputs/region_filter_map.html). filters
+    are the catalog filters df was selected with, kept for shard rebuilds.
+    """
+    print("[Region Layers] Writing per-county shards…")
 
     #Assign counties from GeoJSON if missing
-    counties_url = "https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/california-counties.geojson"
-    gdf_counties = gpd.read_file(counties_url)
+    if "county" not in df.columns:
+        df = assign_counties(df, lat_col=lat_col, lon_col=lon_col)
 
-    gdf_counties = gdf_counties[gdf_counties["name"].notna()]
-
-    gdf_quakes = gpd.GeoDataFrame(
-        df.copy(),
-        geometry=gpd.points_from_xy(df[lon_col], df[lat_col]),
-        crs="EPSG:4326",
-    )
-
-    gdf_joined = gpd.sjoin(gdf_quakes, gdf_counties, how="left", predicate="within")
-    df = df.copy()
-    df["county"] = gdf_joined["name"].fillna("Unknown")
-    df = df[df["county"] != "Unknown"]
-
-    for county_name, sub in df.groupby("county"):
-        if not isinstance(county_name, str):
-            continue
-        sub = sub.sort_values(by=time_col, ascending=False).head(per_county_sample)
-        cluster = MarkerCluster(
-            name=f"{county_name} County",
-            show=False,
-            options={"maxClusterRadius": 35, "disableClusteringAtZoom": 8},
-        ).add_to(map_obj)
-
-        for _, r in sub.iterrows():
-            lat, lon = _fnum(r.get(lat_col)), _fnum(r.get(lon_col))
-            if not lat or not lon:
-                continue
-            mag, depth = _fnum(r.get(mag_col)), _fnum(r.get(depth_col))
-            color, _ = _depth_color_and_label(depth)
-            popup = _popup_html(mag, depth, r.get(time_col, ""), lat, lon, county_name)
-
-            folium.CircleMarker(
-                location=[lat, lon],
-                radius=_mag_radius(mag),
-                color=color,
-                fill=True,
-                fill_color=color,
-                fill_opacity=0.6,
-                weight=2,
-                opacity=0.8,
-                popup=folium.Popup(popup, max_width=250),
-            ).add_to(cluster)
+    cols = {lat_col: "lat", lon_col: "lon", mag_col: "mag", depth_col: "depth", time_col: "time"}
+    entries = write_county_shards(df.rename(columns=cols), shard_dir, per_county=per_county_sample, filters=filters)
+    shards = {key.split("/", 1)[1]: e["file"].replace(os.sep, "/") for key, e in entries.items()}
+    CountyShardLayers(shards, base_url=shard_url).add_to(map_obj)
+    print(f"[Region Layers] {len(shards)} county shards in {shard_dir}, "
+          f"{sum(e['rows'] for e in entries.values()):,} events (loaded on demand)")
 
 def add_region_dropdown(map_obj: folium.Map):
     css = """
@@ -178,64 +262,20 @@ def add_region_dropdown(map_obj: folium.Map):
         const list = REGIONS[rgSel.value] || [];
         list.forEach(name => {
           const opt = document.createElement('option');
-          opt.value = name + " County";
+          opt.value = name;
           opt.textContent = name + " County";
           ctySel.appendChild(opt);
         });
-        ctySel.value = list.length ? list[0] + " County" : "";
+        ctySel.value = list.length ? list[0] : "";
       }
 
       rgSel.addEventListener('change', fillCounties);
       fillCounties();
 
-      function layerCheckboxes(){
-        const box = document.querySelector('.leaflet-control-layers-overlays');
-        if (!box) return [];
-        return Array.from(box.querySelectorAll('label')).map(lab => {
-          const input = lab.querySelector('input.leaflet-control-layers-selector');
-          const text  = lab.textContent.trim();
-          return {label:text, input};
-        });
-      }
-
-      function setLayerChecked(labelText, wanted){
-        const items = layerCheckboxes();
-        const item = items.find(it => it.label === labelText);
-        if (item && item.input && item.input.checked !== wanted) item.input.click();
-      }
-
-      function clearAll(){
-        layerCheckboxes().forEach(it => {
-          if (it.label.endsWith(" County") && it.input.checked) it.input.click();
-        });
-      }
-
-      function showOnly(labelText){
-        const items = layerCheckboxes();
-        items.forEach(it => {
-          if (it.input.checked && it.label !== labelText) it.input.click();
-        });
-        setLayerChecked(labelText, true);
-      }
-
-      function showRegion(regionName){
-        const want = new Set((REGIONS[regionName] || []).map(n => n + " County"));
-        const items = layerCheckboxes();
-
-        // Hide everything not in this region
-        items.forEach(it => {
-          if (it.input.checked && !want.has(it.label)) it.input.click();
-        });
-
-        // Only show exact counties from this region
-        items.forEach(it => {
-          if (want.has(it.label) && !it.input.checked) it.input.click();
-        });
-      }
-
-      btnShow.addEventListener('click', () => showOnly(ctySel.value));
-      btnReg.addEventListener('click', () => showRegion(rgSel.value));
-      btnClear.addEventListener('click', clearAll);
+      // county layers are loaded and switched by CountyShardLayers (Leaflet API)
+      btnShow.addEventListener('click', () => window.QuakeCounties.only([ctySel.value]));
+      btnReg.addEventListener('click', () => window.QuakeCounties.only(REGIONS[rgSel.value] || []));
+      btnClear.addEventListener('click', () => window.QuakeCounties.clear());
     })();
     </script>
     """
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from folium.plugins import HeatMapWithTime
+
+
+def _period_steps(t, period):
+    t = np.asarray(t, dtype="int64").astype("datetime64[s]")
+    if period == "year":
+        return t.astype("datetime64[Y]").astype("int64")
+    if period == "month":
+        return t.astype("datetime64[M]").astype("int64")
+    raise ValueError(f"period must be 'year' or 'month', got {period!r}")
+
+
+def _bin_sums(step, iy, ix, w):
+    """Sum w per distinct (step, iy, ix); returns the bins sorted by (step, iy, ix) and their sums."""
+    lo = [step.min(), iy.min(), ix.min()]
+    ny, nx = int(iy.max() - lo[1]) + 1, int(ix.max() - lo[2]) + 1
+    key = ((step - lo[0]) * ny + (iy - lo[1])) * nx + (ix - lo[2])
+    bins, inverse = np.unique(key, return_inverse=True)
+    return (bins // (ny * nx) + lo[0], bins // nx % ny + lo[1], bins % nx + lo[2],
+            np.bincount(inverse.ravel(), weights=w))
+
+
+def density_sums(df, origin, cell_deg=0.1, period="year"):
+    """
+    Partial heat sums of one partition: magnitude weight (clipped to 0–7, like
+    the decade heat layers) per (period step, lat cell, lon cell) on the grid
+    anchored at origin = (lat, lon). Sums of disjoint partitions just add up
+    (merge_density_sums). Returns (step, iy, ix, sum) arrays over occupied bins.
+    """
+    step = _period_steps(df["time"].to_numpy(dtype="int64"), period)
+    if len(step) == 0:
+        return tuple(np.empty(0, dtype=t) for t in ("int64", "int64", "int64", "float64"))
+    iy = np.floor((df["lat"].to_numpy(dtype=float) - origin[0]) / cell_deg).astype(np.int64)
+    ix = np.floor((df["lon"].to_numpy(dtype=float) - origin[1]) / cell_deg).astype(np.int64)
+    return _bin_sums(step, iy, ix, np.clip(df["mag"].to_numpy(dtype=float), 0.0, 7.0))
+
+
+def merge_density_sums(parts):
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return tuple(np.empty(0, dtype=t) for t in ("int64", "int64", "int64", "float64"))
+    return _bin_sums(*(np.concatenate(cols) for cols in zip(*parts)))
+
+
+def density_frames(df, cell_deg=0.1, period="year"):
+    """
+    Magnitude-weighted density grid per year (or month) for the whole catalog.
+
+    Every event is binned by (frame, lat cell, lon cell) in one vectorized
+    pass per partition (a sparse 3-D histogram: only occupied bins are ever
+    materialized) and the partial sums are merged. df is a frame (one
+    partition), a PartitionedCatalog or a CatalogStore, read one partition /
+    chunk at a time.
+    Returns (labels, frames) where frames[i] is a list of [lat, lon, weight]
+    cell centers with weights log-scaled to (0, 1] against the busiest cell.
+    """
+    from .partitions import partition_frames
+
+    _period_steps(np.empty(0, dtype="int64"), period)  # validate before reading anything
+    if not isinstance(df, pd.DataFrame):
+        bounds = df.bounds()
+        origin = (bounds[0], bounds[2]) if bounds else (0.0, 0.0)
+    else:
+        origin = (df["lat"].min(), df["lon"].min()) if len(df) else (0.0, 0.0)
+    step, iy, ix, sums = merge_density_sums(
+        density_sums(part, origin, cell_deg=cell_deg, period=period)
+        for part in partition_frames(df, ("time", "lat", "lon", "mag")))
+    if len(step) == 0:
+        return [], []
+
+    first, n_frames = step.min(), int(step.max() - step.min()) + 1
+    weight = np.round(np.log1p(sums) / np.log1p(sums.max()), 3)
+    keep = weight > 0
+    step, iy, ix, weight = step[keep], iy[keep], ix[keep], weight[keep]
+
+    b_lat = np.round(origin[0] + (iy + 0.5) * cell_deg, 3)
+    b_lon = np.round(origin[1] + (ix + 0.5) * cell_deg, 3)
+    # bins are sorted by (step, cell), so every frame is one contiguous slice
+    bounds = np.searchsorted(step - first, np.arange(n_frames + 1))
+    points = np.column_stack([b_lat, b_lon, weight]).tolist()
+    frames = [points[bounds[i]:bounds[i + 1]] for i in range(n_frames)]
+
+    unit = "datetime64[Y]" if period == "year" else "datetime64[M]"
+    labels = np.datetime_as_string((first + np.arange(n_frames)).astype(unit)).tolist()
+    return labels, frames
+
+
+def add_heat_timeline_layer(m, df, cell_deg=0.1, period="year", radius=12):
+    """Animated heat map of the whole catalog, one precomputed density frame per year/month."""
+    labels, frames = density_frames(df, cell_deg=cell_deg, period=period)
+    if not frames:
+        print("[heat timeline] no events, skipped")
+        return m
+    n_cells = sum(len(f) for f in frames)
+    print(f"[heat timeline] {len(df):,} events -> {len(frames)} {period} frames, "
+          f"{n_cells:,} non-empty {cell_deg:g}° cells ({labels[0]}–{labels[-1]})")
+
+    HeatMapWithTime(
+        frames,
+        index=labels,
+        name=f"Seismic Density by {period.capitalize()} (all magnitudes)",
+        radius=radius,
+        min_opacity=0.2,
+        max_opacity=0.8,
+        auto_play=False,
+        position="bottomleft",
+    ).add_to(m)
+    return m
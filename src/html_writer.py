@@ -0,0 +1,72 @@
+"""
+Streaming replacement for folium's Map.save.
+
+m.save renders the whole element tree into one string: every marker's script
+is collected on figure.script and joined at the end, so memory peaks with the
+marker count. save_map instead writes each script chunk to a spool file the
+moment it is rendered, then writes the page head, the spooled scripts and the
+page tail. The output is byte-for-byte what m.save writes.
+"""
+import os
+import shutil
+import tempfile
+
+from branca.element import Element
+
+# Element's default template puts this before every child (see branca Element._template)
+_CHILD_SEP = "\n    "
+_MARK = "@@SCRIPT_SPOOL@@"
+
+
+def save_map(m, path, chunk_bytes=1 << 20):
+    """Write m's page to path without holding the rendered scripts in memory. Returns bytes written."""
+    root = m.get_root()
+    script = root.script
+    seen = set()
+    replaced = []
+
+    with tempfile.TemporaryFile() as spool:
+        def spool_child(name, child):
+            spool.write((_CHILD_SEP + child.render()).encode("utf8"))
+            seen.add(name)
+
+        # scripts added before saving come first, exactly like in the joined render
+        for name, child in script._children.items():
+            spool_child(name, child)
+
+        def add_child(child, name=None, index=None):
+            name = child.get_name() if name is None else name
+            if name in seen or index is not None:
+                # would replace / reorder an already written script: can't stream this one
+                replaced.append(name)
+            spool_child(name, child)
+            child._parent = script
+            return script
+
+        script.add_child = add_child
+        try:
+            for child in root._children.values():
+                child.render()
+        finally:
+            del script.add_child
+
+        if replaced:
+            print(f"[save] {len(replaced)} script(s) re-added under an existing name; falling back to m.save")
+            m.save(path)
+            return os.path.getsize(path)
+
+        # render the page frame around a single marker script and splice the spool in
+        children = script._children
+        script._children = {"spool": Element(_MARK)}
+        try:
+            page = root._template.render(this=root, kwargs={})
+        finally:
+            script._children = children
+        head, tail = page.split(_CHILD_SEP + _MARK, 1)
+
+        spool.seek(0)
+        with open(path, "wb") as fh:
+            fh.write(head.encode("utf8"))
+            shutil.copyfileobj(spool, fh, chunk_bytes)
+            fh.write(tail.encode("utf8"))
+    return os.path.getsize(path)
@@ -0,0 +1,116 @@
+"""
+Append-only ingestion of catalog deltas into the SQLite store.
+
+    python -m src.ingest new_events.csv --db datasets/catalog.sqlite
+
+A delta CSV uses the Kaggle schema (datetime, lat, lon, depth, mag, type). Only
+events at or after the store's watermark are appended, duplicates on
+(time, lat, lon, mag) are dropped, and the decades / counties / 1° cells that
+changed are logged. Afterwards only the shards of the changed counties are
+rebuilt, in the shard directory of the last region page built from the store
+(main.py --db ... --out) and with the cap and filters that page was built with
+(see layer_shards.rebuild_affected).
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from .catalog import clean_catalog
+from .catalog_store import CatalogStore
+from .layer_shards import SHARD_DIR, build_all_shards, rebuild_affected
+
+CELL_DEG = 1.0
+KEY = ["time", "lat", "lon", "mag"]
+
+
+def _changes(df):
+    cells = np.unique(np.column_stack([np.floor(df["lat"] / CELL_DEG), np.floor(df["lon"] / CELL_DEG)]).astype(int), axis=0)
+    counties = df["county"][df["county"] != "Unknown"] if "county" in df.columns else pd.Series([], dtype=object)
+    return {
+        "decades": sorted(int(d) for d in np.unique(df["decade"])),
+        "counties": sorted(set(counties.dropna())),
+        "cells": cells.tolist(),
+    }
+
+
+def ingest_delta(store, csv_path, with_counties=True):
+    """Append the new part of one delta CSV. Returns the change record (also written to ingest_log)."""
+    df = clean_catalog(pd.read_csv(csv_path))
+    n_read = len(df)
+
+    # >= (not >) so events sharing the watermark second still get in; exact repeats are dropped below
+    watermark = store.watermark()
+    if watermark is not None:
+        df = df[df["time"] >= watermark]
+    df = df.drop_duplicates(subset=KEY)
+    if watermark is not None and len(df):
+        existing = pd.DataFrame(store.conn.execute(
+            "SELECT time, lat, lon, mag FROM events WHERE time = ?", (watermark,)).fetchall(), columns=KEY)
+        if len(existing):
+            seen = df.merge(existing, on=KEY, how="left", indicator=True)["_merge"].eq("both").to_numpy()
+            df = df[~seen]
+
+    if with_counties and len(df):
+        from .filters_region import assign_counties
+        df = assign_counties(df, drop_unknown=False)
+
+    changes = _changes(df)
+    added = store.ingest_frame(df) if len(df) else 0
+    if added:
+        newest = int(df["time"].max())
+        store.set_meta("watermark", newest if watermark is None else max(watermark, newest))
+    with store.conn:
+        store.conn.execute(
+            "INSERT INTO ingest_log (ingested_at, source, added, changes) VALUES (?, ?, ?, ?)",
+            (int(time.time()), str(csv_path), added, json.dumps(changes)),
+        )
+    print(f"[ingest] {csv_path}: read {n_read:,}, appended {added:,} "
+          f"(skipped {n_read - added:,} old/duplicate/undated) -> "
+          f"{len(changes['decades'])} decade(s), {len(changes['counties'])} county(ies), {len(changes['cells'])} cell(s)")
+    return changes
+
+
+def pending_changes(store):
+    """Union of the changes of every ingest whose shards were not rebuilt yet."""
+    merged = {"decades": set(), "counties": set(), "cells": set()}
+    for (changes,) in store.conn.execute("SELECT changes FROM ingest_log WHERE rebuilt = 0"):
+        c = json.loads(changes)
+        merged["decades"].update(c["decades"])
+        merged["counties"].update(c["counties"])
+        merged["cells"].update(map(tuple, c["cells"]))
+    return {k: sorted(v) for k, v in merged.items()}
+
+
+def mark_rebuilt(store):
+    with store.conn:
+        store.conn.execute("UPDATE ingest_log SET rebuilt = 1 WHERE rebuilt = 0")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append catalog deltas and rebuild only the affected layers.")
+    parser.add_argument("csv", nargs="*", help="delta CSV(s) in the Kaggle catalog schema")
+    parser.add_argument("--db", default="datasets/catalog.sqlite")
+    parser.add_argument("--shards", help="output directory for layer shards (default: the one the region map was "
+                                           f"last built into from this store, else {SHARD_DIR})")
+    parser.add_argument("--no-rebuild", action="store_true", help="only append; rebuild on a later run")
+    parser.add_argument("--all", action="store_true", help="rebuild every shard, not just the affected ones")
+    args = parser.parse_args()
+
+    store = CatalogStore(args.db)
+    shards = args.shards or store.get_meta("shard_dir", SHARD_DIR)
+    for path in args.csv:
+        ingest_delta(store, path)
+    if args.no_rebuild:
+        return
+    if args.all:
+        build_all_shards(store, shards)
+    else:
+        rebuild_affected(store, pending_changes(store), shards)
+    mark_rebuilt(store)
+
+
+if __name__ == "__main__":
+    main()
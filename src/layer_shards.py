@@ -0,0 +1,142 @@
+"""
+Per-layer data shards regenerated independently of the full maps.
+
+Each shard is a tiny script that registers its data on window.QUAKE_SHARDS, so a
+generated page can pull it in with a <script> tag (works from file://, unlike fetch):
+
+    outputs/shards/county/kern.js        latest events of one county
+    outputs/shards/manifest.json         what exists, row counts, last rebuild, and the
+                                         per-county cap and catalog filters (bbox, years)
+                                         the region page was built with
+"""
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+SHARD_DIR = "outputs/shards"
+DEFAULT_PER_COUNTY = 400
+
+
+def shard_slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", str(name).lower()).strip("-")
+
+
+def shard_path(kind, key, out_dir=SHARD_DIR):
+    return os.path.join(out_dir, kind, shard_slug(key) + ".js")
+
+
+def shard_text(kind, key, payload):
+    """The script a shard file holds (also how payload_budget prices county shards)."""
+    shard_id = json.dumps(f"{kind}/{key}")
+    return (f"(window.QUAKE_SHARDS = window.QUAKE_SHARDS || {{}})[{shard_id}] = "
+            f"{json.dumps(payload, separators=(',', ':'))};\n"
+            f"if (window.onQuakeShard) window.onQuakeShard({shard_id});\n")
+
+
+def _write_shard(out_dir, kind, key, payload):
+    path = shard_path(kind, key, out_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf8") as fh:
+        fh.write(shard_text(kind, key, payload))
+    return path
+
+
+def read_manifest(out_dir=SHARD_DIR):
+    path = os.path.join(out_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf8") as fh:
+        return json.load(fh)
+
+
+def _update_manifest(out_dir, entries):
+    path = os.path.join(out_dir, "manifest.json")
+    manifest = read_manifest(out_dir)
+    manifest.update(entries)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(path, "w", encoding="utf8") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+
+
+def county_payload(df):
+    """Columnar marker data for one county (what the region map draws)."""
+    return {
+        "t": df["time"].astype("int64").tolist(),
+        "lat": np.round(df["lat"].to_numpy(dtype=float), 4).tolist(),
+        "lon": np.round(df["lon"].to_numpy(dtype=float), 4).tolist(),
+        "mag": np.round(df["mag"].to_numpy(dtype=float), 2).tolist(),
+        "depth": np.round(df["depth"].to_numpy(dtype=float), 1).tolist(),
+    }
+
+
+def write_county_shard(df, county, out_dir=SHARD_DIR):
+    return _write_shard(out_dir, "county", county, county_payload(df))
+
+
+def county_cap(out_dir=SHARD_DIR, per_county=None):
+    """per_county if given, else the cap the existing shards were written with."""
+    if per_county is not None:
+        return int(per_county)
+    return int(read_manifest(out_dir).get("county_cap", DEFAULT_PER_COUNTY))
+
+
+def _json_filters(filters):
+    return {k: list(v) if k == "bbox" else v for k, v in filters.items()}
+
+
+def shard_filters(out_dir=SHARD_DIR, filters=None):
+    """filters if given, else the catalog filters (see catalog_store._where) the existing shards were written with."""
+    if filters is None:
+        filters = read_manifest(out_dir).get("filters", {})
+    return {k: tuple(v) if k == "bbox" else v for k, v in filters.items()}
+
+
+def write_county_shards(df, out_dir=SHARD_DIR, per_county=DEFAULT_PER_COUNTY, filters=None):
+    """
+    Shard the latest per_county events of every county in df (needs a "county"
+    column) and record them in the manifest, with per_county as "county_cap"
+    and the catalog filters df was selected with as "filters" for later
+    rebuilds. Returns the shard entries.
+    """
+    entries = {}
+    stamp = int(time.time())
+    for county, sub in df.groupby("county"):
+        if not isinstance(county, str) or county == "Unknown":
+            continue
+        sub = sub.nlargest(per_county, "time")
+        write_county_shard(sub, county, out_dir)
+        entries[f"county/{county}"] = {"file": os.path.relpath(shard_path("county", county, out_dir), out_dir),
+                                       "rows": len(sub), "updated": stamp}
+    _update_manifest(out_dir, dict(entries, county_cap=int(per_county), filters=_json_filters(filters or {})))
+    return entries
+
+
+def rebuild_affected(store, changes, out_dir=SHARD_DIR, per_county=None, filters=None):
+    """
+    Regenerate only the shards an ingest touched: the latest-events shard of
+    every changed county. per_county and filters default to the cap and the
+    catalog filters in the manifest (the ones the region page was built with),
+    so a rebuild keeps to its budget and never adds events the page filtered out.
+    """
+    start = time.perf_counter()
+    per_county = county_cap(out_dir, per_county)
+    filters = shard_filters(out_dir, filters)
+    entries = {}
+    stamp = int(time.time())
+    for county in changes.get("counties", []):
+        df = store.query(county=county, order_by="e.time DESC", limit=per_county, **filters)
+        write_county_shard(df, county, out_dir)
+        entries[f"county/{county}"] = {"file": os.path.relpath(shard_path("county", county, out_dir), out_dir),
+                                       "rows": len(df), "updated": stamp}
+    _update_manifest(out_dir, dict(entries, county_cap=per_county, filters=_json_filters(filters)))
+    print(f"[shards] rebuilt {len(entries)} shard(s) in {out_dir} ({time.perf_counter() - start:.1f}s)")
+    return entries
+
+
+def build_all_shards(store, out_dir=SHARD_DIR, per_county=None, filters=None):
+    """First build: a shard for every county in the store."""
+    counties = [r[0] for r in store.conn.execute("SELECT DISTINCT county FROM events WHERE county IS NOT NULL")]
+    return rebuild_affected(store, {"counties": counties}, out_dir, per_county, filters)
@@ -6,7 +6,8 @@ def add_decade_heat_layers(m, df):
     # grouping quakes by decade so we can toggle each one separately
     # Only show the most recent decade by default for cleaner initial view
     if "year" not in df.columns: return
-    df["decade"] = (df["year"] // 10) * 10
+    if "decade" not in df.columns:
+        df = df.assign(decade=(df["year"] // 10) * 10)
     decades = sorted(df["decade"].unique(), reverse=True)
 
     for i, d in enumerate(decades):
@@ -1,35 +1,12 @@
 import folium
-import geopandas
 from folium.plugins import HeatMap
 
 
 def add_pop_heatmap(m, df_pop):
-    # drop unessesary columns
-    df_pop.drop(
-        columns=[
-            "CENSUS_TRACT",
-            "CENSUS_BLOCK_GROUP",
-            "ALL_PLAN",
-            "County_Size_Type",
-            "Loc_Code_Gcode",
-        ],
-        axis=1,
-        inplace=True,
-    )
-
-    for col in df_pop.columns:
-        if "DT" in col or "TT" in col:
-            df_pop.drop(col, axis=1, inplace=True)
-
-    #   turn long lang into geometries
-    geometry = geopandas.points_from_xy(df_pop.LONGITUDE, df_pop.LATITUDE)
-    geo_df = geopandas.GeoDataFrame(df_pop, geometry=geometry, crs="EPSG:4326")
-
-    # clear N/A values
-    geo_df = geo_df.dropna(subset=["LATITUDE", "LONGITUDE"])
+    # heatmap points straight from the lat/lon columns (no geometry objects needed)
+    heat_data = df_pop[["LATITUDE", "LONGITUDE"]].dropna().to_numpy().tolist()
 
     # heatmap layer
-    heat_data = [[pt.y, pt.x] for pt in geo_df.geometry]
     HeatMap(
         heat_data,
         name="Context: Population Density",
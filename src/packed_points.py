@@ -0,0 +1,231 @@
+"""
+Compact binary point payloads for the embedded marker layers.
+
+Instead of one L.circleMarker(...) call plus popup HTML per event, a layer
+embeds its columns as base64 typed arrays and a shared decoder builds the
+markers (and their popups, lazily) in the browser:
+
+    lat / lon   1e-5 deg, Morton (Z-order) sorted and delta-encoded
+    mag         0.1
+    depth       0.1 km
+    time        epoch seconds
+
+Every column gets the integer type that encodes it smallest (values that
+don't fit are listed separately), so sorted coordinates mostly take 2 bytes. Decoding typed arrays is a tight
+loop over bytes, much cheaper for the browser than parsing JavaScript literals.
+"""
+import base64
+import json
+
+import numpy as np
+from branca.element import Element, MacroElement
+from folium.template import Template
+
+from .pop_exposure import exposure_unit
+
+# column -> (quantization step, delta-encode after the spatial sort)
+QUANT = {
+    "lat": (1e-5, True),
+    "lon": (1e-5, True),
+    "mag": (0.1, False),
+    "depth": (0.1, False),
+    "time": (1, False),
+    "year": (1, False),
+    "exposure": (1, False),
+}
+_INT_TYPES = (("i8", "<i1"), ("i16", "<i2"), ("i32", "<i4"))
+
+DECODER = """
+<script>
+window.QuakePacked = (function(){
+  var TYPES = {i8: Int8Array, i16: Int16Array, i32: Int32Array};
+  function column(c){
+    var raw = atob(c.b), bytes = new Uint8Array(raw.length);
+    for (var i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+    var q = new TYPES[c.t](bytes.buffer), out = new Float64Array(q.length), acc = c.o;
+    var x = c.x || [], xi = 0;  // [index, value] pairs too wide for the column type
+    for (var j = 0; j < q.length; j++) {
+      var v = q[j];
+      if (xi < x.length && x[xi][0] === j) v = x[xi++][1];
+      acc = c.d ? acc + v : v;
+      out[j] = Math.round(acc * c.s * 1e5) / 1e5;
+    }
+    return out;
+  }
+  function decode(p){
+    var d = {n: p.n, exposureLabel: p.exposure_unit === "population points" ? "Population points" : "Population"};
+    for (var k in p.cols) d[k] = column(p.cols[k]);
+    return d;
+  }
+
+  // same encoding as the Python marker layers: color = depth, size = magnitude
+  function depthStyle(depth){
+    if (depth < 10) return ["#50c878", "Very Shallow (0-10 km)"];
+    if (depth < 20) return ["#ff8c00", "Shallow (10-20 km)"];
+    return ["#9b59b6", "Deeper (>20 km)"];
+  }
+  function magRadius(m){ return m >= 7 ? 35 : m >= 6 ? 25 : m >= 5 ? 18 : m >= 4 ? 12 : 8; }
+  function feltKm(m){ return Math.min(Math.max(Math.pow(10, 0.5 * m - 1.2), 2), 150); }
+  function popupHtml(d, i, dateUnit){
+    var st = depthStyle(d.depth[i]), when = "Unknown";
+    if (d.time) {
+      when = new Date(d.time[i] * 1000).toISOString().slice(0, dateUnit === "D" ? 10 : 19).replace("T", " ");
+    }
+    var exposure = d.exposure ? "<b>" + d.exposureLabel + " within " + feltKm(d.mag[i]).toFixed(0) + " km:</b> ~"
+      + Math.round(d.exposure[i]).toLocaleString("en-US") + "<br>" : "";
+    return "<div style='font-family: Arial; font-size: 13px; min-width: 180px;'>"
+      + "<div style='border-bottom: 2px solid " + st[0] + "; margin-bottom: 8px; padding-bottom: 4px;'>"
+      + "<b style='font-size: 16px;'>Magnitude " + d.mag[i].toFixed(1) + "</b></div>"
+      + "<b>Depth:</b> " + d.depth[i].toFixed(1) + " km "
+      + "<span style='color: " + st[0] + "; font-weight: bold;'>(" + st[1] + ")</span><br>"
+      + "<b>Date:</b> " + when + "<br>" + exposure
+      + "<b>Location:</b> " + d.lat[i].toFixed(3) + "°, " + d.lon[i].toFixed(3) + "°</div>";
+  }
+
+  function circleMarkers(p, dateUnit){
+    var d = decode(p), markers = new Array(d.n);
+    for (var i = 0; i < d.n; i++) {
+      var color = depthStyle(d.depth[i])[0];
+      markers[i] = L.circleMarker([d.lat[i], d.lon[i]], {
+        radius: magRadius(d.mag[i]), color: color, fill: true, fillColor: color,
+        fillOpacity: 0.6, weight: 2, opacity: 0.8
+      }).bindPopup(popupHtml.bind(null, d, i, dateUnit), {maxWidth: 250});
+    }
+    return markers;
+  }
+
+  // FeatureCollection for TimestampedGeoJson, one feature per event at its year
+  function timeline(p){
+    var d = decode(p), features = new Array(d.n);
+    for (var i = 0; i < d.n; i++) {
+      var color = depthStyle(d.depth[i])[0];
+      features[i] = {
+        type: "Feature",
+        geometry: {type: "Point", coordinates: [d.lon[i], d.lat[i]]},
+        properties: {
+          time: ("000" + d.year[i]).slice(-4) + "-01-01T00:00:00",
+          icon: "circle",
+          iconstyle: {fillOpacity: 0.4, stroke: "true", color: color, fillColor: color,
+                      radius: magRadius(d.mag[i]), weight: 1}
+        }
+      };
+    }
+    return {type: "FeatureCollection", features: features};
+  }
+
+  return {decode: decode, circleMarkers: circleMarkers, timeline: timeline};
+})();
+</script>
+"""
+
+
+def morton_order(lat, lon, bits=16):
+    """Row order along a Z-order curve over the points' bounding box (nearby points end up close)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if len(lat) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    def grid(v):
+        span = max(v.max() - v.min(), 1e-12)
+        return ((v - v.min()) / span * (2 ** bits - 1)).astype(np.uint64)
+
+    def spread(v):
+        # insert a zero bit between every bit of a 16-bit value
+        v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+        v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+        return (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+
+    return np.argsort(spread(grid(lat)) | (spread(grid(lon)) << np.uint64(1)), kind="stable")
+
+
+def _pack_column(values, step, delta):
+    q = np.round(np.asarray(values, dtype=float) / step)
+    first = float(q[0]) if delta and len(q) else 0.0
+    if delta:
+        q = np.diff(q, prepend=first)
+    # narrowest type by encoded size; the few values that don't fit (e.g. the
+    # long jumps of the Z-order curve) go to an exception list
+    best = None
+    for name, dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        out = np.flatnonzero((q < info.min) | (q > info.max))
+        cost = len(q) * np.dtype(dtype).itemsize * 4 / 3 + len(out) * 16
+        if best is None or cost < best[0]:
+            best = (cost, name, dtype, out)
+    _, name, dtype, out = best
+    fits = q.copy()
+    fits[out] = 0
+    col = {"t": name, "s": step, "d": int(delta), "o": first,
+           "b": base64.b64encode(fits.astype(dtype).tobytes()).decode("ascii")}
+    if len(out):
+        col["x"] = [[int(i), int(q[i])] for i in out]
+    return col
+
+
+def pack_points(df, columns=("lat", "lon", "mag", "depth", "time")):
+    """
+    Spatially sorted, quantized payload of df's columns (see QUANT). Optional
+    columns missing from df, or with missing values, are left out.
+    """
+    cols = [c for c in columns if c in df.columns and df[c].notna().all()]
+    order = morton_order(df["lat"].to_numpy(dtype=float), df["lon"].to_numpy(dtype=float))
+    packed = {}
+    for c in cols:
+        step, delta = QUANT[c]
+        packed[c] = _pack_column(df[c].to_numpy(dtype=float)[order], step, delta)
+    return {"n": len(df), "cols": packed}
+
+
+def payload_js(payload):
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def add_decoder(m):
+    """Put the QuakePacked decoder in the page header (once per page, whatever the number of packed layers)."""
+    m.get_root().header.add_child(Element(DECODER), name="quake_packed_decoder")
+
+
+class PackedCircleMarkers(MacroElement):
+    """
+    Fills its parent (a MarkerCluster or FeatureGroup) with circle markers
+    decoded from a packed payload. Popups are built when opened.
+    """
+
+    _template = Template("""
+    {% macro script(this, kwargs) %}
+    (function(layer, markers){
+      if (layer.addLayers) layer.addLayers(markers);  // marker clusters take them in one batch
+      else markers.forEach(function(marker){ marker.addTo(layer); });
+    })({{ this._parent.get_name() }}, QuakePacked.circleMarkers({{ this.payload }}, {{ this.date_unit|tojson }}));
+    {% endmacro %}
+    """)
+
+    def __init__(self, df, date_unit="s"):
+        super().__init__()
+        self._name = "PackedCircleMarkers"
+        payload = pack_points(df, ("lat", "lon", "mag", "depth", "time", "exposure"))
+        if "exposure" in payload["cols"]:
+            payload["exposure_unit"] = exposure_unit(df)
+        self.payload = payload_js(payload)
+        self.date_unit = date_unit
+
+    def render(self, **kwargs):
+        add_decoder(self)
+        super().render(**kwargs)
+
+
+def add_packed_markers(layer, df, date_unit="s"):
+    """Packed equivalent of adding one folium.CircleMarker (with popup) per row of df to layer."""
+    PackedCircleMarkers(df, date_unit=date_unit).add_to(layer)
+    return layer
+
+
+def packed_timeline_data(df):
+    """
+    JavaScript expression building the time slider's FeatureCollection from a
+    packed payload; pass it to TimestampedGeoJson in place of the GeoJSON dict
+    (and add_decoder the map). df needs lat/lon/mag/depth and an integer year column.
+    """
+    return f"QuakePacked.timeline({payload_js(pack_points(df, ('lat', 'lon', 'mag', 'depth', 'year')))})"
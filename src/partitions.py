@@ -0,0 +1,338 @@
+"""
+Out-of-core catalog split into spatial-tile x time-bucket partitions.
+
+    python -m src.partitions datasets/global_parts world_*.csv --chunksize 500000
+
+Events are stored as .npz column files under one directory, partitioned by
+TILE_DEG x TILE_DEG degree tile and BUCKET_YEARS time bucket, with a JSON
+index of every partition's row count and value ranges. Only the partitions a
+filter can match are ever read, one at a time, so memory is bounded by the
+largest partition rather than by the catalog.
+
+PartitionedCatalog answers the same query / group_sizes / layer_frame calls as
+CatalogStore (main.py --partitions plugs it into the same planner), with
+partial results merged across partitions:
+
+    sampling        bottom-k on a hash of the event id (the same k rows whatever the partitioning)
+    latest / county top-k by time per county
+    heat            magnitude sums per (period, cell), summed (heat_timeline.density_frames)
+    clustering      DBSCAN per tile with an eps halo, clusters joined across
+                    tiles through shared core points (filters_clusters.add_cluster_layer)
+
+The layer builders also take plain DataFrames: a frame is the single-partition case.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .catalog import clean_catalog, epoch_year
+from .catalog_store import DEPTH_BANDS, MAG_BANDS, filter_frame
+
+TILE_DEG = 5.0
+BUCKET_YEARS = 10
+BUFFER_ROWS = 1_000_000      # rows held in memory before partitions are flushed to disk
+COLUMNS = ("time", "lat", "lon", "depth", "mag", "type", "county")
+NUMERIC = {"rid": "int64", "time": "int64", "lat": "float64", "lon": "float64", "depth": "float64", "mag": "float64"}
+CODED = ("type", "county")   # strings stored as int32 codes into the index vocabulary (-1 = missing)
+INDEX = "index.json"
+
+
+def priority(rid):
+    """Deterministic pseudo-random uint64 per event id (splitmix64): sampling order independent of partitioning."""
+    z = np.asarray(rid, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def bottom_k(frames, k):
+    """The k rows with the smallest priority(rid) over an iterable of frames (merged one by one, O(k) memory)."""
+    best = None
+    for df in frames:
+        best = _smallest(df if best is None else pd.concat([best, df], ignore_index=True), k)
+    return best
+
+
+def _smallest(df, k):
+    if len(df) <= k:
+        return df
+    if k <= 0:
+        return df.iloc[:0]
+    return df.iloc[np.argpartition(priority(df["rid"].to_numpy()), k - 1)[:k]]
+
+
+def partition_frames(source, columns):
+    """
+    Iterate a source in partitions: a PartitionedCatalog's partitions, a
+    CatalogStore's row chunks, or a DataFrame as one partition.
+    """
+    if isinstance(source, pd.DataFrame):
+        return [source]
+    return source.frames(columns=columns)
+
+
+class PartitionedCatalog:
+    def __init__(self, root, **filters):
+        self.root = root
+        self.filters = filters
+        path = os.path.join(root, INDEX)
+        if os.path.exists(path):
+            with open(path, encoding="utf8") as fh:
+                self.index = json.load(fh)
+        else:
+            self.index = {"tile_deg": TILE_DEG, "bucket_years": BUCKET_YEARS, "next_rid": 0,
+                          "vocab": {c: [] for c in CODED}, "partitions": {}}
+
+    def where(self, **filters):
+        """The same catalog with extra default filters (applied to every read)."""
+        view = PartitionedCatalog.__new__(PartitionedCatalog)
+        view.root, view.index, view.filters = self.root, self.index, dict(self.filters, **filters)
+        return view
+
+    # ---- writing ------------------------------------------------------------
+
+    def ingest_catalog(self, df, chunksize=200_000, with_counties=False):
+        """Partition an already cleaned catalog frame."""
+        return self.ingest_frames((df.iloc[s:s + chunksize] for s in range(0, len(df), chunksize)), with_counties)
+
+    def ingest_csv(self, paths, chunksize=200_000, with_counties=False):
+        """Stream raw Kaggle-schema CSVs into partitions chunk by chunk (constant memory)."""
+        return self.ingest_frames((clean_catalog(chunk) for path in paths
+                                   for chunk in pd.read_csv(path, chunksize=chunksize)), with_counties)
+
+    def ingest_frames(self, frames, with_counties=False, buffer_rows=BUFFER_ROWS):
+        """Append cleaned frames; rows are buffered per partition and flushed every buffer_rows."""
+        os.makedirs(self.root, exist_ok=True)
+        buffers, buffered, total = {}, 0, 0
+        for chunk in frames:
+            if with_counties:
+                from .filters_region import assign_counties
+                chunk = assign_counties(chunk, drop_unknown=False)
+            cols = self._encode(chunk)
+            for key, rows in self._split(cols):
+                buffers.setdefault(key, []).append({c: v[rows] for c, v in cols.items()})
+            buffered += len(chunk)
+            total += len(chunk)
+            if buffered >= buffer_rows:
+                self._flush(buffers)
+                buffers, buffered = {}, 0
+            print(f"[partitions] {total:,} events partitioned", end="\r")
+        self._flush(buffers)
+        with open(os.path.join(self.root, INDEX), "w", encoding="utf8") as fh:
+            json.dump(self.index, fh)
+        print(f"\n[partitions] {self.root}: {self.count():,} events in {len(self.index['partitions'])} partitions")
+        return total
+
+    def _encode(self, df):
+        start = self.index["next_rid"]
+        self.index["next_rid"] = start + len(df)
+        cols = {"rid": np.arange(start, start + len(df), dtype="int64")}
+        for c, dtype in NUMERIC.items():
+            if c != "rid":
+                cols[c] = df[c].to_numpy(dtype=dtype)
+        for c in CODED:
+            vocab = self.index["vocab"][c]
+            values = df[c] if c in df.columns else pd.Series(None, index=df.index, dtype=object)
+            values = values.where(values.notna() & (values != "Unknown"))
+            lookup = {v: i for i, v in enumerate(vocab)}
+            for v in values.dropna().unique():
+                if v not in lookup:
+                    lookup[v] = len(vocab)
+                    vocab.append(str(v))
+            cols[c] = values.map(lookup).fillna(-1).to_numpy(dtype="int32")
+        return cols
+
+    def _split(self, cols):
+        """(partition key "latidx_lonidx_bucketyear", row positions) for every partition a chunk touches."""
+        tile, years = self.index["tile_deg"], self.index["bucket_years"]
+        grid = np.column_stack([np.floor(cols["lat"] / tile), np.floor(cols["lon"] / tile),
+                                epoch_year(cols["time"]) // years * years]).astype("int64")
+        cells, inverse = np.unique(grid, axis=0, return_inverse=True)
+        order = np.argsort(inverse.ravel(), kind="stable")
+        bounds = np.searchsorted(inverse.ravel()[order], np.arange(len(cells) + 1))
+        for i, (a, b, c) in enumerate(cells.tolist()):
+            yield f"{a}_{b}_{c}", order[bounds[i]:bounds[i + 1]]
+
+    def _flush(self, buffers):
+        for key, parts in buffers.items():
+            cols = {c: np.concatenate([p[c] for p in parts]) for c in parts[0]}
+            entry = self.index["partitions"].setdefault(key, {"files": [], "rows": 0})
+            name = f"{key}-{len(entry['files']):04d}.npz"
+            np.savez(os.path.join(self.root, name), **cols)
+            entry["files"].append(name)
+            entry["rows"] += len(cols["rid"])
+            for c in ("lat", "lon", "time", "mag", "depth"):
+                lo, hi = float(cols[c].min()), float(cols[c].max())
+                entry[c] = [min(lo, entry[c][0]), max(hi, entry[c][1])] if c in entry else [lo, hi]
+            counties = sorted(set(entry.get("counties", [])) | set(np.unique(cols["county"][cols["county"] >= 0]).tolist()))
+            entry["counties"] = counties
+
+    # ---- reading ------------------------------------------------------------
+
+    def _matches(self, entry, bbox=None, t0=None, t1=None, mag_min=None, mag_max=None,
+                 depth_min=None, depth_max=None, county=None, has_county=None):
+        """Can any row of the partition pass the filters (from its value ranges)?"""
+        if bbox is not None:
+            west, south, east, north = bbox
+            if entry["lon"][1] < west or entry["lon"][0] > east or entry["lat"][1] < south or entry["lat"][0] > north:
+                return False
+        for col, lo, hi in (("time", t0, t1), ("mag", mag_min, mag_max), ("depth", depth_min, depth_max)):
+            if (lo is not None and entry[col][1] < lo) or (hi is not None and entry[col][0] >= hi):
+                return False
+        if county is not None:
+            vocab = self.index["vocab"]["county"]
+            return county in vocab and vocab.index(county) in entry["counties"]
+        return not has_county or bool(entry["counties"])
+
+    def keys(self, **filters):
+        filters = dict(self.filters, **filters)
+        return sorted(k for k, e in self.index["partitions"].items() if self._matches(e, **filters))
+
+    def load(self, key, columns=COLUMNS):
+        """One partition as a DataFrame (no filtering), with year / decade like clean_catalog."""
+        entry = self.index["partitions"][key]
+        data = [np.load(os.path.join(self.root, name)) for name in entry["files"]]
+        df = pd.DataFrame({c: np.concatenate([d[c] for d in data]) for c in ("rid",) + tuple(columns)})
+        for c in CODED:
+            if c in df.columns:
+                vocab = np.array(self.index["vocab"][c] + [None], dtype=object)
+                df[c] = vocab[df[c].to_numpy()]  # -1 -> None
+        if "time" in df.columns:
+            df["year"] = epoch_year(df["time"])
+            df["decade"] = df["year"] // 10 * 10
+        return df
+
+    def frames(self, columns=COLUMNS, keys=None, **filters):
+        """Filtered partitions one at a time (plus the internal "rid" event id column)."""
+        filters = dict(self.filters, **filters)
+        needed = set(columns)
+        needed |= {"lat", "lon"} if filters.get("bbox") is not None else set()
+        needed |= {c for c, k in (("time", "t0"), ("time", "t1"), ("mag", "mag_min"), ("mag", "mag_max"),
+                                  ("depth", "depth_min"), ("depth", "depth_max"),
+                                  ("county", "county"), ("county", "has_county")) if filters.get(k) is not None}
+        keep = ["rid"] + list(columns) + (["year", "decade"] if "time" in columns else [])
+        for key in self.keys(**filters) if keys is None else keys:
+            df = filter_frame(self.load(key, [c for c in COLUMNS if c in needed]), **filters)
+            if len(df):
+                yield df[keep]
+
+    def tiles(self, **filters):
+        """{(lat index, lon index): [partition keys]}: partitions grouped by spatial tile (all time buckets)."""
+        out = {}
+        for key in self.keys(**filters):
+            ilat, ilon, _ = key.split("_")
+            out.setdefault((int(ilat), int(ilon)), []).append(key)
+        return out
+
+    def bounds(self, **filters):
+        """(lat min, lat max, lon min, lon max) over the matching partitions."""
+        entries = [self.index["partitions"][k] for k in self.keys(**filters)]
+        if not entries:
+            return None
+        return (min(e["lat"][0] for e in entries), max(e["lat"][1] for e in entries),
+                min(e["lon"][0] for e in entries), max(e["lon"][1] for e in entries))
+
+    # ---- CatalogStore interface ---------------------------------------------
+
+    def __len__(self):
+        return self.count()
+
+    def count(self, **filters):
+        if not self.filters and not filters:
+            return sum(e["rows"] for e in self.index["partitions"].values())
+        return sum(len(df) for df in self.frames(columns=("time",), **filters))
+
+    def query(self, columns=COLUMNS, sample=None, order_by=None, limit=None, chunksize=None, **filters):
+        """
+        Like CatalogStore.query. sample=n is a bottom-k sample on the event id
+        hash; chunksize yields one frame per partition instead of a single frame.
+        """
+        frames = self.frames(columns=columns, **filters)
+        if chunksize is not None:
+            return (df[list(columns)] for df in frames)
+        df = bottom_k(frames, sample) if sample is not None else None
+        if df is None:
+            parts = list(frames) if sample is None else []
+            df = pd.concat(parts, ignore_index=True) if parts else self._empty(columns)
+        if order_by:
+            df = df.sort_values(order_by.split(".")[-1], kind="stable")
+        if limit is not None:
+            df = df.head(int(limit))
+        return df.drop(columns="rid").reset_index(drop=True)
+
+    def _empty(self, columns):
+        df = pd.DataFrame({c: pd.Series(dtype=NUMERIC.get(c, object)) for c in ("rid",) + tuple(columns)})
+        if "time" in df.columns:
+            df["year"] = df["decade"] = pd.Series(dtype="int64")
+        return df
+
+    def group_sizes(self, mag_min=3.0, **filters):
+        """Per-group row counts for payload_budget.plan_layer_caps, in one pass over the partitions."""
+        mag_edges = [hi for _, hi in MAG_BANDS[:-1]]
+        depth_edges = [hi for _, hi in DEPTH_BANDS[:-1]]
+        mags, depths, unified, counties = np.zeros(len(MAG_BANDS), int), np.zeros(len(DEPTH_BANDS), int), 0, {}
+        for df in self.frames(columns=("mag", "depth", "county"), **filters):
+            mag = df["mag"].to_numpy()
+            mags += np.bincount(np.searchsorted(mag_edges, mag, side="right"), minlength=len(MAG_BANDS))
+            depths += np.bincount(np.searchsorted(depth_edges, df["depth"].to_numpy(), side="right"),
+                                  minlength=len(DEPTH_BANDS))
+            unified += int((mag >= mag_min).sum())
+            for name, n in df["county"].dropna().value_counts().items():
+                counties[name] = counties.get(name, 0) + int(n)
+        sizes = {"magnitude": mags.tolist(), "depth": depths.tolist(), "unified": [unified]}
+        if counties:
+            sizes["county"] = list(counties.values())
+        return sizes
+
+    def layer_frame(self, layer, cap, mag_min=3.0, columns=COLUMNS, **filters):
+        """Exactly the rows a builder renders for a given cap (see CatalogStore.layer_frame)."""
+        if layer in ("magnitude", "depth"):
+            col, bands = ("mag", MAG_BANDS) if layer == "magnitude" else ("depth", DEPTH_BANDS)
+            best = [None] * len(bands)
+            for df in self.frames(columns=columns, **filters):
+                for i, (lo, hi) in enumerate(bands):
+                    keep = np.ones(len(df), bool)
+                    if lo is not None:
+                        keep &= df[col].to_numpy() >= lo
+                    if hi is not None:
+                        keep &= df[col].to_numpy() < hi
+                    best[i] = bottom_k([p for p in (best[i], df[keep]) if p is not None], cap)
+            parts = [p for p in best if p is not None]
+            df = pd.concat(parts, ignore_index=True) if parts else self._empty(columns)
+            return df.drop(columns="rid")
+        if layer == "unified":
+            return self.query(columns=columns, sample=cap, mag_min=mag_min, **filters)
+        if layer == "county":
+            return self.latest_per_county(cap, columns=columns, **filters)
+        raise ValueError(f"unknown layer {layer!r}")
+
+    def latest_per_county(self, per_county, columns=COLUMNS, **filters):
+        """The per_county most recent events of every county, merged partition by partition."""
+        best = None
+        for df in self.frames(columns=columns, has_county=True, **filters):
+            df = df if best is None else pd.concat([best, df], ignore_index=True)
+            best = df.sort_values("time", ascending=False, kind="stable").groupby("county").head(per_county)
+        return (self._empty(columns) if best is None else best).drop(columns="rid").reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partition raw catalog CSVs by spatial tile and time.")
+    parser.add_argument("out", help="partition directory (created, or appended to)")
+    parser.add_argument("csv", nargs="+", help="Kaggle-schema catalog CSV(s)")
+    parser.add_argument("--chunksize", type=int, default=500_000)
+    parser.add_argument("--with-counties", action="store_true", help="label California counties while partitioning")
+    parser.add_argument("--tile-deg", type=float, default=TILE_DEG)
+    parser.add_argument("--bucket-years", type=int, default=BUCKET_YEARS)
+    args = parser.parse_args(argv)
+
+    catalog = PartitionedCatalog(args.out)
+    if not catalog.index["partitions"]:
+        catalog.index.update(tile_deg=args.tile_deg, bucket_years=args.bucket_years)
+    catalog.ingest_csv(args.csv, chunksize=args.chunksize, with_counties=args.with_counties)
+
+
+if __name__ == "__main__":
+    main()
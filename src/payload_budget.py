@@ -0,0 +1,233 @@
+import io
+from contextlib import redirect_stdout
+
+from folium import Map
+
+from .filters_magnitude import add_magnitude_filters
+from .filters_depth import add_depth_filters
+from .unified_earthquake_layer import add_unified_earthquake_layer
+
+# Budget applied to every generated page when the caller does not pass one.
+# ~8 MB keeps the master map responsive on a mid-range laptop.
+DEFAULT_MAX_HTML_BYTES = 8_000_000
+DEFAULT_MAX_MARKERS = 6_000
+# County markers are not in the page: each county's shard is fetched on its own when picked.
+DEFAULT_MAX_SHARD_BYTES = 1_000_000
+
+# Relative share of a page's budget each layer asks for (master page split evenly).
+LAYER_SHARES = {"magnitude": 1.0, "depth": 1.0, "unified": 1.0, "county": 1.0}
+LAYER_PAGES = {"magnitude": "master", "depth": "master", "unified": "master", "county": "region"}
+SHARD_LAYERS = ("county",)  # budgeted per shard file, not against their page
+
+
+def page_bytes(m):
+    """
+    Rendered size of a map; measured before its marker layers are added, the
+    page's fixed cost. The scripts and header entries rendering leaves on the
+    figure are dropped again, so the page still renders (and defers) as if
+    it had never been measured.
+    """
+    root = m.get_root()
+    parts = [root.header, root.html, root.script]
+    before = [dict(part._children) for part in parts]
+    try:
+        return len(root.render().encode("utf8"))
+    finally:
+        for part, children in zip(parts, before):
+            part._children = type(part._children)(children)
+
+
+def _render_bytes(build):
+    # render a throwaway map (builders are chatty, keep their prints out of the log)
+    m = Map(location=[37.0, -119.5], zoom_start=6, tiles=None)
+    with redirect_stdout(io.StringIO()):
+        build(m)
+    return page_bytes(m)
+
+
+def _shard_bytes(rows):
+    # county markers ship as per-county shard files, not in the page: price the shard
+    from .layer_shards import county_payload, shard_text
+    return len(shard_text("county", "Trial", county_payload(rows)).encode("utf8"))
+
+
+def _layer_builder(layer, rows, mag_min, encoding="markers"):
+    n = len(rows)
+    if layer == "magnitude":
+        return lambda m: add_magnitude_filters(m, rows, sample_limit=n, encoding=encoding)
+    if layer == "depth":
+        return lambda m: add_depth_filters(m, rows, sample_limit=n, encoding=encoding)
+    return lambda m: add_unified_earthquake_layer(m, rows, mag_min=mag_min, sample_limit=n, encoding=encoding)
+
+
+def measure_layer_cost(layer, df, mag_min=3.0, trial_rows=40, encoding="markers"):
+    """
+    Trial-render a layer twice (small and large sample) and fit bytes = fixed + per_marker * n.
+    encoding is the marker layers' (see src/packed_points.py). County markers
+    are not in the page but in per-county shards, so their cost is the shard
+    file's size (layer_shards.shard_text). Returns (fixed_bytes, bytes_per_marker).
+    """
+    if layer == "unified":
+        df = df[df["mag"] >= mag_min]
+    n2 = min(trial_rows, len(df))
+    if n2 == 0:
+        return (0, 0.0)
+    n1 = max(1, n2 // 4)
+    trial = df.sample(n=n2, random_state=7)
+
+    if layer == "county":
+        size = _shard_bytes
+    else:
+        base = _render_bytes(lambda m: None)
+        size = lambda rows: _render_bytes(_layer_builder(layer, rows, mag_min, encoding)) - base
+    b2 = size(trial)
+    if n1 == n2:
+        return (0, b2 / n2)
+    b1 = size(trial.head(n1))
+    per_marker = (b2 - b1) / (n2 - n1)
+    return (max(0, int(b1 - per_marker * n1)), per_marker)
+
+
+def _group_sizes(layer, df, df_counties, mag_min):
+    # row counts of each group the layer's cap applies to (caps are per group)
+    if layer == "magnitude":
+        return [int((df["mag"] < 3.0).sum()),
+                int(((df["mag"] >= 3.0) & (df["mag"] < 5.0)).sum()),
+                int((df["mag"] >= 5.0).sum())]
+    if layer == "depth":
+        return [int((df["depth"] < 10).sum()),
+                int(((df["depth"] >= 10) & (df["depth"] < 20)).sum()),
+                int((df["depth"] >= 20).sum())]
+    if layer == "unified":
+        return [int((df["mag"] >= mag_min).sum())]
+    return df_counties.groupby("county").size().tolist()
+
+
+def _markers_at(cap, sizes):
+    return sum(min(cap, s) for s in sizes)
+
+
+def _largest_cap(sizes, per_marker, byte_budget, marker_budget):
+    # largest per-group cap whose markers still fit both budgets (binary search)
+    lo, hi = 0, max(sizes, default=0)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        k = _markers_at(mid, sizes)
+        if k * per_marker <= byte_budget and k <= marker_budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _allocate_page(layers, byte_budget, marker_budget):
+    """
+    Split one page's budget across its layers by LAYER_SHARES.
+    Layers that can't use their whole share (not enough rows) hand the rest back
+    to the others, so small layers never waste budget.
+    """
+    caps = {}
+    active = dict(layers)
+    while active:
+        total_share = sum(LAYER_SHARES[name] for name in active)
+        saturated = []
+        for name, (sizes, per_marker) in active.items():
+            frac = LAYER_SHARES[name] / total_share
+            caps[name] = _largest_cap(sizes, per_marker, byte_budget * frac, marker_budget * frac)
+            if caps[name] >= max(sizes, default=0):
+                saturated.append(name)
+        if not saturated or len(saturated) == len(active):
+            break
+        # freeze saturated layers and give their leftovers back to the page
+        for name in saturated:
+            sizes, per_marker = active.pop(name)
+            k = _markers_at(caps[name], sizes)
+            byte_budget -= k * per_marker
+            marker_budget -= k
+    return caps
+
+
+def plan_layer_caps(
+    df,
+    df_counties=None,
+    max_html_bytes=DEFAULT_MAX_HTML_BYTES,
+    max_markers=DEFAULT_MAX_MARKERS,
+    mag_min=3.0,
+    layers=("magnitude", "depth", "unified", "county"),
+    group_sizes=None,
+    encoding="markers",
+    fixed_bytes=None,
+    max_shard_bytes=DEFAULT_MAX_SHARD_BYTES,
+):
+    """
+    Plan per-group sample caps so every page fits a payload budget.
+
+    max_html_bytes / max_markers are per page (either may be None). Each layer's
+    per-marker cost is measured from a trial render, then the page budget is
+    split across the layers that live on it. fixed_bytes (page -> size of the
+    page built with everything but its marker layers, see page_bytes()) is
+    that page's fixed cost; pages missing from it are priced as a bare map.
+
+    County caps are only planned when df_counties (a frame with a "county"
+    column) is given. County markers live in per-county shards, so their cap
+    keeps the largest shard under max_shard_bytes and max_markers instead of
+    drawing on the region page's budget.
+
+    group_sizes (layer -> list of per-group row counts, e.g. from
+    CatalogStore.group_sizes) replaces counting on df, which then only needs
+    to be a sample to trial-render. encoding is the marker layers' encoding
+    ("markers" or "packed"), which changes the per-marker cost a lot.
+
+    Returns a dict of caps, e.g. {"magnitude": 610, "depth": 580, "unified": 2100, "county": 350}.
+    """
+    if max_html_bytes is None and max_markers is None:
+        raise ValueError("plan_layer_caps needs max_html_bytes and/or max_markers")
+    byte_limit = float("inf") if max_html_bytes is None else max_html_bytes
+    marker_limit = float("inf") if max_markers is None else max_markers
+    shard_limit = float("inf") if max_shard_bytes is None else max_shard_bytes
+
+    caps = {}
+    pages = {}
+    for layer in layers:
+        if group_sizes is not None:
+            if layer not in group_sizes:
+                continue
+            sizes = group_sizes[layer]
+        elif layer == "county" and df_counties is None:
+            continue
+        else:
+            sizes = _group_sizes(layer, df, df_counties, mag_min)
+        # county shards only carry time / lat / lon / mag / depth, so any catalog rows will do
+        fixed, per_marker = measure_layer_cost(layer, df, mag_min=mag_min, encoding=encoding)
+        print(f"[budget] {layer}: ~{per_marker:,.0f} B/marker (+{fixed:,} B fixed) over {len(sizes)} group(s)")
+        if layer in SHARD_LAYERS:
+            # the page only holds one group's shard at a time: the largest group bounds the cap
+            largest = max(sizes, default=0)
+            caps[layer] = _largest_cap([largest], per_marker, shard_limit - fixed, marker_limit)
+            print(f"[budget] {layer} shards: cap {caps[layer]:,} -> largest shard "
+                  f"~{(fixed + min(caps[layer], largest) * per_marker) / 1e6:.1f} MB "
+                  f"(limit: {max_shard_bytes or '-'} B, {max_markers or '-'} markers)")
+            continue
+        page = pages.setdefault(LAYER_PAGES[layer], {"fixed": 0, "layers": {}})
+        page["fixed"] += fixed
+        page["layers"][layer] = (sizes, per_marker)
+
+    for page_name, page in pages.items():
+        base = (fixed_bytes or {}).get(page_name)
+        if base is None:
+            base = _render_bytes(lambda m: None)
+        byte_budget = byte_limit - base - page["fixed"]
+        if byte_budget <= 0:
+            raise ValueError(f"max_html_bytes={max_html_bytes:,} is below the {page_name} page's fixed cost")
+        page_caps = _allocate_page(page["layers"], byte_budget, marker_limit)
+        est_markers = est_bytes = 0
+        for name, cap in page_caps.items():
+            sizes, per_marker = page["layers"][name]
+            k = _markers_at(cap, sizes)
+            est_markers += k
+            est_bytes += k * per_marker
+        est_bytes += base + page["fixed"]
+        print(f"[budget] {page_name} page: caps {page_caps} -> ~{est_markers:,} markers, ~{est_bytes / 1e6:.1f} MB "
+              f"(limit: {max_html_bytes or '-'} B, {max_markers or '-'} markers)")
+        caps.update(page_caps)
+    return caps
@@ -0,0 +1,197 @@
+import json
+
+from branca.element import Element
+
+# Installed in the page body: Leaflet and its plugins are loaded by then (page
+# header) but the map script at the end of the body has not run yet, so every
+# layer the page adds goes through the hooks.
+HUD = """
+<style>
+  #perf-hud{
+    position:fixed; bottom:30px; right:12px; z-index:9999; max-width:420px;
+    background:rgba(255,255,255,.95); border:1px solid #aaa; border-radius:6px;
+    font:11px/1.35 ui-monospace,Menlo,Consolas,monospace; box-shadow:0 2px 8px rgba(0,0,0,.15);
+  }
+  #perf-hud summary{ cursor:pointer; padding:4px 8px; font-weight:bold; }
+  #perf-hud .body{ max-height:45vh; overflow:auto; padding:0 8px 6px; }
+  #perf-hud table{ border-collapse:collapse; width:100%; }
+  #perf-hud td, #perf-hud th{ padding:1px 4px; text-align:right; white-space:nowrap; }
+  #perf-hud td:first-child, #perf-hud th:first-child{ text-align:left; max-width:200px; overflow:hidden; text-overflow:ellipsis; }
+  #perf-hud button{ font:inherit; margin:4px 4px 0 0; }
+</style>
+<details id="perf-hud"><summary>⏱ Perf</summary><div class="body"></div></details>
+<script>
+(function(){
+  var PAGE = {{PAGE}};
+  var now = function(){ return performance.now(); };
+  var layers = [], toggles = [], depth = 0, seq = 0;
+
+  function stat(layer){
+    if (!layer._perf) {
+      layer._perf = {id: ++seq, layer: layer, adds: 0, removes: 0, add_ms: 0, remove_ms: 0, first_add_at: null, frame_ms: null};
+      layers.push(layer._perf);
+    }
+    return layer._perf;
+  }
+  function afterFrame(t0, done){
+    requestAnimationFrame(function(){ done(now() - t0); });
+  }
+
+  // time the outermost call only; nested adds (group members) count towards their parent
+  function wrap(proto, method, target, removing, frame){
+    if (!proto || !proto[method]) return;
+    var orig = proto[method];
+    proto[method] = function(layer){
+      var owner = target(this, layer);
+      if (depth > 0 || !owner) return orig.apply(this, arguments);
+      var t0 = now();
+      depth++;
+      try { return orig.apply(this, arguments); }
+      finally {
+        depth--;
+        var s = stat(owner), dt = now() - t0;
+        if (removing) { s.removes++; s.remove_ms += dt; }
+        else { s.adds++; s.add_ms += dt; if (s.first_add_at === null) s.first_add_at = t0; }
+        if (frame) afterFrame(t0, function(ms){ s.frame_ms = ms; });
+      }
+    };
+  }
+  var arg = function(self, layer){ return layer; };
+  var onMapGroup = function(self){ return self._map ? self : null; };
+  wrap(L.Map.prototype, "addLayer", arg, false, true);
+  wrap(L.Map.prototype, "removeLayer", arg, true, true);
+  wrap(L.LayerGroup.prototype, "addLayer", onMapGroup, false, false);
+  if (L.MarkerClusterGroup) {
+    wrap(L.MarkerClusterGroup.prototype, "addLayer", onMapGroup, false, false);
+    wrap(L.MarkerClusterGroup.prototype, "addLayers", onMapGroup, false, false);
+  }
+
+  // layer control: names for the table and click -> next frame toggle latency
+  var Control = L.Control.Layers.prototype;
+  var addNamed = Control._addLayer;
+  Control._addLayer = function(layer, name){
+    layer._perfName = String(name).replace(/<[^>]*>/g, "");
+    return addNamed.apply(this, arguments);
+  };
+  var onClick = Control._onInputClick;
+  Control._onInputClick = function(){
+    var map = this._map, before = this._layers.map(function(o){ return map.hasLayer(o.layer); });
+    var t0 = now();
+    var out = onClick.apply(this, arguments);
+    var sync = now() - t0;
+    var changed = this._layers.filter(function(o, i){ return map.hasLayer(o.layer) !== before[i]; });
+    if (changed.length) afterFrame(t0, function(ms){
+      changed.forEach(function(o){
+        record("layer control", o.layer._perfName, map.hasLayer(o.layer) ? "on" : "off", sync, ms);
+      });
+    });
+    return out;
+  };
+
+  function record(source, name, action, sync_ms, frame_ms){
+    toggles.push({source: source, name: name, action: action, at_ms: round(now()),
+                  sync_ms: round(sync_ms), frame_ms: round(frame_ms)});
+    draw();
+  }
+  function round(v){ return v === null || v === undefined ? null : Math.round(v * 10) / 10; }
+  function markers(layer){ return layer.getLayers ? layer.getLayers().length : null; }
+
+  function report(){
+    var nav = performance.getEntriesByType("navigation")[0] || {};
+    var paint = {};
+    performance.getEntriesByType("paint").forEach(function(p){ paint[p.name] = round(p.startTime); });
+    return {
+      page: PAGE,
+      url: location.href,
+      user_agent: navigator.userAgent,
+      recorded_at: new Date().toISOString(),
+      load: {
+        page_bytes: nav.decodedBodySize || null,
+        dom_interactive_ms: round(nav.domInteractive),
+        dom_content_loaded_ms: round(nav.domContentLoadedEventEnd),
+        load_ms: round(nav.loadEventEnd) || null,
+        first_paint_ms: paint["first-paint"] || null,
+        first_contentful_paint_ms: paint["first-contentful-paint"] || null,
+        map_script_done_ms: round(mapScript),
+        first_map_frame_ms: round(firstFrame)
+      },
+      layers: layers.map(function(s){
+        return {name: s.layer._perfName || null, type: s.layer.constructor.name || null,
+                markers: markers(s.layer), adds: s.adds, add_ms: round(s.add_ms),
+                removes: s.removes, remove_ms: round(s.remove_ms),
+                first_add_at_ms: round(s.first_add_at), last_frame_ms: round(s.frame_ms)};
+      }).sort(function(a, b){ return (b.add_ms + b.remove_ms) - (a.add_ms + a.remove_ms); }),
+      toggles: toggles
+    };
+  }
+
+  var hud = document.getElementById("perf-hud"), body = hud.querySelector(".body");
+  function row(cells, tag){
+    return "<tr>" + cells.map(function(c){
+      return "<" + tag + ">" + (c === null ? "–" : String(c).replace(/</g, "&lt;")) + "</" + tag + ">";
+    }).join("") + "</tr>";
+  }
+  function draw(){
+    if (!hud.open) return;
+    var r = report(), l = r.load;
+    var html = "<table>" + row(["load", "ms"], "th")
+      + row(["DOM interactive", l.dom_interactive_ms], "td")
+      + row(["map script done", l.map_script_done_ms], "td")
+      + row(["first map frame", l.first_map_frame_ms], "td")
+      + row(["load event", l.load_ms], "td") + "</table>";
+    html += "<table>" + row(["layer", "markers", "add ms", "frame ms"], "th")
+      + r.layers.slice(0, 15).map(function(s){
+          return row([s.name || s.type, s.markers, s.add_ms, s.last_frame_ms], "td");
+        }).join("") + "</table>";
+    if (r.toggles.length) {
+      html += "<table>" + row(["toggle", "", "sync ms", "frame ms"], "th")
+        + r.toggles.slice(-10).reverse().map(function(t){
+            return row([t.name, t.action, t.sync_ms, t.frame_ms], "td");
+          }).join("") + "</table>";
+    }
+    html += "<button data-act='json'>Export JSON</button><button data-act='copy'>Copy</button>";
+    body.innerHTML = html;
+  }
+  hud.addEventListener("toggle", draw);
+  body.addEventListener("click", function(e){
+    var act = e.target.getAttribute && e.target.getAttribute("data-act");
+    if (!act) return;
+    var text = JSON.stringify(report(), null, 2);
+    if (act === "copy" && navigator.clipboard) return navigator.clipboard.writeText(text);
+    var a = document.createElement("a");
+    a.href = URL.createObjectURL(new Blob([text], {type: "application/json"}));
+    a.download = PAGE + "_perf.json";
+    a.click();
+  });
+
+  // the map script is the last body script: DOMContentLoaded fires right after it ran
+  var mapScript = null, firstFrame = null;
+  document.addEventListener("DOMContentLoaded", function(){
+    mapScript = now();
+    afterFrame(0, function(ms){ firstFrame = ms; draw(); });
+  });
+  window.addEventListener("load", function(){ setTimeout(draw, 0); });
+
+  // other page scripts (e.g. the county shard loader) report their own toggles
+  window.QuakePerf = {
+    record: record,
+    afterFrame: function(source, name, action, t0){
+      var sync = now() - t0;
+      afterFrame(t0, function(ms){ record(source, name, action, sync, ms); });
+    },
+    name: function(layer, name){ layer._perfName = name; },
+    report: report
+  };
+})();
+</script>
+"""
+
+
+def add_perf_hud(m, page):
+    """
+    Timing hooks + collapsible HUD (bottom right): page load milestones, time
+    spent adding / removing every layer, and toggle latency up to the next
+    painted frame. The HUD exports everything as <page>_perf.json.
+    """
+    m.get_root().html.add_child(Element(HUD.replace("{{PAGE}}", json.dumps(page))))
+    return m
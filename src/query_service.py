@@ -0,0 +1,219 @@
+"""
+Local bbox/time/magnitude query service over the cleaned catalog.
+
+    python -m src.query_service --port 8765
+
+Keeps the catalog in memory behind a SpaceTimeIndex and answers
+
+    GET /query?bbox=west,south,east,north&t0=<epoch s>&t1=<epoch s>&mag_min=3&mag_max=9&limit=4000
+    GET /stats
+
+with compact column-oriented JSON. add_live_query_layer() puts a layer on a
+folium map that re-queries the service on every pan/zoom.
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from folium import FeatureGroup
+from jinja2 import Template
+
+from .spatial_index import SpaceTimeIndex
+
+DEFAULT_PORT = 8765
+
+
+class CatalogQueryIndex:
+    """In-memory catalog columns + space-time index answering bbox/time/mag queries."""
+
+    def __init__(self, df, cell_deg=0.25):
+        self.t = df["time"].to_numpy(dtype="int64")
+        self.lat = df["lat"].to_numpy(dtype=float)
+        self.lon = df["lon"].to_numpy(dtype=float)
+        self.mag = df["mag"].to_numpy(dtype=float)
+        self.depth = df["depth"].to_numpy(dtype=float)
+        self.index = SpaceTimeIndex(self.lat, self.lon, self.t, cell_deg=cell_deg)
+
+    def __len__(self):
+        return len(self.t)
+
+    def stats(self):
+        return {"n": len(self), "t0": int(self.t.min()), "t1": int(self.t.max()),
+                "mag_min": float(self.mag.min()), "mag_max": float(self.mag.max())}
+
+    def query(self, bbox=None, t0=None, t1=None, mag_min=None, mag_max=None, limit=5000):
+        """
+        Events inside bbox (west, south, east, north) and [t0, t1) with mag in [mag_min, mag_max].
+        When more than limit match, the limit largest magnitudes are returned.
+        """
+        west, south, east, north = bbox if bbox is not None else (-180.0, -90.0, 180.0, 90.0)
+        idx = self.index.query_bbox(south, west, north, east, t0=t0, t1=t1)
+        if mag_min is not None:
+            idx = idx[self.mag[idx] >= mag_min]
+        if mag_max is not None:
+            idx = idx[self.mag[idx] <= mag_max]
+        total = len(idx)
+        if limit is not None and total > limit:
+            idx = idx[np.argpartition(-self.mag[idx], limit - 1)[:limit]]
+        idx = idx[np.argsort(self.t[idx], kind="stable")]
+        return {
+            "total": total,
+            "n": len(idx),
+            "t": self.t[idx].tolist(),
+            "lat": np.round(self.lat[idx], 4).tolist(),
+            "lon": np.round(self.lon[idx], 4).tolist(),
+            "mag": np.round(self.mag[idx], 2).tolist(),
+            "depth": np.round(self.depth[idx], 1).tolist(),
+        }
+
+
+def _float(params, key):
+    return float(params[key][0]) if params.get(key, [""])[0] != "" else None
+
+
+def make_handler(catalog_index, max_limit=20000):
+    class QueryHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, separators=(",", ":")).encode("utf8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            # maps are opened from file://, so allow any origin
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            try:
+                if url.path == "/stats":
+                    return self._send(200, catalog_index.stats())
+                if url.path != "/query":
+                    return self._send(404, {"error": f"unknown path {url.path}"})
+                bbox = [float(v) for v in params["bbox"][0].split(",")] if "bbox" in params else None
+                if bbox is not None and len(bbox) != 4:
+                    raise ValueError("bbox must be west,south,east,north")
+                t0, t1 = _float(params, "t0"), _float(params, "t1")
+                limit = _float(params, "limit")
+                if limit is not None and limit < 1:
+                    raise ValueError(f"limit must be >= 1, got {limit:g}")
+                limit = max_limit if limit is None else min(int(limit), max_limit)
+                result = catalog_index.query(
+                    bbox=bbox,
+                    t0=None if t0 is None else int(t0),
+                    t1=None if t1 is None else int(t1),
+                    mag_min=_float(params, "mag_min"),
+                    mag_max=_float(params, "mag_max"),
+                    limit=limit,
+                )
+            except (KeyError, ValueError) as exc:
+                return self._send(400, {"error": str(exc)})
+            self._send(200, result)
+
+        def log_message(self, fmt, *args):
+            pass  # keep the console quiet; one line per request is too chatty
+
+    return QueryHandler
+
+
+def serve(df, host="127.0.0.1", port=DEFAULT_PORT):
+    catalog_index = CatalogQueryIndex(df)
+    server = ThreadingHTTPServer((host, port), make_handler(catalog_index))
+    print(f"[query] serving {len(catalog_index):,} events on http://{host}:{port}/query")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class LiveQueryLayer(FeatureGroup):
+    """FeatureGroup that refills itself from the query service whenever the map stops moving."""
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = L.featureGroup();
+            (function(){
+              var layer = {{ this.get_name() }};
+              var map = {{ this._parent.get_name() }};
+              var url = {{ this.url|tojson }};
+              var opts = {{ this.query|tojson }};
+              var box = L.control({position: "bottomright"});
+              box.onAdd = function(){
+                var div = L.DomUtil.create("div");
+                div.style.cssText = "background:#fff;padding:6px 8px;border:1px solid #aaa;border-radius:6px;font:12px Arial;";
+                div.innerHTML = "<b>Live catalog</b><br>M &ge; <input id='lq_mag' type='number' step='0.5' style='width:48px' value='" + opts.mag_min + "'>"
+                  + " Years <input id='lq_y0' type='number' style='width:56px'>–<input id='lq_y1' type='number' style='width:56px'>"
+                  + "<br><span id='lq_status'>idle</span>";
+                L.DomEvent.disableClickPropagation(div);
+                return div;
+              };
+              function color(d){ return d < 10 ? "#50c878" : (d < 20 ? "#ff8c00" : "#9b59b6"); }
+              function radius(m){ return m >= 7 ? 35 : m >= 6 ? 25 : m >= 5 ? 18 : m >= 4 ? 12 : 8; }
+              function el(id){ return document.getElementById(id); }
+              var seq = 0;
+              function refresh(){
+                if (!map.hasLayer(layer)) return;
+                var b = map.getBounds();
+                var q = "bbox=" + [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()].map(function(v){ return v.toFixed(4); }).join(",");
+                var mag = el("lq_mag").value, y0 = el("lq_y0").value, y1 = el("lq_y1").value;
+                if (mag !== "") q += "&mag_min=" + mag;
+                if (y0 !== "") q += "&t0=" + Date.UTC(+y0, 0, 1) / 1000;
+                if (y1 !== "") q += "&t1=" + Date.UTC(+y1 + 1, 0, 1) / 1000;
+                q += "&limit=" + opts.limit;
+                var mine = ++seq;
+                el("lq_status").textContent = "loading…";
+                fetch(url + "/query?" + q).then(function(r){ return r.json(); }).then(function(d){
+                  if (mine !== seq) return;  // a newer pan already fired
+                  layer.clearLayers();
+                  for (var i = 0; i < d.n; i++) {
+                    var c = color(d.depth[i]);
+                    L.circleMarker([d.lat[i], d.lon[i]], {radius: radius(d.mag[i]), color: c, fillColor: c,
+                                    fillOpacity: 0.6, weight: 2, opacity: 0.8})
+                      .bindPopup("<b>Magnitude " + d.mag[i].toFixed(1) + "</b><br>Depth: " + d.depth[i].toFixed(1)
+                                 + " km<br>Date: " + new Date(d.t[i] * 1000).toISOString().slice(0, 19).replace("T", " ")
+                                 + "<br>Location: " + d.lat[i].toFixed(3) + "°, " + d.lon[i].toFixed(3) + "°")
+                      .addTo(layer);
+                  }
+                  el("lq_status").textContent = d.n.toLocaleString() + (d.total > d.n ? " largest of " + d.total.toLocaleString() : "") + " events";
+                }).catch(function(){ if (mine === seq) el("lq_status").textContent = "service offline (" + url + ")"; });
+              }
+              layer.on("add", function(){ box.addTo(map); refresh(); });
+              layer.on("remove", function(){ box.remove(); });
+              map.on("moveend", refresh);
+              document.addEventListener("change", function(e){ if (e.target.id && e.target.id.indexOf("lq_") === 0) refresh(); });
+            })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, url, name="Live Catalog (query service)", mag_min=3.0, limit=4000, show=False):
+        super().__init__(name=name, overlay=True, control=True, show=show)
+        self._name = "LiveQueryLayer"
+        self.url = url.rstrip("/")
+        self.query = {"mag_min": mag_min, "limit": limit}
+
+
+def add_live_query_layer(m, url=f"http://127.0.0.1:{DEFAULT_PORT}", mag_min=3.0, limit=4000):
+    """Layer that fetches the events in view from a running query service on moveend."""
+    LiveQueryLayer(url, mag_min=mag_min, limit=limit).add_to(m)
+    return m
+
+
+def main():
+    from .catalog import download_dataset, load_california_catalog
+
+    parser = argparse.ArgumentParser(description="Serve bbox/time/magnitude queries over the catalog.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    serve(load_california_catalog(download_dataset()), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
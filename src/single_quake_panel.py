@@ -4,6 +4,8 @@ import pandas as pd
 from folium.plugins import MarkerCluster
 from branca.element import Element  # embed HTML + JS
 
+from .catalog import format_epoch
+
 def add_sidepanel_listener(m):
     # right-side panel that updates when any popup opens
     panel = """
@@ -30,16 +32,6 @@ def add_sidepanel_listener(m):
     m.get_root().html.add_child(Element(html))
     return m
 
-def _format_time(value):
-    # try multiple possible time columns and format nicely
-    if pd.isna(value) or str(value).strip() == "":
-        return "—"
-    try:
-        from datetime import datetime
-        return datetime.fromisoformat(str(value).split("+")[0]).strftime("%Y-%m-%d %H:%M:%S")
-    except Exception:
-        return str(value)
-
 def add_sidepanel_quake_layer(m, df, mag_min=4.0, limit=1200):
     # filter + sort
     d = df.dropna(subset=["lat","lon","mag"]).copy()
@@ -64,11 +56,10 @@ def add_sidepanel_quake_layer(m, df, mag_min=4.0, limit=1200):
         }
     ).add_to(m)
 
-    for _, r in d.iterrows():
+    # epoch "time" column -> display strings in one pass
+    times = format_epoch(d["time"]) if "time" in d.columns else np.full(len(d), "—")
+    for (_, r), t in zip(d.iterrows(), times):
         mag = r.get("mag", "")
-        # pull a timestamp from any known column name
-        raw_time = r.get("time") or r.get("Date") or r.get("datetime") or r.get("time_utc") or ""
-        t = _format_time(raw_time)
 
         lat = float(r["lat"])
         lon = float(r["lon"])
@@ -0,0 +1,89 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG = 111.195
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (vectorized, any broadcastable inputs in degrees)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class SpaceTimeIndex:
+    """
+    Grid index over lat/lon with a sorted time index inside every cell.
+
+    Points are bucketed into cell_deg x cell_deg cells and stored cell by cell
+    (CSR layout); within a cell rows are sorted by time, so a space-time query
+    only touches the cells overlapping the search area and binary-searches the
+    time window inside each of them. No per-point Python work at build time.
+    """
+
+    def __init__(self, lat, lon, t=None, cell_deg=0.5):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.t = None if t is None else np.asarray(t, dtype="int64")
+        self.cell_deg = float(cell_deg)
+        self._ncols = int(np.ceil(360.0 / self.cell_deg)) + 1
+
+        keys = self._cell_keys(self.lat, self.lon)
+        if self.t is None:
+            self.order = np.argsort(keys, kind="stable")
+        else:
+            self.order = np.lexsort((self.t, keys))
+        self._t_sorted = None if self.t is None else self.t[self.order]
+        self._cells, self._starts, counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self._ends = self._starts + counts
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _cell_xy(self, lat, lon):
+        iy = np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype("int64")
+        ix = np.floor((np.asarray(lon) + 180.0) / self.cell_deg).astype("int64")
+        return iy, ix
+
+    def _cell_keys(self, lat, lon):
+        iy, ix = self._cell_xy(lat, lon)
+        return iy * self._ncols + ix
+
+    def _slices(self, south, west, north, east):
+        # (start, end) of every non-empty cell overlapping the box
+        (iy0, ix0), (iy1, ix1) = self._cell_xy(south, west), self._cell_xy(north, east)
+        rows = np.arange(iy0, iy1 + 1)
+        keys = (rows[:, None] * self._ncols + np.arange(ix0, ix1 + 1)[None, :]).ravel()
+        if len(self._cells) == 0:
+            return []
+        pos = np.minimum(np.searchsorted(self._cells, keys), len(self._cells) - 1)
+        pos = pos[self._cells[pos] == keys]
+        return zip(self._starts[pos], self._ends[pos])
+
+    def query_bbox(self, south, west, north, east, t0=None, t1=None):
+        """Row positions inside the box (and inside [t0, t1) when given)."""
+        parts = []
+        for s, e in self._slices(south, west, north, east):
+            if self._t_sorted is not None and (t0 is not None or t1 is not None):
+                ts = self._t_sorted[s:e]
+                lo = s if t0 is None else s + np.searchsorted(ts, t0, side="left")
+                hi = e if t1 is None else s + np.searchsorted(ts, t1, side="left")
+                s, e = lo, hi
+            if e > s:
+                parts.append(self.order[s:e])
+        if not parts:
+            return np.empty(0, dtype="int64")
+        idx = np.concatenate(parts)
+        inside = ((self.lat[idx] >= south) & (self.lat[idx] <= north)
+                  & (self.lon[idx] >= west) & (self.lon[idx] <= east))
+        return idx[inside]
+
+    def query_radius(self, lat, lon, radius_km, t0=None, t1=None):
+        """Row positions within radius_km of (lat, lon) and inside [t0, t1) when given."""
+        dlat = radius_km / KM_PER_DEG
+        coslat = max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        dlon = min(radius_km / (KM_PER_DEG * coslat), 180.0)
+        idx = self.query_bbox(lat - dlat, lon - dlon, lat + dlat, lon + dlon, t0=t0, t1=t1)
+        if len(idx) == 0:
+            return idx
+        return idx[haversine_km(lat, lon, self.lat[idx], self.lon[idx]) <= radius_km]
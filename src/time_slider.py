@@ -1,22 +1,19 @@
 # src/time_slider.py
-def add_time_slider_layer(m, df, mag_min=5.0):
+def add_time_slider_layer(m, df, mag_min=5.0, encoding="markers"):
     from folium.plugins import TimestampedGeoJson
-    import pandas as pd
 
-    # 1) find time
-    time_cols = ["time", "origintimeUTC", "datetime", "event_time", "Date", "date"]
-    time_col = next((c for c in time_cols if c in df.columns), None)
+    from .catalog import epoch_year
+    from .packed_points import add_decoder, packed_timeline_data
 
-    if time_col is not None:
-        tmp = df.dropna(subset=["lat", "lon", time_col]).copy()
-        tmp[time_col] = pd.to_datetime(tmp[time_col], errors="coerce")
-        tmp = tmp[tmp[time_col].notna()]
-        tmp["__year"] = tmp[time_col].dt.year
-    else:
-        if "year" not in df.columns:
-            raise KeyError("No time-like column and no 'year' column found.")
+    # 1) year of each event (clean_catalog already derived it from the epoch "time" column)
+    if "year" in df.columns:
         tmp = df.dropna(subset=["lat", "lon", "year"]).copy()
         tmp["__year"] = tmp["year"].astype(int)
+    elif "time" in df.columns:
+        tmp = df.dropna(subset=["lat", "lon"]).copy()
+        tmp["__year"] = epoch_year(tmp["time"])
+    else:
+        raise KeyError("No 'year' or epoch 'time' column found.")
 
     # 2) keep only mag >= mag_min (configurable, default 5.0 for performance)
     mag_col_exists = "mag" in tmp.columns
@@ -27,6 +24,33 @@ def add_time_slider_layer(m, df, mag_min=5.0):
     tmp = tmp.sort_values("__year")
     years = sorted(tmp["__year"].unique().tolist())
 
+    if encoding == "packed":
+        # features are built in the browser from quantized typed arrays
+        add_decoder(m)
+        data = packed_timeline_data(tmp.assign(year=tmp["__year"], depth=tmp["depth"].fillna(0.0),
+                                               mag=tmp["mag"].fillna(5.0) if mag_col_exists else 5.0))
+    else:
+        data = {"type": "FeatureCollection", "features": _features(tmp, mag_col_exists)}
+
+    # Add time slider directly to map (plugin limitation - cannot be wrapped in FeatureGroup)
+    TimestampedGeoJson(
+        data,
+        period="P1Y",
+        add_last_point=True,
+        auto_play=False,
+        loop_button=True,
+        date_options="YYYY",
+        time_slider_drag_update=True,
+        duration="P1Y",
+    ).add_to(m)
+
+    print(f"Time slider: {len(tmp)} earthquakes from {min(years)} to {max(years)}")
+    print("Note: Time slider is always active (plugin limitation - cannot be toggled off)")
+
+
+def _features(tmp, mag_col_exists):
+    import pandas as pd
+
     all_features = []
 
     # helper to get style - MATCHES unified layer visual encoding
@@ -83,17 +107,4 @@ def add_time_slider_layer(m, df, mag_min=5.0):
             },
         })
 
-    # Add time slider directly to map (plugin limitation - cannot be wrapped in FeatureGroup)
-    TimestampedGeoJson(
-        {"type": "FeatureCollection", "features": all_features},
-        period="P1Y",
-        add_last_point=True,
-        auto_play=False,
-        loop_button=True,
-        date_options="YYYY",
-        time_slider_drag_update=True,
-        duration="P1Y",
-    ).add_to(m)
-
-    print(f"Time slider: {len(tmp)} earthquakes from {min(years)} to {max(years)}")
-    print("Note: Time slider is always active (plugin limitation - cannot be toggled off)")
+    return all_features
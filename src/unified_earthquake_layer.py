@@ -2,14 +2,20 @@ import folium
 from folium.plugins import MarkerCluster
 import pandas as pd
 
+from .catalog import format_epoch
+from .packed_points import add_packed_markers
+from .pop_exposure import exposure_html, exposure_unit
 
-def add_unified_earthquake_layer(m, df, mag_min=3.0, sample_limit=2000):
+
+def add_unified_earthquake_layer(m, df, mag_min=3.0, sample_limit=2000, encoding="markers"):
     """
     Add a single unified earthquake layer with multi-dimensional visual encoding:
     - SIZE represents magnitude (dramatically scaled: bigger = stronger)
     - COLOR represents depth (green=shallow, orange=intermediate, purple=deep)
 
     This allows users to see both magnitude and depth patterns simultaneously.
+    encoding="packed" embeds the points as quantized typed arrays (src/packed_points.py)
+    instead of one CircleMarker per event.
     """
 
     # Filter to significant earthquakes
@@ -36,7 +42,13 @@ def add_unified_earthquake_layer(m, df, mag_min=3.0, sample_limit=2000):
         }
     ).add_to(m)
 
-    for _, r in df_filtered.iterrows():
+    if encoding == "packed":
+        add_packed_markers(cluster, df_filtered, date_unit="D")
+        return m
+
+    dates = format_epoch(df_filtered["time"], unit="D")
+    unit = exposure_unit(df_filtered)
+    for (_, r), date in zip(df_filtered.iterrows(), dates):
         mag = r["mag"]
         depth = r["depth"]
 
@@ -72,8 +84,8 @@ def add_unified_earthquake_layer(m, df, mag_min=3.0, sample_limit=2000):
             </div>
             <b>Depth:</b> {depth:.1f} km
             <span style='color: {color}; font-weight: bold;'>({depth_label})</span><br>
-            <b>Date:</b> {r.datetime.strftime('%Y-%m-%d') if hasattr(r.datetime, 'strftime') else str(r.datetime)[:10]}<br>
-            <b>Location:</b> {r.lat:.3f}°, {r.lon:.3f}°
+            <b>Date:</b> {date}<br>
+            {exposure_html(mag, r.get("exposure"), unit)}<b>Location:</b> {r.lat:.3f}°, {r.lon:.3f}°
         </div>
         """
 
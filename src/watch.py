@@ -0,0 +1,333 @@
+"""
+Watch mode (python main.py [MAP ...] --watch): load and clean the catalog
+once, build the requested maps, then poll main.py, src/*.py and the dataset
+files and redo only what a change affects.
+
+Dependencies are tracked per top-level definition (function, class, constant)
+from the sources: an edit to a popup style in filters_region.py rebuilds the
+region map only, an edit to a legend in main.py the map using it. Edited
+modules are reloaded together with the modules importing from them at module
+level (builders import lazily, so they pick up new code by themselves).
+
+    catalog loading edited / catalog files changed   reload the catalog, replan, rebuild all
+    payload planner edited (or what it measures)     replan the caps, rebuild the pages whose caps moved
+    builder code edited                              rebuild the maps using it
+    other dataset files changed                      rebuild all (builders read them themselves)
+
+A failing reload or rebuild prints its traceback and the watcher keeps going;
+save again to retry.
+"""
+import ast
+import functools
+import glob
+import importlib
+import os
+import sys
+import time
+import traceback
+
+POLL_S = 0.5
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_PATH = os.path.join(os.path.dirname(SRC_DIR), "main.py")
+# main.py functions producing the shared state: the catalog, then caps and layer rows
+LOAD_STAGE = (("main", "parse_args"), ("main", "load_catalog"))
+PLAN_STAGE = (("main", "plan_caps"),)
+# dispatch tables: editing one builder must not reach render_map (and so every map) through them
+DISPATCH = {("main", "BUILDERS")}
+BODY = "<module body>"  # top-level statements that are neither definitions nor imports
+
+
+def module_name(path):
+    path = os.path.abspath(path)
+    if path == MAIN_PATH:
+        return "main"
+    return "src." + os.path.splitext(os.path.basename(path))[0]
+
+
+def _imported(node, module):
+    """(source module, name, local name) of a src import statement, or nothing."""
+    if not isinstance(node, ast.ImportFrom):
+        return []
+    if node.level == 1 and module.startswith("src."):
+        source = f"src.{node.module}" if node.module else None
+    elif node.level == 0 and node.module and node.module.startswith("src."):
+        source = node.module
+    else:
+        return []
+    return [(source, a.name, a.asname or a.name) for a in node.names] if source else []
+
+
+class ModuleIndex:
+    """Top-level definitions of one module: their source text and the (module, name) pairs they use."""
+
+    def __init__(self, path):
+        self.module = module_name(path)
+        with open(path, encoding="utf8") as fh:
+            source = fh.read()
+        tree = ast.parse(source, filename=path)
+        self.text, nodes, self.imports = {}, {}, {}
+        body = []
+        for node in tree.body:
+            names = []
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                names = [node.name]
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                names = [t.id for t in targets if isinstance(t, ast.Name)]
+            for src, name, local in _imported(node, self.module):
+                self.imports[local] = (src, name)
+            if names:
+                for name in names:
+                    self.text[name] = ast.get_source_segment(source, node)
+                    nodes[name] = node
+            else:
+                body.append(ast.get_source_segment(source, node))
+        self.text[BODY] = "\n".join(body)
+
+        self.uses = {}
+        for name, node in nodes.items():
+            uses = set()
+            for n in ast.walk(node):
+                if isinstance(n, ast.Name) and n.id != name:
+                    if n.id in nodes:
+                        uses.add((self.module, n.id))
+                    elif n.id in self.imports:
+                        uses.add(self.imports[n.id])
+                for src, imported, _ in _imported(n, self.module):
+                    uses.add((src, imported))  # lazy import inside a function
+            self.uses[name] = uses
+
+    def changed(self, other):
+        """Names whose definition differs from other (an older index of the same module)."""
+        names = self.text.keys() | other.text.keys()
+        changed = {n for n in names if self.text.get(n) != other.text.get(n)}
+        # a changed import line or module-level statement may affect anything in the module
+        return set(names) if BODY in changed else changed
+
+
+def index_sources():
+    return {module_name(p): ModuleIndex(p) for p in [MAIN_PATH] + glob.glob(os.path.join(SRC_DIR, "*.py"))}
+
+
+def users(index, changed, dispatch=DISPATCH):
+    """
+    Every (module, name) that depends, directly or not, on one of the changed
+    pairs. Dispatch tables only propagate their own edits.
+    """
+    reverse = {}
+    for mod, info in index.items():
+        for name, uses in info.uses.items():
+            for used in uses:
+                reverse.setdefault(used, set()).add((mod, name))
+    seen, todo = set(changed), list(changed)
+    while todo:
+        node = todo.pop()
+        if node in dispatch and node not in changed:
+            continue
+        for user in reverse.get(node, ()):
+            if user not in seen:
+                seen.add(user)
+                todo.append(user)
+    return seen
+
+
+def _same_code(a, b):
+    if a.co_code != b.co_code or a.co_names != b.co_names or len(a.co_consts) != len(b.co_consts):
+        return False
+    return all(_same_code(x, y) if hasattr(x, "co_code") and hasattr(y, "co_code") else x == y
+               for x, y in zip(a.co_consts, b.co_consts))
+
+
+def reload_module(module):
+    """
+    importlib.reload, keeping the filled lru_caches (county polygons, dataset
+    path) of functions whose code did not change.
+    """
+    cached = {name: obj for name, obj in vars(module).items()
+              if isinstance(obj, functools._lru_cache_wrapper) and obj.cache_info().currsize}
+    module = importlib.reload(module)
+    for name, old in cached.items():
+        new = getattr(module, name, None)
+        if isinstance(new, functools._lru_cache_wrapper) and _same_code(old.__wrapped__.__code__,
+                                                                         new.__wrapped__.__code__):
+            setattr(module, name, old)
+    return module
+
+
+def reload_modules(edited, index):
+    """
+    Reload the edited modules and, dependencies first, the modules importing
+    from them at module level (their imported names would be stale).
+    Returns the names of the modules reloaded.
+    """
+    deps = {mod: {src for src, _ in info.imports.values()} for mod, info in index.items()}
+    stale, grew = set(edited), True
+    while grew:
+        more = {mod for mod, d in deps.items() if d & stale} - stale
+        stale |= more
+        grew = bool(more)
+
+    done = []
+
+    def visit(mod):
+        if mod in done:
+            return
+        done.append(mod)
+        for dep in sorted(deps.get(mod, ()) & stale):
+            visit(dep)
+        if mod in sys.modules:
+            reload_module(sys.modules[mod])
+
+    for mod in sorted(stale):
+        visit(mod)
+    return [mod for mod in done if mod in sys.modules]
+
+
+class Watcher:
+    def __init__(self, argv):
+        self.argv = argv
+        sys.path.insert(0, os.path.dirname(MAIN_PATH))
+        # imported by name: the running script is __main__, reloading needs a real module
+        self.main = importlib.import_module("main")
+        self.args = self.main.parse_args(argv)
+        self.index = index_sources()
+
+    # ---- files ----------------------------------------------------------------
+
+    def catalog_files(self):
+        files = self.written_files()
+        if self.main.dataset_path.cache_info().currsize:
+            from src.catalog import NORCAL_CSV, SOCAL_CSV
+            files |= {os.path.abspath(os.path.join(self.main.dataset_path(), f)) for f in (NORCAL_CSV, SOCAL_CSV)}
+        return files
+
+    def written_files(self):
+        """Watched files the build writes itself: the --db store and the partitions index."""
+        files = [self.args.db] if self.args.db else []
+        if self.args.partitions:
+            from src.partitions import INDEX
+            files.append(os.path.join(self.args.partitions, INDEX))
+        return {os.path.abspath(p) for p in files}
+
+    def mtimes(self):
+        paths = [MAIN_PATH] + glob.glob(os.path.join(SRC_DIR, "*.py")) + glob.glob("datasets/*")
+        if self.args.db:
+            paths.append(self.args.db)
+        if self.args.partitions:
+            from src.partitions import INDEX
+            paths.append(os.path.join(self.args.partitions, INDEX))
+        if self.main.dataset_path.cache_info().currsize:
+            paths += glob.glob(os.path.join(self.main.dataset_path(), "*.csv"))
+        out = {}
+        for path in paths:
+            if path.endswith(("-journal", "-wal", "-shm")):
+                continue
+            try:
+                out[os.path.abspath(path)] = os.stat(path).st_mtime_ns
+            except (FileNotFoundError, IsADirectoryError):
+                pass
+        return out
+
+    # ---- building -------------------------------------------------------------
+
+    def load(self):
+        start = time.perf_counter()
+        self.df_california, self.store = self.main.load_catalog(self.args)
+        print(f"[watch] catalog loaded in {time.perf_counter() - start:.1f}s")
+
+    def plan(self):
+        start = time.perf_counter()
+        self.caps, self.layer_rows = self.main.plan_caps(self.args, self.df_california, self.store)
+        print(f"[watch] caps planned in {time.perf_counter() - start:.1f}s")
+
+    def build(self, maps):
+        for name in [m for m in self.args.maps if m in maps]:
+            start = time.perf_counter()
+            self.main.render_map(name, self.args, self.df_california, self.caps, self.layer_rows)
+            print(f"[watch] {name} rebuilt in {time.perf_counter() - start:.1f}s")
+
+    def map_roots(self, name):
+        return {("main", self.main.BUILDERS[name].__name__), ("main", "render_map")}
+
+    def on_change(self, paths):
+        code = {p for p in paths if p.endswith(".py") and (p == MAIN_PATH or os.path.dirname(p) == SRC_DIR)}
+        data = set(paths) - code
+        load = bool(data & self.catalog_files())
+        plan, maps = load, set(self.args.maps) if data else set()
+
+        if code:
+            index = index_sources()  # parse first: a syntax error leaves the old code running
+            edited = {module_name(p) for p in code}
+            changed = set()
+            for mod in edited:
+                if mod in index and mod in self.index:
+                    changed |= {(mod, name) for name in index[mod].changed(self.index[mod])}
+                else:
+                    changed |= {(mod, name) for name in (index.get(mod) or self.index[mod]).text}
+            reloaded = reload_modules(edited, index)
+            self.index = index
+            self.main = sys.modules["main"]
+            self.args = self.main.parse_args(self.argv)
+
+            affected = users(index, changed)
+            load |= bool(affected & set(LOAD_STAGE))
+            plan |= bool(affected & set(PLAN_STAGE))
+            maps |= {name for name in self.args.maps if affected & self.map_roots(name)}
+            print(f"[watch] changed: {', '.join(sorted(f'{m}.{n}' for m, n in changed)) or 'nothing'}")
+            print(f"[watch] reloaded: {', '.join(reloaded) or 'nothing'}")
+        if data:
+            print(f"[watch] data changed: {', '.join(sorted(os.path.basename(p) for p in data))}")
+
+        if load:
+            self.load()
+            self.plan()
+            maps = set(self.args.maps)
+        elif plan:
+            # same catalog: only the pages whose marker caps moved need the new rows
+            from src.payload_budget import LAYER_PAGES
+            before = self.caps
+            self.plan()
+            moved = {layer for layer in self.caps.keys() | before.keys() if self.caps.get(layer) != before.get(layer)}
+            for layer in moved:
+                maps |= {LAYER_PAGES[layer]} if layer in LAYER_PAGES else set(self.args.maps)
+        if not maps:
+            print("[watch] no map affected")
+        self.build(maps)
+
+    def run(self, poll_s=POLL_S):
+        self.load()
+        self.plan()
+        self.build(set(self.args.maps))
+        seen = self.mtimes()
+        print(f"\n[watch] watching {len(seen)} files (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(poll_s)
+                now = self.mtimes()
+                if now == seen:
+                    continue
+                time.sleep(poll_s)  # let the editor finish writing
+                now = self.mtimes()
+                changed = {p for p in now.keys() | seen.keys() if now.get(p) != seen.get(p)}
+                start = time.perf_counter()
+                try:
+                    self.on_change(changed)
+                    print(f"[watch] done in {time.perf_counter() - start:.1f}s\n")
+                except Exception:
+                    traceback.print_exc()
+                    print("[watch] failed; fix the error and save again\n")
+                # keep what was saved during the build pending: only the files the build
+                # writes itself (a store ingest) take their current mtime
+                seen = dict(now)
+                after = self.mtimes()
+                for path in self.written_files():
+                    seen.pop(path, None)
+                    if path in after:
+                        seen[path] = after[path]
+        except KeyboardInterrupt:
+            print("\n[watch] stopped")
+
+
+def watch(argv=None):
+    """Entry point of main.py --watch."""
+    Watcher(argv).run()
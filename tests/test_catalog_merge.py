@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.catalog_merge import find_duplicates, merge_catalogs
+
+
+def pairs(keep, drop):
+    return sorted(zip(keep.tolist(), drop.tolist()))
+
+
+def test_pairs_each_cross_network_duplicate_once():
+    # rows 0-2 NorCal (rank 0), rows 3-6 SoCal (rank 1)
+    t = np.array([1000, 5000, 9000, 1004, 5003, 9100, 1002])
+    lat = np.array([36.0, 35.5, 35.0, 36.01, 35.52, 35.0, 36.02])
+    lon = np.array([-120.0, -119.5, -119.0, -120.01, -119.5, -119.0, -120.0])
+    mag = np.array([3.0, 2.5, 4.0, 3.1, 2.4, 4.0, 3.2])
+    rank = np.array([0, 0, 0, 1, 1, 1, 1])
+    keep, drop = find_duplicates(t, lat, lon, mag, rank)
+    # 3 and 6 both match 0: only the closer one (6, 2 s vs 4 s) pairs with it;
+    # 5 is 100 s after 2, outside the time window
+    assert pairs(keep, drop) == [(0, 6), (1, 4)]
+
+
+def test_same_network_and_tolerances_are_respected():
+    t = np.array([0, 3, 10, 20])
+    lat = np.array([34.0, 34.0, 34.0, 34.5])
+    lon = np.array([-118.0, -118.0, -118.0, -118.0])
+    mag = np.array([3.0, 3.0, 4.0, 3.0])
+    rank = np.array([0, 0, 1, 1])
+    # 0/1 share a network, 2 is 1 magnitude unit off, 3 is ~55 km away
+    keep, drop = find_duplicates(t, lat, lon, mag, rank, max_dt_s=30, max_km=10.0, max_dmag=0.5)
+    assert pairs(keep, drop) == []
+    keep, drop = find_duplicates(t, lat, lon, mag, rank, max_dt_s=30, max_km=10.0, max_dmag=1.0)
+    assert pairs(keep, drop) == [(1, 2)]
+
+
+def test_rows_are_matched_against_brute_force():
+    rng = np.random.default_rng(0)
+    n = 400
+    t = np.sort(rng.integers(0, 20_000, n))
+    lat = rng.uniform(35.0, 36.0, n)
+    lon = rng.uniform(-121.0, -120.0, n)
+    mag = rng.uniform(1.0, 3.0, n)
+    rank = rng.integers(0, 2, n)
+    keep, drop = find_duplicates(t, lat, lon, mag, rank, max_dt_s=60, max_km=15.0, max_dmag=0.5)
+
+    from src.spatial_index import haversine_km
+    candidate = ((np.abs(t[:, None] - t[None, :]) <= 60)
+                 & (haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :]) <= 15.0)
+                 & (np.abs(mag[:, None] - mag[None, :]) <= 0.5)
+                 & (rank[:, None] < rank[None, :]))
+    assert all(candidate[k, d] for k, d in zip(keep, drop))
+    rows = np.concatenate([keep, drop])
+    assert len(rows) == len(set(rows.tolist()))
+    # maximal: no candidate pair is left with both rows unmatched
+    free = np.ones(n, dtype=bool)
+    free[rows] = False
+    assert not (candidate & free[:, None] & free[None, :]).any()
+
+
+@pytest.mark.parametrize("tolerances", [(0, 10.0, 0.5), (16, 0.0, 0.5), (16, 10.0, -0.1)])
+def test_rejects_non_positive_tolerances(tolerances):
+    one = np.zeros(1)
+    with pytest.raises(ValueError):
+        find_duplicates(one, one, one, one, one, *tolerances)
+
+
+def test_merge_drops_the_lower_priority_copy(capsys):
+    norcal = pd.DataFrame({"time": [100, 200], "lat": [36.0, 37.0], "lon": [-120.0, -121.0], "mag": [3.0, 2.0]})
+    socal = pd.DataFrame({"time": [105, 900], "lat": [36.01, 34.0], "lon": [-120.0, -118.0], "mag": [3.1, 2.5]})
+    merged = merge_catalogs({"SoCal": socal, "NorCal": norcal})
+    assert len(merged) == 3
+    assert merged.loc[merged["time"].between(100, 105), "network"].tolist() == ["NorCal"]
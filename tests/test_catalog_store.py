@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.catalog import epoch_year
+from src.catalog_store import CatalogStore, catalog_filters, filter_frame
+
+JAN_1980, YEAR = 315_532_800, 31_556_952
+COUNTIES = ["Kern", "Inyo", "Los Angeles", "Unknown", None]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    rng = np.random.default_rng(0)
+    n = 3000
+    time = JAN_1980 + rng.integers(0, 40 * YEAR, n)
+    # 1e-3 degree positions: the R*Tree keeps float32 boxes, so bbox edges stay clear of the points
+    return pd.DataFrame({
+        "time": time, "year": epoch_year(time),
+        "lat": np.round(rng.uniform(32.0, 42.0, n), 3), "lon": np.round(rng.uniform(-125.0, -114.0, n), 3),
+        "depth": np.round(rng.uniform(0.0, 30.0, n), 1), "mag": np.round(rng.uniform(0.0, 7.0, n), 1),
+        "type": "earthquake", "county": rng.choice(np.array(COUNTIES, dtype=object), n),
+    })
+
+
+@pytest.fixture(scope="module")
+def store(catalog, tmp_path_factory):
+    store = CatalogStore(str(tmp_path_factory.mktemp("store") / "catalog.sqlite"))
+    store.ingest_catalog(catalog, chunksize=700)
+    yield store
+    store.close()
+
+
+FILTERS = [
+    {},
+    {"bbox": (-120.0005, 34.0005, -117.0005, 37.0005)},
+    catalog_filters(years=(1990, 1999)),
+    {"mag_min": 3.0, "mag_max": 5.0},
+    {"depth_min": 10.0, "depth_max": 20.0},
+    {"county": "Kern"},
+    {"has_county": True},
+    dict(catalog_filters(bbox=(-122.0005, 33.0005, -116.0005, 38.0005), years=(1985, 2004)), mag_min=2.5),
+]
+KEY = ["time", "lat", "lon", "mag"]
+
+
+def sorted_rows(df):
+    return df[KEY].sort_values(KEY).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_query_and_count_match_filter_frame(catalog, store, filters):
+    expected = filter_frame(catalog, **filters)
+    got = store.query(columns=("time", "lat", "lon", "mag", "county"), **filters)
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(sorted_rows(got), sorted_rows(expected), check_dtype=False)
+    assert store.count(**filters) == len(expected)
+
+
+def test_view_merges_filters_and_streams_chunks(catalog, store):
+    view = store.where(mag_min=2.0, county="Inyo")
+    expected = filter_frame(catalog, mag_min=2.0, county="Inyo", t0=JAN_1980 + 20 * YEAR)
+    chunks = list(view.frames(columns=("time", "lat", "lon", "mag"), chunksize=50, t0=JAN_1980 + 20 * YEAR))
+    assert max(len(c) for c in chunks) == 50
+    pd.testing.assert_frame_equal(sorted_rows(pd.concat(chunks)), sorted_rows(expected), check_dtype=False)
+    assert len(view) == len(filter_frame(catalog, mag_min=2.0, county="Inyo"))
+    lat_min, lat_max, lon_min, lon_max = view.bounds()
+    rows = filter_frame(catalog, mag_min=2.0, county="Inyo")
+    assert (lat_min, lat_max, lon_min, lon_max) == (rows["lat"].min(), rows["lat"].max(),
+                                                    rows["lon"].min(), rows["lon"].max())
+    assert store.count() == len(catalog)  # the view leaves the store's own filters alone
+
+
+def test_group_sizes_and_layer_frames(catalog, store):
+    sizes = store.group_sizes(mag_min=3.0)
+    mag = catalog["mag"]
+    assert sizes["magnitude"] == [int((mag < 3).sum()), int(((mag >= 3) & (mag < 5)).sum()), int((mag >= 5).sum())]
+    assert sizes["unified"] == [int((mag >= 3).sum())]
+    named = catalog["county"].notna() & (catalog["county"] != "Unknown")
+    assert sorted(sizes["county"]) == sorted(catalog[named].groupby("county").size().tolist())
+
+    rows = store.layer_frame("magnitude", 40)
+    assert len(rows) == 120 and sorted(np.digitize(rows["mag"], [3.0, 5.0]).tolist()) == [0] * 40 + [1] * 40 + [2] * 40
+    latest = store.layer_frame("county", 5)
+    assert latest.groupby("county").size().tolist() == [5, 5, 5]
+    for county, got in latest.groupby("county"):
+        newest = catalog[catalog["county"] == county].nlargest(5, "time")["time"]
+        assert sorted(got["time"]) == sorted(newest)
@@ -0,0 +1,93 @@
+import numpy as np
+
+from src.clustering import DAY, convex_hull, dbscan_haversine
+from src.spatial_index import haversine_km
+
+
+def blobs(seed=0):
+    # three tight clusters of different sizes plus scattered background events
+    rng = np.random.default_rng(seed)
+    centers = [(34.0, -118.0, 60), (34.3, -117.6, 35), (35.0, -119.0, 20)]
+    lat = [rng.normal(c_lat, 0.01, n) for c_lat, _, n in centers]
+    lon = [rng.normal(c_lon, 0.01, n) for _, c_lon, n in centers]
+    lat.append(rng.uniform(33.0, 36.0, 40))
+    lon.append(rng.uniform(-120.0, -116.0, 40))
+    return np.concatenate(lat), np.concatenate(lon)
+
+
+def brute_force_dbscan(lat, lon, eps_km, min_samples, t=None, eps_days=None):
+    # textbook DBSCAN over the full distance matrix; a point counts itself as a neighbor
+    near = haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :]) <= eps_km
+    if t is not None:
+        near &= np.abs(t[:, None] - t[None, :]) <= eps_days * DAY
+    core = near.sum(axis=1) >= min_samples
+    labels = np.full(len(lat), -1)
+    cluster = 0
+    for seed in np.nonzero(core)[0]:
+        if labels[seed] >= 0:
+            continue
+        labels[seed], todo = cluster, [seed]
+        while todo:
+            p = todo.pop()
+            for q in np.nonzero(near[p])[0]:
+                if labels[q] < 0:
+                    labels[q] = cluster
+                    if core[q]:
+                        todo.append(q)
+        cluster += 1
+    return labels, core
+
+
+def assert_same_partition(labels, expected):
+    assert np.array_equal(labels < 0, expected < 0)
+    pairs = set(zip(labels[labels >= 0].tolist(), expected[expected >= 0].tolist()))
+    # one-to-one mapping between the two label sets
+    assert len(pairs) == len({a for a, _ in pairs}) == len({b for _, b in pairs})
+
+
+def test_exact_dbscan_matches_brute_force():
+    lat, lon = blobs()
+    labels, core = dbscan_haversine(lat, lon, eps_km=3.0, min_samples=10, rho=None, return_core=True)
+    expected, expected_core = brute_force_dbscan(lat, lon, 3.0, 10)
+    assert np.array_equal(core, expected_core)
+    assert_same_partition(labels, expected)
+    assert labels.max() + 1 == 3
+
+
+def test_labels_ranked_by_size():
+    lat, lon = blobs()
+    labels = dbscan_haversine(lat, lon, eps_km=3.0, min_samples=10, rho=None)
+    sizes = np.bincount(labels[labels >= 0])
+    assert list(sizes) == sorted(sizes, reverse=True)
+
+
+def test_space_time_dbscan_matches_brute_force():
+    lat, lon = blobs(1)
+    rng = np.random.default_rng(1)
+    # the largest cluster is split into two bursts a year apart
+    t = rng.integers(0, 5 * DAY, len(lat))
+    t[:30] += 365 * DAY
+    labels = dbscan_haversine(lat, lon, eps_km=3.0, min_samples=8, t=t, eps_days=10, rho=None)
+    expected, _ = brute_force_dbscan(lat, lon, 3.0, 8, t=t, eps_days=10)
+    assert_same_partition(labels, expected)
+    assert len(set(labels[:30])) == 1 and labels[0] != labels[30]
+
+
+def test_rho_approximation_keeps_separated_clusters():
+    lat, lon = blobs(2)
+    exact = dbscan_haversine(lat, lon, eps_km=3.0, min_samples=10, rho=None)
+    approx = dbscan_haversine(lat, lon, eps_km=3.0, min_samples=10, rho=0.25)
+    assert approx.max() == exact.max()
+    # the dense clusters keep every member; only background points near the eps boundary may differ
+    assert np.array_equal(approx[:115] >= 0, exact[:115] >= 0)
+
+
+def test_empty_input():
+    assert len(dbscan_haversine([], [])) == 0
+
+
+def test_convex_hull():
+    lon = np.array([0.0, 1.0, 1.0, 0.0, 0.5])
+    lat = np.array([0.0, 0.0, 1.0, 1.0, 0.5])
+    hull = convex_hull(lon, lat)
+    assert sorted(map(tuple, hull)) == [(0.0, 0.0), (0.0, 1.0), (1.0, 0.0), (1.0, 1.0)]
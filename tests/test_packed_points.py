@@ -0,0 +1,74 @@
+import base64
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.packed_points import QUANT, _pack_column, morton_order, pack_points
+
+DTYPES = {"i8": "<i1", "i16": "<i2", "i32": "<i4"}
+
+
+def unpack_column(col):
+    # Python transcription of the decoder's column() (packed_points.DECODER)
+    q = np.frombuffer(base64.b64decode(col["b"]), dtype=DTYPES[col["t"]]).astype(float)
+    for i, v in col.get("x", []):
+        q[i] = v
+    acc = col["o"] + np.cumsum(q) if col["d"] else q
+    return np.round(acc * col["s"] * 1e5) / 1e5
+
+
+@pytest.mark.parametrize("name", sorted(QUANT))
+def test_round_trip_within_half_a_step(name):
+    step, delta = QUANT[name]
+    rng = np.random.default_rng(0)
+    values = np.sort(rng.uniform(-50.0, 50.0, 500)) if delta else rng.uniform(0.0, 9.0, 500)
+    col = _pack_column(values, step, delta)
+    assert np.abs(unpack_column(col) - values).max() <= step / 2 + 1e-9
+
+
+def test_outliers_go_to_the_exception_list():
+    # small deltas with a few long jumps: int8 plus exceptions beats int16 / int32
+    values = np.cumsum(np.r_[0.0, np.full(999, 1e-4)])
+    values[[300, 700]] += [5.0, -3.0]
+    col = _pack_column(values, 1e-5, True)
+    assert col["t"] == "i8"
+    assert [i for i, _ in col["x"]] == [300, 301, 700, 701]
+    assert np.abs(unpack_column(col) - values).max() <= 5e-6 + 1e-9
+
+
+def test_values_beyond_int32_survive():
+    values = np.array([0.0, 3e9, 3e9 + 1, -3e9])
+    col = _pack_column(values, 1, False)
+    assert np.array_equal(unpack_column(col), values)
+
+
+def test_empty_column():
+    col = _pack_column(np.empty(0), 1e-5, True)
+    assert len(unpack_column(col)) == 0
+
+
+def test_morton_order_groups_nearby_points():
+    rng = np.random.default_rng(1)
+    corners = [(33.0, -120.0), (33.0, -116.0), (37.0, -120.0), (37.0, -116.0)]
+    lat = np.concatenate([rng.normal(a, 0.05, 50) for a, _ in corners])
+    lon = np.concatenate([rng.normal(b, 0.05, 50) for _, b in corners])
+    order = morton_order(lat, lon)
+    assert sorted(order.tolist()) == list(range(200))
+    # each corner is one contiguous run along the curve
+    group = order // 50
+    assert (np.diff(group) != 0).sum() == 3
+
+
+def test_pack_points_rows_follow_the_morton_order():
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({"lat": rng.uniform(32, 42, 300), "lon": rng.uniform(-125, -114, 300),
+                       "mag": rng.uniform(0, 7, 300), "depth": rng.uniform(0, 30, 300),
+                       "time": rng.integers(0, 2_000_000_000, 300), "exposure": np.nan})
+    payload = pack_points(df, ("lat", "lon", "mag", "depth", "time", "exposure"))
+    assert payload["n"] == 300
+    assert set(payload["cols"]) == {"lat", "lon", "mag", "depth", "time"}  # exposure has gaps
+    order = morton_order(df["lat"], df["lon"])
+    for name, col in payload["cols"].items():
+        step = QUANT[name][0]
+        assert np.abs(unpack_column(col) - df[name].to_numpy(dtype=float)[order]).max() <= step / 2 + 1e-6
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.catalog import epoch_year
+from src.catalog_store import filter_frame
+from src.clustering import dbscan_haversine
+from src.filters_clusters import partitioned_clusters
+from src.partitions import PartitionedCatalog, partition_frames
+
+JAN_1980, YEAR = 315_532_800, 31_556_952
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    # tight swarms on and around the 5 degree tile edges (lat 35, lon -120), a
+    # chain crossing an edge, and sparse background noise, spread over decades
+    rng = np.random.default_rng(0)
+    lat, lon = [], []
+    for c_lat, c_lon, n in [(35.0, -118.0, 120), (37.0, -120.0, 90), (35.0, -120.0, 70), (38.0, -122.0, 60)]:
+        lat.append(rng.normal(c_lat, 0.005, n))
+        lon.append(rng.normal(c_lon, 0.005, n))
+    chain = np.repeat(np.linspace(34.8, 35.2, 220), 3)
+    lat += [chain, rng.uniform(32.0, 41.0, 300)]
+    lon += [np.full(len(chain), -116.5) + rng.normal(0, 0.002, len(chain)), rng.uniform(-125.0, -114.0, 300)]
+    lat, lon = np.concatenate(lat), np.concatenate(lon)
+    time = JAN_1980 + rng.integers(0, 40 * YEAR, len(lat))
+    return pd.DataFrame({"time": time, "year": epoch_year(time), "lat": lat, "lon": lon,
+                         "depth": rng.uniform(0, 20, len(lat)), "mag": rng.uniform(0.5, 4.5, len(lat)),
+                         "type": "earthquake"})
+
+
+@pytest.fixture(scope="module")
+def parts(catalog, tmp_path_factory):
+    store = PartitionedCatalog(str(tmp_path_factory.mktemp("parts")))
+    store.ingest_catalog(catalog, chunksize=250)
+    return store
+
+
+def test_partitioned_clusters_match_the_whole_catalog(catalog, parts):
+    assert len(parts.tiles()) > 4
+    summaries, clustered, total = partitioned_clusters(parts, eps_km=2.0, min_samples=25)
+    labels = dbscan_haversine(catalog["lat"], catalog["lon"], eps_km=2.0, min_samples=25)
+    sizes = np.bincount(labels[labels >= 0])
+    assert total == len(catalog)
+    assert clustered == int((labels >= 0).sum())
+    assert sorted(summaries["count"].tolist(), reverse=True) == sorted(sizes.tolist(), reverse=True)
+    assert len(summaries) == 5
+
+
+def test_query_matches_filter_frame(catalog, parts):
+    filters = {"bbox": (-121.0, 34.0, -117.0, 38.0), "t0": JAN_1980 + 10 * YEAR, "mag_min": 2.0}
+    got = parts.query(columns=("time", "lat", "lon", "mag"), **filters)
+    expected = filter_frame(catalog, **filters)
+    key = ["time", "lat", "lon", "mag"]
+    assert len(got) == len(expected) > 0
+    pd.testing.assert_frame_equal(got[key].sort_values(key).reset_index(drop=True),
+                                  expected[key].sort_values(key).reset_index(drop=True))
+    assert parts.count(**filters) == len(expected)
+
+
+def test_partition_frames_cover_the_view(catalog, parts):
+    view = parts.where(mag_min=3.0)
+    rows = sum(len(f) for f in partition_frames(view, ("lat", "lon")))
+    assert rows == len(view) == int((catalog["mag"] >= 3.0).sum())
+    assert [len(f) for f in partition_frames(catalog, ("lat", "lon"))] == [len(catalog)]